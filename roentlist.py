@@ -16,13 +16,24 @@
 """
 
 import os
+import argparse
 import sys
 import json
+import csv
 import re
+import shlex
 import sqlite3
 import subprocess
+import threading
+import queue
 import webbrowser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
 import time
+import unicodedata
+import functools
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
@@ -30,17 +41,295 @@ import tkinter.font as tkfont
 
 DB_FILE = "songs.db"
 SETTINGS_FILE = "settings.json"
+SESSION_JOURNAL_FILE = "session.journal"
+SESSION_SNAPSHOT_FILE = "session.snapshot.json"
 
 VIDEO_EXTS = "*.mp4 *.mkv *.webm"
 AUDIO_EXTS = "*.mp3 *.wav"
 
+# -------------------------
+# 検索用正規化
+# -------------------------
+# 「よあそび」「ヨアソビ」「ﾖｱｿﾋﾞ」「ＹＯＡＳＯＢＩ」などを同じ文字列に畳み込む。
+# 書き込み時に一度だけ計算して *_norm 列に保存し、検索語にも同じ処理をかける。
+_SMALL_KANA = str.maketrans("ぁぃぅぇぉっゃゅょゎゕゖ", "あいうえおつやゆよわかけ")
+_KANA_VOWELS = {}
+for _vowel, _chars in [
+    ("あ", "あかさたなはまやらわがざだばぱ"),
+    ("い", "いきしちにひみりぎじぢびぴ"),
+    ("う", "うくすつぬふむゆるぐずづぶぷゔ"),
+    ("え", "えけせてねへめれげぜでべぺ"),
+    ("お", "おこそとのほもよろをごぞどぼぽ"),
+]:
+    for _ch in _chars:
+        _KANA_VOWELS[_ch] = _vowel
+_NORM_DROP = set(" \t\r\n\u3000・")
+
+
+def normalize_search_text(text: str) -> str:
+    """検索用に 幅(NFKC) / 大小文字 / カタカナ→ひらがな / 小書き / 長音 を畳み込む"""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    out = []
+    for ch in text:
+        code = ord(ch)
+        if 0x30A1 <= code <= 0x30F6:  # カタカナ → ひらがな
+            ch = chr(code - 0x60)
+        if ch in _NORM_DROP:
+            continue
+        ch = ch.translate(_SMALL_KANA)
+        if ch == "ー" and out:
+            # 長音は直前の母音に展開（らーめん → らあめん）
+            ch = _KANA_VOWELS.get(out[-1], ch)
+        out.append(ch)
+    return "".join(out)
+
+
+def _norm_pair(a: str, b: str = "") -> str:
+    """表記とふりがなをまとめて1列に（改行区切りなので検索語とはまたがらない）"""
+    parts = [p for p in (normalize_search_text(a), normalize_search_text(b)) if p]
+    return "\n".join(dict.fromkeys(parts))
+
+
+NORM_COLUMNS = ("title_norm", "artist_norm", "provider_norm", "keywords_norm")
+
+
+def song_norm_values(data) -> tuple:
+    """songs 行 / 入力 dict から *_norm 列の値を作る"""
+    def g(key):
+        try:
+            return data[key] or ""
+        except (KeyError, IndexError):
+            return ""
+    return (
+        _norm_pair(g("title"), g("title_kana")),
+        _norm_pair(g("artist"), g("artist_kana")),
+        _norm_pair(g("provider"), g("provider_kana")),
+        _norm_pair(g("keywords")),
+    )
+
+
+# -------------------------
+# ローマ字 → かな（検索語の展開用、同梱テーブルのみで変換）
+# -------------------------
+_ROMAJI_ROWS = {
+    "": "あいうえお",
+    "k": "かきくけこ", "g": "がぎぐげご",
+    "s": "さしすせそ", "z": "ざじずぜぞ",
+    "t": "たちつてと", "d": "だぢづでど",
+    "n": "なにぬねの",
+    "h": "はひふへほ", "b": "ばびぶべぼ", "p": "ぱぴぷぺぽ",
+    "m": "まみむめも",
+    "y": "や\0ゆいぇよ",
+    "r": "らりるれろ", "l": "らりるれろ",
+    "w": "わうぃううぇを",
+    "f": "ふぁふぃふふぇふぉ",
+    "v": "ゔぁゔぃゔゔぇゔぉ",
+    "j": "じゃじじゅじぇじょ",
+    "sh": "しゃしししゅしぇしょ",
+    "ch": "ちゃちちゅちぇちょ",
+    "ts": "つぁつぃつつぇつぉ",
+    "x": "ぁぃぅぇぉ",
+}
+_ROMAJI_YOUON = {
+    "ky": "き", "gy": "ぎ", "sy": "し", "zy": "じ", "jy": "じ", "ty": "ち", "cy": "ち", "dy": "ぢ",
+    "ny": "に", "hy": "ひ", "by": "び", "py": "ぴ", "my": "み", "ry": "り", "ly": "り",
+}
+_ROMAJI_TABLE = {}
+
+
+def _build_romaji_table():
+    vowels = "aiueo"
+    for cons, kana in _ROMAJI_ROWS.items():
+        if len(kana) == 5:
+            parts = list(kana)
+        else:
+            # 2文字ずつのかな（ふぁ 等）は「子音+小書き」か単独1文字のどちらか
+            parts = re.findall(r".[ぁぃぅぇぉゃゅょ]?", kana)
+        for v, k in zip(vowels, parts):
+            if k != "\0":
+                _ROMAJI_TABLE[cons + v] = k
+    for cons, head in _ROMAJI_YOUON.items():
+        for v, small in zip(vowels, "ゃぃゅぇょ"):
+            _ROMAJI_TABLE[cons + v] = head + small
+    _ROMAJI_TABLE.update({
+        "shi": "し", "chi": "ち", "tsu": "つ", "fu": "ふ", "ji": "じ",
+        "xtsu": "っ", "ltsu": "っ", "xtu": "っ", "ltu": "っ",
+        "xya": "ゃ", "xyu": "ゅ", "xyo": "ょ", "lya": "ゃ", "lyu": "ゅ", "lyo": "ょ",
+        "thi": "てぃ", "dhi": "でぃ", "twu": "とぅ", "dwu": "どぅ",
+        "wo": "を", "n'": "ん", "-": "ー",
+    })
+
+
+_build_romaji_table()
+_ROMAJI_MAX_KEY = max(len(k) for k in _ROMAJI_TABLE)
+
+
+@functools.lru_cache(maxsize=1024)
+def romaji_to_kana(text: str) -> str:
+    """ローマ字をひらがなに変換する（変換できない文字はそのまま残す）"""
+    src = unicodedata.normalize("NFKC", text or "").lower()
+    out = []
+    i = 0
+    n = len(src)
+    while i < n:
+        ch = src[i]
+        nxt = src[i + 1] if i + 1 < n else ""
+        if ch == "n":
+            if nxt == "n":
+                # nn + 母音/y は「ん + な行」（konnichiha）、それ以外は nn で「ん」
+                after = src[i + 2] if i + 2 < n else ""
+                out.append("ん")
+                i += 1 if after in "aiueoy" and after else 2
+                continue
+            if not nxt or nxt not in "aiueoy'":
+                out.append("ん")
+                i += 1
+                continue
+        if ch == nxt and ch.isalpha() and ch not in "aiueon":
+            out.append("っ")  # 促音（gakkou / matte）
+            i += 1
+            continue
+        if ch == "t" and src.startswith("ch", i + 1):
+            out.append("っ")  # tch
+            i += 1
+            continue
+        for size in range(min(_ROMAJI_MAX_KEY, n - i), 0, -1):
+            kana = _ROMAJI_TABLE.get(src[i:i + size])
+            if kana is not None:
+                out.append(kana)
+                i += size
+                break
+        else:
+            out.append(ch)
+            i += 1
+    return "".join(out)
+
+
+@functools.lru_cache(maxsize=1024)
+def romaji_query_forms(text: str) -> tuple:
+    """検索語の正規化形と、ローマ字をかなに展開した正規化形（重複なし）"""
+    forms = [normalize_search_text(text)]
+    if re.search(r"[a-zA-Zａ-ｚＡ-Ｚ]", text or ""):
+        forms.append(normalize_search_text(romaji_to_kana(text)))
+    return tuple(f for f in dict.fromkeys(forms) if f)
+
+
 # -------------------------
 # DB
 # -------------------------
+DB_BUSY_TIMEOUT_SEC = 5.0
+DB_STATEMENT_CACHE = 256
+DB_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",      # 約16MB
+    "PRAGMA mmap_size=134217728",    # 128MB
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",
+)
+
+
+class ConnectionPool:
+    """songs.db への常駐接続（スレッドごとに1本を使い回す）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns = []  # [(持ち主のスレッド, 接続)]
+        self.connects = 0
+        self.queries = 0
+
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # check_same_thread=False は close_all() を別スレッドから呼ぶため。
+            # 実際の利用はスレッドローカルなので同時使用はしない。
+            conn = sqlite3.connect(
+                self.path,
+                timeout=DB_BUSY_TIMEOUT_SEC,
+                cached_statements=DB_STATEMENT_CACHE,
+                check_same_thread=False,
+            )
+            conn.row_factory = sqlite3.Row
+            for pragma in DB_PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            self._local.state = {}
+            with self._lock:
+                self._conns.append((threading.current_thread(), conn))
+                self.connects += 1
+        return conn
+
+    def conn_state(self) -> dict:
+        """呼び出しスレッドの接続に付随する dict（接続を閉じると一緒に消える。SongCache の data_version など）"""
+        self.conn()
+        return self._local.state
+
+    def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        with self._lock:
+            self.queries += 1
+        return self.conn().execute(sql, params)
+
+    def executemany(self, sql: str, seq) -> sqlite3.Cursor:
+        with self._lock:
+            self.queries += 1
+        return self.conn().executemany(sql, seq)
+
+    def release(self):
+        """呼び出しスレッドの接続を閉じる（終了する短命スレッドの最後に呼ぶ）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        self._local.conn = None
+        self._local.state = {}
+        with self._lock:
+            self._conns = [(t, c) for t, c in self._conns if c is not conn]
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        """呼び出しスレッドと、終了済みのスレッドの接続を閉じる
+
+        まだ動いているスレッドの接続は閉じない（クエリ中に閉じると ProgrammingError になる）。
+        各ワーカーは終了時に release() で自分の接続を閉じる。
+        """
+        me = threading.current_thread()
+        conns, alive = [], []
+        with self._lock:
+            for t, c in self._conns:
+                (conns if t is me or not t.is_alive() else alive).append((t, c))
+            self._conns = alive
+        for _, conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._local.conn = None
+        self._local.state = {}
+
+    def stats_text(self) -> str:
+        saved = max(0, self.queries - self.connects)
+        return f"DB接続: {self.connects} 回 / クエリ: {self.queries} 回（接続 {saved} 回分を節約）"
+
+
+_pool = None
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None or _pool.path != DB_FILE:
+        if _pool is not None:
+            _pool.close_all()
+        _pool = ConnectionPool(DB_FILE)
+    return _pool
+
+
 def get_conn():
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """呼び出しスレッド用の常駐接続を返す（close しないこと）"""
+    return get_pool().conn()
 
 
 def _table_columns(conn, table_name: str) -> set:
@@ -70,8 +359,6 @@ def init_db():
             provider TEXT DEFAULT '',
             provider_kana TEXT DEFAULT '',
             keywords TEXT DEFAULT '',
-            lyrics TEXT DEFAULT '',
-            credit_text TEXT DEFAULT '',
             video_path TEXT DEFAULT '',
             audio_path TEXT DEFAULT '',
             audio_url TEXT DEFAULT '',
@@ -82,132 +369,1243 @@ def init_db():
     )
     conn.commit()
 
+    # 歌詞・概要欄は大きいので別テーブル（一覧/Viewer の読み込みに乗せない）
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS song_texts (
+            song_id INTEGER PRIMARY KEY REFERENCES songs(id) ON DELETE CASCADE,
+            lyrics TEXT DEFAULT '',
+            credit_text TEXT DEFAULT ''
+        )
+        """
+    )
+    conn.commit()
+    _migrate_song_texts(conn)
+
     # 既存DB移行（念のため）
     _ensure_column(conn, "songs", "title_kana", "TEXT DEFAULT ''")
     _ensure_column(conn, "songs", "artist_kana", "TEXT DEFAULT ''")
     _ensure_column(conn, "songs", "provider_kana", "TEXT DEFAULT ''")
 
-    conn.close()
+    # 検索用正規化列（NULL = 未計算）
+    for col in NORM_COLUMNS:
+        _ensure_column(conn, "songs", col, "TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_songs_norm_title_artist ON songs(title_norm, artist_norm)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_songs_norm_artist ON songs(artist_norm)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_songs_norm_title ON songs(title_norm)")
+    conn.commit()
+    db_backfill_norm()
+
+    _init_fts(conn)
+    _init_history(conn)
+    _init_saved_lists(conn)
+    _init_media_index(conn)
+
+
+SCHEMA_SONG_TEXTS_MIGRATED = 1  # PRAGMA user_version: songs の歌詞・概要欄を song_texts へ移し終えた
+
+
+def _migrate_song_texts(conn):
+    """旧DBの songs.lyrics / songs.credit_text を song_texts へ移す（1回だけ。済んだら user_version に記録）"""
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_SONG_TEXTS_MIGRATED:
+        return
+    cols = _table_columns(conn, "songs")
+    old_cols = [c for c in ("lyrics", "credit_text") if c in cols]
+    with conn:
+        if old_cols:
+            lyrics = "lyrics" if "lyrics" in cols else "NULL"
+            credit = "credit_text" if "credit_text" in cols else "NULL"
+            # 既にある song_texts の行（移行後に編集した内容）は上書きしない
+            conn.execute(
+                f"INSERT OR IGNORE INTO song_texts (song_id, lyrics, credit_text) "
+                f"SELECT id, COALESCE({lyrics}, ''), COALESCE({credit}, '') FROM songs "
+                f"WHERE {lyrics} IS NOT NULL OR {credit} IS NOT NULL"
+            )
+        conn.execute(f"PRAGMA user_version = {SCHEMA_SONG_TEXTS_MIGRATED}")
+    if not old_cols:
+        return
+    try:
+        with conn:
+            for col in old_cols:
+                conn.execute(f"ALTER TABLE songs DROP COLUMN {col}")
+    except sqlite3.OperationalError:
+        # DROP COLUMN 非対応（SQLite < 3.35）やビューが列を参照している場合は中身だけ空にする
+        with conn:
+            conn.execute(f"UPDATE songs SET {', '.join(f'{c} = NULL' for c in old_cols)}")
+    try:
+        conn.execute("VACUUM")
+    except sqlite3.OperationalError:
+        pass
+
+
+NORM_BACKFILL_BATCH = 2000
+
+
+def db_backfill_norm(only_missing: bool = True) -> int:
+    """*_norm 列を一括計算する（既存DB移行・正規化ルール変更時用）"""
+    conn = get_conn()
+    sql = "SELECT id, title, title_kana, artist, artist_kana, provider, provider_kana, keywords FROM songs WHERE id > ?"
+    if only_missing:
+        sql += " AND title_norm IS NULL"
+    sql += " ORDER BY id LIMIT ?"
+    sets = ", ".join(f"{c} = ?" for c in NORM_COLUMNS)
+    total = 0
+    last_id = 0
+    with conn:
+        while True:
+            # 走査中の索引を書き換えないよう、id のキーセットでバッチごとに読み切る
+            rows = get_pool().execute(sql, (last_id, NORM_BACKFILL_BATCH)).fetchall()
+            if not rows:
+                break
+            get_pool().executemany(
+                f"UPDATE songs SET {sets} WHERE id = ?",
+                [song_norm_values(r) + (r["id"],) for r in rows],
+            )
+            last_id = rows[-1]["id"]
+            total += len(rows)
+    return total
+
+
+# -------------------------
+# 全文検索（FTS5 trigram）
+# -------------------------
+FTS_TABLE = "songs_fts"
+FTS_COLUMNS = NORM_COLUMNS
+FTS_MIN_QUERY = 3  # trigram は3文字未満を検索できない
+
+_fts_enabled = False
+
+
+def _fts_available(conn) -> bool:
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp._fts_probe USING fts5(x, tokenize='trigram')")
+        conn.execute("DROP TABLE temp._fts_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _drop_fts(conn):
+    for suffix in ("ai", "ad", "au"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+    conn.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def _init_fts(conn):
+    """songs を外部コンテンツとする FTS5 索引とトリガを用意する"""
+    global _fts_enabled
+    _fts_enabled = _fts_available(conn)
+    if not _fts_enabled:
+        return
+
+    existing = _table_columns(conn, FTS_TABLE)
+    if existing and existing != set(FTS_COLUMNS):
+        # 索引対象の列構成が変わった → 作り直し
+        _drop_fts(conn)
+        existing = set()
+
+    cols = ", ".join(FTS_COLUMNS)
+    new_vals = ", ".join(f"new.{c}" for c in FTS_COLUMNS)
+    old_vals = ", ".join(f"old.{c}" for c in FTS_COLUMNS)
+    conn.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"{cols}, content='songs', content_rowid='id', tokenize='trigram')"
+    )
+    conn.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON songs BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.id, {new_vals}); END"
+    )
+    conn.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON songs BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); END"
+    )
+    conn.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {cols} ON songs BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); "
+        f"INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.id, {new_vals}); END"
+    )
+    conn.commit()
+
+    if not existing:
+        # 既存DBに初めて索引を作った場合は中身を流し込む
+        db_rebuild_fts()
+
+
+def db_rebuild_fts() -> bool:
+    """FTS 索引を songs から作り直す（既存DB移行・破損時用）"""
+    if not _fts_enabled:
+        return False
+    conn = get_conn()
+    with conn:
+        get_pool().execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def _fts_phrase(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
 
 
 def db_insert_song(data: dict) -> int:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
+    with conn:
+        cur = get_pool().execute(
+            """
+            INSERT INTO songs (
+                title, title_kana,
+                artist, artist_kana,
+                provider, provider_kana,
+                keywords,
+                video_path, audio_path,
+                audio_url, original_url,
+                created_at,
+                title_norm, artist_norm, provider_norm, keywords_norm
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                data["title"], data.get("title_kana", ""),
+                data["artist"], data.get("artist_kana", ""),
+                data.get("provider", ""), data.get("provider_kana", ""),
+                data.get("keywords", ""),
+                data.get("video_path", ""),
+                data.get("audio_path", ""),
+                data.get("audio_url", ""),
+                data.get("original_url", ""),
+                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            ) + song_norm_values(data),
+        )
+        new_id = cur.lastrowid
+        _write_song_texts(new_id, data)
+    song_cache.invalidate(new_id)
+    return new_id
+
+
+def db_update_song(song_id: int, data: dict) -> None:
+    conn = get_conn()
+    with conn:
+        get_pool().execute(
+            """
+            UPDATE songs SET
+                title = ?,
+                title_kana = ?,
+                artist = ?,
+                artist_kana = ?,
+                provider = ?,
+                provider_kana = ?,
+                keywords = ?,
+                video_path = ?,
+                audio_path = ?,
+                audio_url = ?,
+                original_url = ?,
+                title_norm = ?,
+                artist_norm = ?,
+                provider_norm = ?,
+                keywords_norm = ?
+            WHERE id = ?
+            """,
+            (
+                data["title"], data.get("title_kana", ""),
+                data["artist"], data.get("artist_kana", ""),
+                data.get("provider", ""), data.get("provider_kana", ""),
+                data.get("keywords", ""),
+                data.get("video_path", ""),
+                data.get("audio_path", ""),
+                data.get("audio_url", ""),
+                data.get("original_url", ""),
+            ) + song_norm_values(data) + (song_id,),
+        )
+        _write_song_texts(song_id, data)
+    song_cache.invalidate(int(song_id))
+
+
+def _write_song_texts(song_id: int, data: dict):
+    get_pool().execute(
+        "INSERT OR REPLACE INTO song_texts (song_id, lyrics, credit_text) VALUES (?, ?, ?)",
+        (song_id, data.get("lyrics", ""), data.get("credit_text", "")),
+    )
+
+
+# 歌詞・概要欄を含まない曲情報（一覧・Viewer・スタンプ用）
+SONG_COLUMNS = (
+    "id, title, title_kana, artist, artist_kana, provider, provider_kana, keywords, "
+    "video_path, audio_path, audio_url, original_url, created_at"
+)
+
+
+SONG_CACHE_SIZE = 512
+SONG_CACHE_CHECK_SEC = 0.5  # 他プロセスの更新確認（PRAGMA data_version）の間隔
+
+
+class SongCache:
+    """曲情報（SONG_COLUMNS）の LRU キャッシュ。書き込み時と他プロセス更新時に破棄"""
+
+    def __init__(self, maxsize: int = SONG_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.clears = 0
+
+    def _check_external_changes(self):
+        # data_version は接続ごとの値なので、確認時刻と一緒に接続側（プールのスレッドローカル）に持つ
+        conn = get_conn()
+        state = get_pool().conn_state()
+        now = time.monotonic()
+        if now - state.get("song_cache_checked_at", -SONG_CACHE_CHECK_SEC) < SONG_CACHE_CHECK_SEC:
+            return
+        state["song_cache_checked_at"] = now
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        prev = state.get("song_cache_version")
+        state["song_cache_version"] = version
+        if prev is not None and prev != version:
+            self.clear()
+
+    def get(self, song_id: int):
+        self._check_external_changes()
+        with self._lock:
+            if song_id in self._rows:
+                self._rows.move_to_end(song_id)
+                self.hits += 1
+                return self._rows[song_id]
+            self.misses += 1
+        return None
+
+    def put(self, song_id: int, row):
+        with self._lock:
+            self._rows[song_id] = row
+            self._rows.move_to_end(song_id)
+            while len(self._rows) > self.maxsize:
+                self._rows.popitem(last=False)
+
+    def invalidate(self, song_id: int):
+        with self._lock:
+            self._rows.pop(song_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+            self.clears += 1
+
+    def stats_text(self) -> str:
+        total = self.hits + self.misses
+        rate = (self.hits * 100 / total) if total else 0.0
+        return f"曲キャッシュ: ヒット {self.hits} / ミス {self.misses}（{rate:.0f}%）・外部更新による破棄 {self.clears} 回"
+
+
+song_cache = SongCache()
+
+
+def db_get_song(song_id: int):
+    song_id = int(song_id)
+    row = song_cache.get(song_id)
+    if row is None:
+        row = get_pool().execute(f"SELECT {SONG_COLUMNS} FROM songs WHERE id = ?", (song_id,)).fetchone()
+        if row is not None:
+            song_cache.put(song_id, row)
+    return row
+
+
+SQL_MAX_VARIABLES = 900  # 古い SQLite の上限 999 より少し下
+
+
+def db_get_songs(ids) -> list:
+    """ids と同じ順序で曲情報を返す（見つからない id は None）。重複 id 可"""
+    ids = [int(i) for i in ids]
+    found = {}
+    missing = []
+    for sid in dict.fromkeys(ids):
+        row = song_cache.get(sid)
+        if row is None:
+            missing.append(sid)
+        else:
+            found[sid] = row
+    for i in range(0, len(missing), SQL_MAX_VARIABLES):
+        chunk = missing[i:i + SQL_MAX_VARIABLES]
+        marks = ", ".join("?" * len(chunk))
+        for row in get_pool().execute(f"SELECT {SONG_COLUMNS} FROM songs WHERE id IN ({marks})", chunk):
+            found[row["id"]] = row
+            song_cache.put(row["id"], row)
+    return [found.get(sid) for sid in ids]
+
+
+def db_get_song_texts(song_id: int) -> dict:
+    """歌詞・概要欄記載事項（詳細表示・現在曲の表示でのみ読む）"""
+    row = get_pool().execute(
+        "SELECT lyrics, credit_text FROM song_texts WHERE song_id = ?", (song_id,)
+    ).fetchone()
+    if not row:
+        return {"lyrics": "", "credit_text": ""}
+    return {"lyrics": row["lyrics"] or "", "credit_text": row["credit_text"] or ""}
+
+
+# -------------------------
+# 配信履歴（streams / performances）と、songs 側の集計列
+# -------------------------
+# songs.sing_count / last_sung_at / last_stream_id は performances のトリガで増減する集計値。
+# 検索のたびに履歴を数え直さず、songs の索引だけで並び替え・絞り込みができる。
+HISTORY_COLUMNS = (
+    ("sing_count", "INTEGER NOT NULL DEFAULT 0"),
+    ("last_sung_at", "TEXT NOT NULL DEFAULT ''"),     # '' = 未歌唱
+    ("last_stream_id", "INTEGER NOT NULL DEFAULT 0"),  # 0 = 未歌唱
+)
+
+
+def _init_history(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS streams (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at TEXT NOT NULL,
+            ended_at TEXT DEFAULT ''
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS performances (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            stream_id INTEGER NOT NULL REFERENCES streams(id) ON DELETE CASCADE,
+            song_id INTEGER NOT NULL REFERENCES songs(id) ON DELETE CASCADE,
+            start_sec INTEGER NOT NULL DEFAULT 0,
+            sung_at TEXT NOT NULL
+        )
         """
-        INSERT INTO songs (
-            title, title_kana,
-            artist, artist_kana,
-            provider, provider_kana,
-            keywords, lyrics, credit_text,
-            video_path, audio_path,
-            audio_url, original_url,
-            created_at
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            data["title"], data.get("title_kana", ""),
-            data["artist"], data.get("artist_kana", ""),
-            data.get("provider", ""), data.get("provider_kana", ""),
-            data.get("keywords", ""),
-            data.get("lyrics", ""),
-            data.get("credit_text", ""),
-            data.get("video_path", ""),
-            data.get("audio_path", ""),
-            data.get("audio_url", ""),
-            data.get("original_url", ""),
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        ),
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_performances_song ON performances(song_id, stream_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_performances_stream ON performances(stream_id)")
+    for col, coldef in HISTORY_COLUMNS:
+        _ensure_column(conn, "songs", col, coldef)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_songs_sing_count ON songs(sing_count, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_songs_last_sung ON songs(last_sung_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_songs_last_stream ON songs(last_stream_id)")
+    conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS performances_ai AFTER INSERT ON performances BEGIN "
+        "UPDATE songs SET sing_count = sing_count + 1, "
+        "last_sung_at = MAX(last_sung_at, new.sung_at), "
+        "last_stream_id = MAX(last_stream_id, new.stream_id) "
+        "WHERE id = new.song_id; END"
+    )
+    conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS performances_ad AFTER DELETE ON performances BEGIN "
+        "UPDATE songs SET sing_count = MAX(0, sing_count - 1), "
+        "last_sung_at = COALESCE((SELECT MAX(sung_at) FROM performances WHERE song_id = old.song_id), ''), "
+        "last_stream_id = COALESCE((SELECT MAX(stream_id) FROM performances WHERE song_id = old.song_id), 0) "
+        "WHERE id = old.song_id; END"
     )
     conn.commit()
-    new_id = cur.lastrowid
-    conn.close()
-    return new_id
 
 
-def db_update_song(song_id: int, data: dict) -> None:
+def db_start_stream() -> int:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
+    with conn:
+        cur = get_pool().execute(
+            "INSERT INTO streams(started_at) VALUES (?)", (datetime.now().strftime("%Y-%m-%d %H:%M:%S"),)
+        )
+    return cur.lastrowid
+
+
+def db_end_stream(stream_id: int):
+    conn = get_conn()
+    with conn:
+        get_pool().execute(
+            "UPDATE streams SET ended_at = ? WHERE id = ?", (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), stream_id)
+        )
+
+
+def db_record_performance(stream_id: int, song_id: int, start_sec: int):
+    """曲の開始を1件記録する（songs の集計列はトリガで更新される）"""
+    conn = get_conn()
+    with conn:
+        get_pool().execute(
+            "INSERT INTO performances(stream_id, song_id, start_sec, sung_at) VALUES (?, ?, ?, ?)",
+            (stream_id, song_id, int(start_sec), datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+        )
+
+
+def db_rebuild_song_stats() -> int:
+    """集計列を performances から数え直す（保守用。通常はトリガで常に最新）"""
+    conn = get_conn()
+    with conn:
+        cur = conn.execute(
+            """
+            UPDATE songs SET
+                sing_count = (SELECT COUNT(*) FROM performances p WHERE p.song_id = songs.id),
+                last_sung_at = COALESCE((SELECT MAX(sung_at) FROM performances p WHERE p.song_id = songs.id), ''),
+                last_stream_id = COALESCE((SELECT MAX(stream_id) FROM performances p WHERE p.song_id = songs.id), 0)
+            """
+        )
+    return cur.rowcount
+
+
+# -------------------------
+# 保存リスト（配信前に作ったセットリストを名前を付けて保存し、まとめてキューへ入れる）
+# -------------------------
+def _init_saved_lists(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS saved_lists (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            updated_at TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS saved_list_items (
+            list_id INTEGER NOT NULL REFERENCES saved_lists(id) ON DELETE CASCADE,
+            pos INTEGER NOT NULL,
+            song_id INTEGER NOT NULL REFERENCES songs(id) ON DELETE CASCADE,
+            PRIMARY KEY (list_id, pos)
+        ) WITHOUT ROWID
         """
-        UPDATE songs SET
-            title = ?,
-            title_kana = ?,
-            artist = ?,
-            artist_kana = ?,
-            provider = ?,
-            provider_kana = ?,
-            keywords = ?,
-            lyrics = ?,
-            credit_text = ?,
-            video_path = ?,
-            audio_path = ?,
-            audio_url = ?,
-            original_url = ?
-        WHERE id = ?
-        """,
-        (
-            data["title"], data.get("title_kana", ""),
-            data["artist"], data.get("artist_kana", ""),
-            data.get("provider", ""), data.get("provider_kana", ""),
-            data.get("keywords", ""),
-            data.get("lyrics", ""),
-            data.get("credit_text", ""),
-            data.get("video_path", ""),
-            data.get("audio_path", ""),
-            data.get("audio_url", ""),
-            data.get("original_url", ""),
-            song_id,
-        ),
     )
     conn.commit()
-    conn.close()
 
 
-def db_get_song(song_id: int):
+def db_saved_list_names() -> list[str]:
+    rows = get_pool().execute("SELECT name FROM saved_lists ORDER BY updated_at DESC, id DESC").fetchall()
+    return [r["name"] for r in rows]
+
+
+def db_save_list(name: str, song_ids) -> None:
+    """同名のリストがあれば中身を置き換える"""
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM songs WHERE id = ?", (song_id,))
-    row = cur.fetchone()
-    conn.close()
-    return row
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with conn:
+        get_pool().execute(
+            "INSERT INTO saved_lists(name, updated_at) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET updated_at = excluded.updated_at",
+            (name, now),
+        )
+        list_id = get_pool().execute("SELECT id FROM saved_lists WHERE name = ?", (name,)).fetchone()["id"]
+        get_pool().execute("DELETE FROM saved_list_items WHERE list_id = ?", (list_id,))
+        get_pool().executemany(
+            "INSERT INTO saved_list_items(list_id, pos, song_id) VALUES (?, ?, ?)",
+            [(list_id, pos, int(sid)) for pos, sid in enumerate(song_ids)],
+        )
+
+
+def db_get_saved_list(name: str) -> list[int]:
+    rows = get_pool().execute(
+        "SELECT i.song_id FROM saved_list_items i JOIN saved_lists l ON l.id = i.list_id "
+        "WHERE l.name = ? ORDER BY i.pos",
+        (name,),
+    ).fetchall()
+    return [r["song_id"] for r in rows]
+
+
+def db_delete_saved_list(name: str) -> None:
+    conn = get_conn()
+    with conn:
+        get_pool().execute("DELETE FROM saved_lists WHERE name = ?", (name,))
+
+
+# -------------------------
+# 一括インポート（CSV / TSV / JSONL）
+# -------------------------
+# 書き出し・取り込みで使う列（songs / song_texts の列名, 表示名）
+SONG_IO_FIELDS = (
+    ("title", "曲名"),
+    ("title_kana", "曲名ふりがな"),
+    ("artist", "アーティスト名"),
+    ("artist_kana", "アーティスト名ふりがな"),
+    ("provider", "音源提供元"),
+    ("provider_kana", "提供元ふりがな"),
+    ("keywords", "キーワード"),
+    ("lyrics", "歌詞"),
+    ("credit_text", "概要欄記載事項"),
+    ("video_path", "動画パス"),
+    ("audio_path", "音源パス"),
+    ("audio_url", "音源のURL"),
+    ("original_url", "原曲のURL"),
+)
+IMPORT_FIELD_ALIASES = {
+    "アーティスト": "artist",
+    "アーティストふりがな": "artist_kana",
+    "音源提供元ふりがな": "provider_kana",
+    "動画": "video_path",
+    "音源": "audio_path",
+    "音源url": "audio_url",
+    "原曲url": "original_url",
+}
+IMPORT_FORMATS = {".csv": "csv", ".tsv": "tsv", ".txt": "tsv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+IMPORT_BATCH = 2000
+BULK_POLL_MS = 100
+
+
+class BulkCancelled(Exception):
+    pass
+
+
+def _import_field(header) -> str | None:
+    key = re.sub(r"[\s_]", "", str(header or "")).casefold()
+    for field, label in SONG_IO_FIELDS:
+        if key in (field.replace("_", ""), label.casefold()):
+            return field
+    return IMPORT_FIELD_ALIASES.get(key)
+
+
+def iter_import_records(f, fmt: str):
+    """テキストファイル f から1行ずつ {songs の列名: 値} を返す（ファイル全体は読み込まない）"""
+    if fmt == "jsonl":
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                yield None  # 壊れた行
+                continue
+            if not isinstance(obj, dict):
+                yield None
+                continue
+            rec = {}
+            for k, v in obj.items():
+                field = _import_field(k)
+                if field and v is not None:
+                    rec[field] = str(v).strip()
+            yield rec
+        return
+    reader = csv.reader(f, delimiter="\t" if fmt == "tsv" else ",")
+    header = next(reader, None)
+    if header is None:
+        return
+    fields = [_import_field(h) for h in header]
+    if "title" not in fields or "artist" not in fields:
+        raise ValueError("見出し行に「曲名」と「アーティスト名」（title / artist）の列が必要です。")
+    for values in reader:
+        yield {field: v.strip() for field, v in zip(fields, values) if field}
+
+
+def _find_duplicate(title_key: str, artist_key: str) -> bool:
+    """正規化した曲名+アーティストが同じ曲があるか（title_norm の索引で範囲検索する）"""
+    # *_norm は「表記\nふりがな」なので、先頭行が一致する範囲を引く
+    rows = get_pool().execute(
+        "SELECT title_norm, artist_norm FROM songs WHERE title_norm >= ? AND title_norm < ?",
+        (title_key, title_key + "\x0b"),
+    )
+    for row in rows:
+        if row["title_norm"].split("\n", 1)[0] == title_key and (row["artist_norm"] or "").split("\n", 1)[0] == artist_key:
+            return True
+    return False
+
+
+def db_import_songs(records, skip_duplicates: bool = True, on_progress=None, cancel=None) -> dict:
+    """records を IMPORT_BATCH 件ずつ executemany で挿入する
+
+    書き込みロックは1バッチ分だけ持つ（取り込み中も GUI から書き込めるように）。
+    中断・失敗時は、このインポートで追加した id の範囲を消して何も残さない。
+    """
+    conn = get_conn()
+    stats = {"read": 0, "inserted": 0, "duplicates": 0, "invalid": 0}
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    song_cols = [f for f, _ in SONG_IO_FIELDS if f not in ("lyrics", "credit_text")]
+    insert_song = (
+        f"INSERT INTO songs (id, {', '.join(song_cols)}, created_at, {', '.join(NORM_COLUMNS)}) "
+        f"VALUES ({', '.join('?' * (len(song_cols) + 2 + len(NORM_COLUMNS)))})"
+    )
+    insert_text = "INSERT INTO song_texts (song_id, lyrics, credit_text) VALUES (?, ?, ?)"
+    song_rows, text_rows, batch_keys = [], [], set()  # 行は id 抜きで先に作っておく
+    inserted_ranges = []  # (最初の id, 最後の id)
 
+    def flush():
+        if song_rows:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 書き込みロック中に採番する（バッチの間に GUI から曲が登録されても重ならない）
+                first_id = 1 + max(
+                    get_pool().execute("SELECT COALESCE(MAX(id), 0) FROM songs").fetchone()[0],
+                    (get_pool().execute("SELECT seq FROM sqlite_sequence WHERE name = 'songs'").fetchone() or [0])[0],
+                )
+                ids = range(first_id, first_id + len(song_rows))
+                get_pool().executemany(insert_song, [(i, *row) for i, row in zip(ids, song_rows)])
+                get_pool().executemany(insert_text, [(i, *row) for i, row in zip(ids, text_rows)])
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            inserted_ranges.append((ids[0], ids[-1]))
+            stats["inserted"] += len(song_rows)
+            song_rows.clear()
+            text_rows.clear()
+            batch_keys.clear()
+        if on_progress:
+            on_progress(stats)
+        if cancel is not None and cancel.is_set():
+            raise BulkCancelled()
+
+    try:
+        for rec in records:
+            stats["read"] += 1
+            if not rec or not rec.get("title") or not rec.get("artist"):
+                stats["invalid"] += 1
+                continue
+            if skip_duplicates:
+                key = (normalize_search_text(rec["title"]), normalize_search_text(rec["artist"]))
+                if key in batch_keys or _find_duplicate(*key):
+                    stats["duplicates"] += 1
+                    continue
+                batch_keys.add(key)
+            song_rows.append((*(rec.get(c, "") for c in song_cols), now) + song_norm_values(rec))
+            text_rows.append((rec.get("lyrics", ""), rec.get("credit_text", "")))
+            if len(song_rows) >= IMPORT_BATCH:
+                flush()
+        flush()
+    except BaseException:
+        _undo_import(inserted_ranges)
+        raise
+    return stats
+
+
+def _undo_import(inserted_ranges):
+    """中断・失敗したインポートで追加済みの曲を消す（song_texts などは ON DELETE CASCADE）"""
+    conn = get_conn()
+    with conn:
+        for first, last in inserted_ranges:
+            get_pool().execute("DELETE FROM songs WHERE id BETWEEN ? AND ?", (first, last))
+
+
+def import_songs_file(path: str, skip_duplicates: bool = True, on_progress=None, cancel=None) -> dict:
+    """拡張子で形式を決めて取り込む。on_progress(stats) の stats["fraction"] は読み進めた割合（0〜1）"""
+    fmt = IMPORT_FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError(f"未対応の形式です（{' / '.join(sorted(IMPORT_FORMATS))}）")
+    total = max(1, os.path.getsize(path))
+    # BOM 付き UTF-8（Excel の CSV）もそのまま読む
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        def progress(stats):
+            stats["fraction"] = min(1.0, f.buffer.tell() / total)
+            if on_progress:
+                on_progress(stats)
+        stats = db_import_songs(iter_import_records(f, fmt), skip_duplicates, progress, cancel)
+    stats["fraction"] = 1.0
+    return stats
+
+
+def import_stats_text(stats: dict) -> str:
+    return (
+        f"追加 {stats['inserted']} 曲 / 重複でスキップ {stats['duplicates']} 件 / "
+        f"不正な行 {stats['invalid']} 件（読み込み {stats['read']} 行）"
+    )
+
+
+# -------------------------
+# 書き出し（CSV / JSONL）
+# -------------------------
+EXPORT_FIELDS = (("id", "曲ID"),) + SONG_IO_FIELDS + (
+    ("created_at", "登録日時"),
+    ("sing_count", "歌唱回数"),
+    ("last_sung_at", "最後に歌った日時"),
+)
+EXPORT_DEFAULT_FIELDS = tuple(f for f, _ in SONG_IO_FIELDS)  # 一括インポートでそのまま読み戻せる列
+EXPORT_FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+EXPORT_BATCH = 1000
+SONG_TEXT_FIELDS = ("lyrics", "credit_text")
+
+
+def db_iter_song_batches(fields, batch: int = EXPORT_BATCH):
+    """songs を id 順に batch 件ずつ返す（id のキーセットで読むので、何万曲でも手元に持つのは1バッチだけ）"""
+    known = {f for f, _ in EXPORT_FIELDS}
+    unknown = [f for f in fields if f not in known]
+    if unknown:
+        raise ValueError(f"不明な列です: {', '.join(unknown)}（使える列: {', '.join(f for f, _ in EXPORT_FIELDS)}）")
+    cols = ", ".join(f"COALESCE(t.{f}, '')" if f in SONG_TEXT_FIELDS else f"s.{f}" for f in fields)
+    # 歌詞・概要欄を選ばなければ song_texts は読まない
+    join = " LEFT JOIN song_texts t ON t.song_id = s.id" if any(f in SONG_TEXT_FIELDS for f in fields) else ""
+    sql = f"SELECT s.id, {cols} FROM songs s{join} WHERE s.id > ? ORDER BY s.id LIMIT ?"
+    last_id = 0
+    while True:
+        rows = get_pool().execute(sql, (last_id, batch)).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield [tuple(row)[1:] for row in rows]
+
+
+def export_songs(f, fmt: str, fields, on_progress=None, cancel=None) -> int:
+    """曲データを f に流し込み、書いた曲数を返す。on_progress(書いた曲数, 全曲数)"""
+    fields = list(fields)
+    total = get_pool().execute("SELECT COUNT(*) FROM songs").fetchone()[0]
+    n = 0
+    if fmt == "csv":
+        w = csv.writer(f)
+        w.writerow(fields)
+    for rows in db_iter_song_batches(fields):
+        if fmt == "csv":
+            w.writerows(rows)
+        else:
+            f.writelines(json.dumps(dict(zip(fields, row)), ensure_ascii=False) + "\n" for row in rows)
+        n += len(rows)
+        if on_progress:
+            on_progress(n, total)
+        if cancel is not None and cancel.is_set():
+            raise BulkCancelled()
+    return n
+
+
+def export_songs_file(path: str, fields, on_progress=None, cancel=None, fmt: str = "") -> int:
+    """形式（省略時は拡張子から）を決めて書き出す。一時ファイルに書いてから差し替えるので、中止・失敗時は元のファイルが残る"""
+    fmt = fmt or EXPORT_FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError(f"未対応の形式です（{' / '.join(sorted(EXPORT_FORMATS))}）")
+    path = os.path.abspath(path)
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    try:
+        # CSV は Excel で文字化けしないよう BOM 付き
+        with open(tmp_path, "w", encoding="utf-8-sig" if fmt == "csv" else "utf-8", newline="") as f:
+            n = export_songs(f, fmt, fields, on_progress, cancel)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return n
+
+
+# -------------------------
+# メディアフォルダのスキャン（動画/音源ファイルを曲に自動リンク）
+# -------------------------
+MEDIA_KIND_EXTS = {
+    "video": {e[1:].lower() for e in VIDEO_EXTS.split()},
+    "audio": {e[1:].lower() for e in AUDIO_EXTS.split()},
+}
+MEDIA_KIND_COLUMNS = {"video": "video_path", "audio": "audio_path"}
+MEDIA_SCAN_WORKERS = min(8, (os.cpu_count() or 2) * 2)  # NAS 等では待ち時間が主なので CPU 数より多め
+MEDIA_NAME_SPLIT_RE = re.compile(r"\s+-\s+|[_／/|｜\[\]【】()（）「」『』]")
+
+
+def _init_media_index(conn):
+    """スキャン済みのフォルダ・ファイル一覧（再スキャンは変わったフォルダだけ読む）"""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS media_dirs (
+            path TEXT PRIMARY KEY,
+            root TEXT NOT NULL,
+            parent TEXT,
+            mtime_ns INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS media_files (
+            path TEXT PRIMARY KEY,
+            dir TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            song_id INTEGER
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_media_dirs_parent ON media_dirs(parent)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_media_files_dir ON media_files(dir)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_media_files_song ON media_files(song_id)")
+    conn.commit()
 
-def db_search_songs(title="", artist="", provider="", keyword=""):
-    title = (title or "").strip()
-    artist = (artist or "").strip()
-    provider = (provider or "").strip()
-    keyword = (keyword or "").strip()
 
+def media_kind(name: str):
+    ext = os.path.splitext(name)[1].lower()
+    for kind, exts in MEDIA_KIND_EXTS.items():
+        if ext in exts:
+            return kind
+    return None
+
+
+def _scan_media_dir(path: str, known_mtime):
+    """1フォルダを読む（スレッドプールで実行）。mtime が前回と同じなら中身は読まない
+
+    戻り値: (path, mtime_ns, files or None, subdirs or None, error)
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError as e:
+        return path, None, None, None, e
+    if mtime == known_mtime:
+        # フォルダの mtime はファイルの追加・削除・改名で変わる。変わっていなければ前回の一覧を使う
+        return path, mtime, None, None, None
+    files, subdirs = [], []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                        continue
+                    kind = media_kind(entry.name)
+                    if kind and entry.is_file():
+                        st = entry.stat()
+                        files.append((entry.path, kind, st.st_size, st.st_mtime_ns))
+                except OSError:
+                    continue
+    except OSError as e:
+        return path, None, None, None, e
+    return path, mtime, files, subdirs, None
+
+
+class MediaMatcher:
+    """ファイル名（拡張子なし）から曲を探す。曲名は title_norm の索引で引き、アーティスト名で絞る"""
+
+    def __init__(self):
+        self._by_title = {}
+
+    def _songs_titled(self, key: str):
+        if key not in self._by_title:
+            rows = get_pool().execute(
+                "SELECT id, title_norm, artist_norm FROM songs WHERE title_norm >= ? AND title_norm < ?",
+                (key, key + "\x0b"),
+            ).fetchall()
+            self._by_title[key] = [
+                (r["id"], (r["artist_norm"] or "").split("\n")) for r in rows if r["title_norm"].split("\n", 1)[0] == key
+            ]
+        return self._by_title[key]
+
+    def match(self, filename: str):
+        """曲 id（見つからない・候補が絞れない場合は None）"""
+        stem = os.path.splitext(os.path.basename(filename))[0]
+        whole = normalize_search_text(stem)
+        parts = [normalize_search_text(p) for p in MEDIA_NAME_SPLIT_RE.split(stem)]
+        keys = [k for k in dict.fromkeys([whole] + parts) if k]
+        candidates = {}
+        for key in keys:
+            for song_id, artist_keys in self._songs_titled(key):
+                candidates[song_id] = artist_keys
+        if len(candidates) == 1:
+            return next(iter(candidates))
+        # 同名曲が複数 → ファイル名にアーティスト名（表記かふりがな）が含まれるものに絞る
+        with_artist = [sid for sid, akeys in candidates.items() if any(a and a in whole for a in akeys)]
+        return with_artist[0] if len(with_artist) == 1 else None
+
+
+def _outermost_media_roots(roots) -> list[str]:
+    """正規化して重複を除き、別のルートの中にあるルートを外す（同じフォルダを2回読まない）"""
+    kept = []
+    for root in sorted({os.path.normcase(os.path.abspath(r)) for r in roots if r}):
+        if not any(root == k or root.startswith(k.rstrip(os.sep) + os.sep) for k in kept):
+            kept.append(root)
+    return kept
+
+
+def scan_media_folders(roots, on_progress=None, cancel=None, rematch: bool = False) -> dict:
+    """roots 以下を並列に走査して media_files を更新し、曲との対応を付ける
+
+    前回から mtime が変わっていないフォルダは読まず、サイズ・更新日時が変わっていないファイルは照合し直さない。
+    rematch=True なら全フォルダを読み直し、全ファイルを照合し直す。
+    見つからないルート（外付けドライブを外している等）や読めなかったフォルダの登録内容は消さずに残す。
+    on_progress(読んだフォルダ数, 残りフォルダ数, 見つけたファイル数)
+    """
+    roots = _outermost_media_roots(roots)
+    offline = {r for r in roots if not os.path.isdir(r)}
+    roots = [r for r in roots if r not in offline]
+    known = {
+        r["path"]: (r["mtime_ns"], r["root"])
+        for r in get_pool().execute("SELECT path, root, mtime_ns FROM media_dirs")
+    }
+    children = {}
+    for r in get_pool().execute("SELECT path, parent FROM media_dirs WHERE parent IS NOT NULL"):
+        children.setdefault(r["parent"], []).append(r["path"])
+
+    def known_mtime(path):
+        return None if rematch else known.get(path, (None,))[0]
+
+    stats = {"dirs": 0, "dirs_read": 0, "files": 0, "new_files": 0, "removed_files": 0, "matched": 0, "errors": len(offline)}
+    visited = {}   # path -> (root, parent, mtime_ns)
+    changed = []   # (dir, files)
+    keep = set()   # 読めなかったフォルダとその下（前回の登録内容を残す）
+    with ThreadPoolExecutor(max_workers=MEDIA_SCAN_WORKERS, thread_name_prefix="media-scan") as pool:
+        pending = {}
+        for root in roots:
+            pending[pool.submit(_scan_media_dir, root, known_mtime(root))] = (root, None)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                root, parent = pending.pop(fut)
+                path, mtime, files, subdirs, error = fut.result()
+                stats["dirs"] += 1
+                if error is not None:
+                    stats["errors"] += 1
+                    stack = [path]
+                    while stack:
+                        p = stack.pop()
+                        keep.add(p)
+                        stack.extend(children.get(p, []))
+                    continue
+                visited[path] = (root, parent, mtime)
+                if files is None:
+                    subdirs = children.get(path, [])
+                else:
+                    stats["dirs_read"] += 1
+                    changed.append((path, files))
+                for sub in subdirs:
+                    if sub not in visited:
+                        pending[pool.submit(_scan_media_dir, sub, known_mtime(sub))] = (root, path)
+            if cancel is not None and cancel.is_set():
+                for fut in pending:
+                    fut.cancel()
+                raise BulkCancelled()
+            if on_progress:
+                on_progress(stats["dirs"], len(pending), sum(len(f) for _, f in changed))
+
+    matcher = MediaMatcher()
+    conn = get_conn()
+    with conn:
+        for path, files in changed:
+            old = {
+                r["path"]: r
+                for r in get_pool().execute("SELECT path, size, mtime_ns, song_id FROM media_files WHERE dir = ?", (path,))
+            }
+            rows = []
+            for fpath, kind, size, mtime in files:
+                prev = old.pop(fpath, None)
+                if prev is not None and prev["size"] == size and prev["mtime_ns"] == mtime:
+                    song_id = prev["song_id"]
+                else:
+                    song_id = matcher.match(fpath)
+                    stats["new_files"] += prev is None
+                rows.append((fpath, path, kind, size, mtime, song_id))
+            get_pool().executemany("INSERT OR REPLACE INTO media_files VALUES (?, ?, ?, ?, ?, ?)", rows)
+            get_pool().executemany("DELETE FROM media_files WHERE path = ?", [(p,) for p in old])
+            stats["removed_files"] += len(old)
+        # 消えたフォルダ・設定から外したフォルダ（見つからないルートと読めなかったフォルダは残す）
+        gone = [p for p, (_, root) in known.items() if p not in visited and p not in keep and root not in offline]
+        for i in range(0, len(gone), SQL_MAX_VARIABLES):
+            chunk = gone[i:i + SQL_MAX_VARIABLES]
+            marks = ", ".join("?" * len(chunk))
+            stats["removed_files"] += get_pool().execute(f"DELETE FROM media_files WHERE dir IN ({marks})", chunk).rowcount
+            get_pool().execute(f"DELETE FROM media_dirs WHERE path IN ({marks})", chunk)
+        get_pool().executemany(
+            "INSERT OR REPLACE INTO media_dirs (path, root, parent, mtime_ns) VALUES (?, ?, ?, ?)",
+            [(p, root, parent, mtime) for p, (root, parent, mtime) in visited.items() if known.get(p) != (mtime, root)],
+        )
+        if rematch:
+            # 読めなかったフォルダの分も含めて全ファイルを照合し直す（曲を追加・改名した後など）
+            rows = get_pool().execute("SELECT path FROM media_files").fetchall()
+            get_pool().executemany(
+                "UPDATE media_files SET song_id = ? WHERE path = ?", [(matcher.match(r["path"]), r["path"]) for r in rows]
+            )
+    stats["files"] = get_pool().execute("SELECT COUNT(*) FROM media_files").fetchone()[0]
+    stats["matched"] = get_pool().execute("SELECT COUNT(*) FROM media_files WHERE song_id IS NOT NULL").fetchone()[0]
+    return stats
+
+
+def db_media_link_proposals() -> list[dict]:
+    """曲にまだ設定されていない動画/音源パスの候補（曲・種類ごとに1件）"""
+    rows = get_pool().execute(
+        "SELECT f.path, f.kind, s.id, s.title, s.artist FROM media_files f JOIN songs s ON s.id = f.song_id "
+        "WHERE (f.kind = 'video' AND COALESCE(s.video_path, '') = '') OR (f.kind = 'audio' AND COALESCE(s.audio_path, '') = '') "
+        "ORDER BY s.id, f.kind, f.path"
+    ).fetchall()
+    proposals = {}
+    for r in rows:
+        proposals.setdefault((r["id"], r["kind"]), {
+            "song_id": r["id"], "kind": r["kind"], "path": r["path"], "title": r["title"], "artist": r["artist"],
+        })
+    return list(proposals.values())
+
+
+def db_link_media(links) -> int:
+    """links: [(song_id, kind, path)] をまとめて songs に書き込む"""
+    conn = get_conn()
+    n = 0
+    with conn:
+        for kind, col in MEDIA_KIND_COLUMNS.items():
+            rows = [(path, int(sid)) for sid, k, path in links if k == kind]
+            if rows:
+                get_pool().executemany(f"UPDATE songs SET {col} = ? WHERE id = ?", rows)
+                n += len(rows)
+    for sid, _, _ in links:
+        song_cache.invalidate(int(sid))
+    return n
+
+
+def media_scan_stats_text(stats: dict) -> str:
+    return (
+        f"フォルダ {stats['dirs']} 件（読み直し {stats['dirs_read']} 件）/ ファイル {stats['files']} 件"
+        f"（新規 {stats['new_files']} 件・削除 {stats['removed_files']} 件）/ 曲と対応 {stats['matched']} 件"
+        + (f" / 読めないフォルダ {stats['errors']} 件" if stats["errors"] else "")
+    )
+
+
+SEARCH_PAGE_SIZE = 100
+SEARCH_MAX_PAGES = 5  # 一覧に置いておくページ数（離れたページは外し、戻った時にキーセットで読み直す）
+SEARCH_LIST_COLUMNS = "id, title, artist, provider, keywords, sing_count, last_sung_at"
+SEARCH_SORTS = {
+    "new": ("id", "DESC"),
+    "old": ("id", "ASC"),
+    "title": ("title_norm", "ASC"),
+    "artist": ("artist_norm", "ASC"),
+    "most_sung": ("sing_count", "DESC"),
+    "least_sung": ("sing_count", "ASC"),
+    "recent_sung": ("last_sung_at", "DESC"),
+    "long_unsung": ("last_sung_at", "ASC"),
+}
+# 歌唱履歴での絞り込み
+SEARCH_HISTORY_FILTERS = ("", "sung", "never", "rested")
+
+
+def _search_where(title="", artist="", provider="", keyword="", romaji=False, history="", recent_streams=0):
     where = []
     params = []
+    match = []
+
+    if history == "sung":
+        where.append("sing_count > 0")
+    elif history == "never":
+        where.append("sing_count = 0")
+    elif history == "rested" and int(recent_streams or 0) > 0:
+        # 直近 N 枠で歌っていない = 最後に歌った枠が「N 番目に新しい枠」より前（未歌唱は 0）
+        where.append("last_stream_id < COALESCE((SELECT MIN(id) FROM (SELECT id FROM streams ORDER BY id DESC LIMIT ?)), 1)")
+        params.append(int(recent_streams))
+
+    for text, col in [
+        (title, "title_norm"),
+        (artist, "artist_norm"),
+        (provider, "provider_norm"),
+        (keyword, "keywords_norm"),
+    ]:
+        text = (text or "").strip()
+        forms = romaji_query_forms(text) if romaji else (normalize_search_text(text),)
+        forms = [f for f in forms if f]
+        if not forms:
+            continue
+        if _fts_enabled and all(len(f) >= FTS_MIN_QUERY for f in forms):
+            match.append(f"{col} : (" + " OR ".join(_fts_phrase(f) for f in forms) + ")")
+        else:
+            # 短い語は trigram で引けないので部分一致にフォールバック
+            where.append("(" + " OR ".join(f"instr({col}, ?) > 0" for _ in forms) + ")")
+            params.extend(forms)
+
+    if match:
+        where.insert(0, f"id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?)")
+        params.insert(0, " AND ".join(match))
+    return where, params
+
+
+def db_search_songs(title="", artist="", provider="", keyword="", romaji=False, history="", recent_streams=0,
+                    sort="new", after=None, before=None, limit=None):
+    """一覧用の列（+ sort_key）だけを返す
+
+    after は前ページ末尾の search_cursor()。before を渡すとその手前の limit 件を（表示順で）返す。
+    """
+    where, params = _search_where(title, artist, provider, keyword, romaji, history, recent_streams)
+    col, direction = SEARCH_SORTS.get(sort, SEARCH_SORTS["new"])
+    if before is not None:
+        # 逆順に読んで最後に並べ直す
+        direction = "ASC" if direction == "DESC" else "DESC"
+        after = before
+    op = "<" if direction == "DESC" else ">"
+
+    if after is not None:
+        key, last_id = after
+        if col == "id":
+            where.append(f"id {op} ?")
+            params.append(last_id)
+        else:
+            # (sort_key, id) のキーセット
+            where.append(f"({col} {op} ? OR ({col} = ? AND id {op} ?))")
+            params.extend([key, key, last_id])
 
-    if title:
-        where.append("(title LIKE ? OR title_kana LIKE ?)")
-        params.extend([f"%{title}%", f"%{title}%"])
-    if artist:
-        where.append("(artist LIKE ? OR artist_kana LIKE ?)")
-        params.extend([f"%{artist}%", f"%{artist}%"])
-    if provider:
-        where.append("(provider LIKE ? OR provider_kana LIKE ?)")
-        params.extend([f"%{provider}%", f"%{provider}%"])
-    if keyword:
-        where.append("keywords LIKE ?")
-        params.append(f"%{keyword}%")
-
-    sql = "SELECT * FROM songs"
+    sql = f"SELECT {SEARCH_LIST_COLUMNS}, {col} AS sort_key FROM songs"
     if where:
         sql += " WHERE " + " AND ".join(where)
-    sql += " ORDER BY id DESC"
-
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(sql, params)
-    rows = cur.fetchall()
-    conn.close()
+    sql += f" ORDER BY {col} {direction}" + ("" if col == "id" else f", id {direction}")
+    if limit:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+
+    rows = get_pool().execute(sql, params).fetchall()
+    if before is not None:
+        rows.reverse()
     return rows
 
 
+def search_cursor(row) -> tuple:
+    return (row["sort_key"], row["id"])
+
+
+def db_count_songs(title="", artist="", provider="", keyword="", romaji=False, history="", recent_streams=0) -> int:
+    where, params = _search_where(title, artist, provider, keyword, romaji, history, recent_streams)
+    sql = "SELECT COUNT(*) FROM songs"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return int(get_pool().execute(sql, params).fetchone()[0])
+
+
+# -------------------------
+# 検索ワーカー（入力中の検索をGUIスレッドの外で実行）
+# -------------------------
+WORKER_JOIN_SEC = 2.0  # 終了時に各ワーカーの終了を待つ上限
+SEARCH_DEBOUNCE_MS = 250
+SEARCH_POLL_MS = 30
+
+
+class SearchWorker:
+    """検索専用スレッド。新しい依頼が来たら実行中の古いクエリは打ち切る"""
+
+    PROGRESS_STEPS = 1000  # この VM 命令数ごとに打ち切り判定
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = None  # (gen, func)
+        self._gen = 0
+        self._stopped = False
+        self.results = queue.Queue()  # (gen, result or Exception)
+        self.completed = 0
+        self.cancelled = 0
+        self._thread = threading.Thread(target=self._run, name="search-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, func) -> int:
+        """func をワーカーで実行する。戻り値の世代番号で結果を照合する"""
+        with self._cond:
+            self._gen += 1
+            if self._pending is not None:
+                self.cancelled += 1  # 未着手のまま置き換え
+            self._pending = (self._gen, func)
+            self._cond.notify()
+            return self._gen
+
+    def stop(self, timeout: float = None):
+        """実行中のクエリを打ち切ってスレッドを終わらせる（接続はスレッド自身が閉じる）"""
+        with self._cond:
+            self._stopped = True
+            self._gen += 1
+            self._pending = None
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def _run(self):
+        conn = get_conn()
+        try:
+            while True:
+                with self._cond:
+                    while self._pending is None and not self._stopped:
+                        self._cond.wait()
+                    if self._stopped:
+                        break
+                    gen, func = self._pending
+                    self._pending = None
+                # 新しい依頼が来たら非0を返して sqlite3 側で中断させる
+                conn.set_progress_handler(lambda gen=gen: int(gen != self._gen), self.PROGRESS_STEPS)
+                try:
+                    result = func()
+                except Exception as e:  # 打ち切り時は sqlite3.OperationalError("interrupted")
+                    result = e
+                finally:
+                    conn.set_progress_handler(None, 0)
+                if gen != self._gen:
+                    self.cancelled += 1
+                    continue
+                self.completed += 1
+                self.results.put((gen, result))
+        finally:
+            get_pool().release()
+
+    def stats_text(self) -> str:
+        return f"検索: 完了 {self.completed} 回 / 打ち切り {self.cancelled} 回"
+
+
 # -------------------------
 # Utility
 # -------------------------
@@ -216,7 +1614,191 @@ def exists_file(path: str) -> bool:
     return bool(path) and os.path.exists(path)
 
 
-def open_path_with_default_app(path: str):
+MEDIA_RECHECK_SEC = 30.0       # この時間より古い結果は、読まれた時に裏で確かめ直す
+MEDIA_REVALIDATE_SEC = 300.0   # ライブラリ全体を確かめ直す間隔
+MEDIA_CHECK_WORKERS = 8        # NAS / USB では1件ずつだと遅いので並列に stat する
+MEDIA_CHECK_CHUNK = 64
+MEDIA_POLL_SEC = 0.25
+
+
+class MediaAvailability:
+    """動画/音源ファイルの有無を専用スレッドで確かめて持っておく（Tk スレッドでは stat しない）
+
+    available() は手元の結果をすぐ返し、古ければ確認を依頼する。結果が変わったパスは changes に入る。
+    """
+
+    def __init__(self, paths_source, recheck: float = MEDIA_RECHECK_SEC, revalidate: float = MEDIA_REVALIDATE_SEC,
+                 workers: int = MEDIA_CHECK_WORKERS):
+        self._paths_source = paths_source  # () -> ライブラリ全体のパス（専用スレッドから呼ぶ）
+        self.recheck = recheck
+        self.revalidate = revalidate
+        self._state = {}  # path -> (ok, checked_at)
+        self._urgent = OrderedDict()
+        self._cond = threading.Condition()
+        self._next_full = 0.0
+        self._stopped = False
+        self.changes = queue.Queue()
+        self.checks = 0
+        self.passes = 0
+        self.last_pass_sec = 0.0
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="media-check")
+        self._thread = threading.Thread(target=self._run, name="media-availability", daemon=True)
+        self._thread.start()
+
+    def available(self, path: str):
+        """True / False / None（まだ確かめていない）"""
+        path = (path or "").strip()
+        if not path:
+            return False
+        with self._cond:
+            st = self._state.get(path)
+        if st is None or time.monotonic() - st[1] > self.recheck:
+            self.request(path)
+        return None if st is None else st[0]
+
+    def request(self, *paths):
+        """優先して確かめる（全体の確認より先に処理する）"""
+        with self._cond:
+            for path in paths:
+                path = (path or "").strip()
+                if path:
+                    self._urgent[path] = None
+            self._cond.notify()
+
+    def revalidate_all(self):
+        with self._cond:
+            self._next_full = 0.0
+            self._cond.notify()
+
+    def broken(self) -> list[str]:
+        with self._cond:
+            return sorted(p for p, (ok, _) in self._state.items() if not ok)
+
+    def stop(self, timeout: float = None):
+        """確認を打ち切る。timeout を渡すと専用スレッドの終了（接続を閉じるまで）を待つ"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        if timeout is not None:
+            self._thread.join(timeout)
+
+    @staticmethod
+    def _check(path: str) -> bool:
+        try:
+            os.stat(path)
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def _check_many(self, paths):
+        with self._cond:
+            if self._stopped:
+                return
+        try:
+            results = list(self._pool.map(self._check, paths))
+        except (RuntimeError, CancelledError):  # 終了処理中（プールが閉じた・待ち中の確認が取り消された）
+            return
+        now = time.monotonic()
+        with self._cond:
+            if self._stopped:
+                return
+            self.checks += len(paths)
+            for path, ok in zip(paths, results):
+                prev = self._state.get(path)
+                self._state[path] = (ok, now)
+                if prev is None or prev[0] != ok:
+                    self.changes.put(path)
+
+    def _take_urgent(self) -> list:
+        with self._cond:
+            paths = list(self._urgent)
+            self._urgent.clear()
+        return paths
+
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    while not self._stopped and not self._urgent and time.monotonic() < self._next_full:
+                        self._cond.wait(self._next_full - time.monotonic())
+                    if self._stopped:
+                        break
+                    full = time.monotonic() >= self._next_full
+                urgent = self._take_urgent()
+                if urgent:
+                    self._check_many(urgent)
+                if full:
+                    self._full_pass()
+        finally:
+            get_pool().release()
+
+    def _full_pass(self):
+        started = time.monotonic()
+        try:
+            paths = list(dict.fromkeys(p.strip() for p in self._paths_source() if p and p.strip()))
+        except Exception:
+            paths = None  # DB を読めなかった → 次の周期に任せる
+        if paths is not None:
+            for i in range(0, len(paths), MEDIA_CHECK_CHUNK):
+                # 全体の確認中でも、現在曲などの依頼は間に挟んで先に答える
+                urgent = self._take_urgent()
+                if urgent:
+                    self._check_many(urgent)
+                with self._cond:
+                    if self._stopped:
+                        return
+                self._check_many(paths[i:i + MEDIA_CHECK_CHUNK])
+            # ライブラリから消えたパス（最近個別に確かめたものは残す）
+            keep = set(paths)
+            with self._cond:
+                now = time.monotonic()
+                self._state = {p: st for p, st in self._state.items() if p in keep or now - st[1] <= self.recheck}
+            self.passes += 1
+            self.last_pass_sec = time.monotonic() - started
+        with self._cond:
+            self._next_full = time.monotonic() + self.revalidate
+
+    def stats_text(self) -> str:
+        with self._cond:
+            known = len(self._state)
+            missing = sum(1 for ok, _ in self._state.values() if not ok)
+        return (
+            f"メディア確認: {known} 件中 見つからない {missing} 件 / 確認 {self.checks} 回"
+            f"（全体確認 {self.passes} 回・前回 {self.last_pass_sec:.1f} 秒）"
+        )
+
+
+def db_media_paths() -> list[str]:
+    rows = get_pool().execute(
+        "SELECT video_path, audio_path FROM songs WHERE COALESCE(video_path, '') <> '' OR COALESCE(audio_path, '') <> ''"
+    ).fetchall()
+    return [p for r in rows for p in (r["video_path"], r["audio_path"]) if p]
+
+
+def db_broken_media_links(broken_paths) -> list[dict]:
+    """見つからないパスを設定している曲（曲・種類ごと）"""
+    out = []
+    paths = list(broken_paths)
+    for i in range(0, len(paths), SQL_MAX_VARIABLES // 2):
+        chunk = paths[i:i + SQL_MAX_VARIABLES // 2]
+        marks = ", ".join("?" * len(chunk))
+        rows = get_pool().execute(
+            f"SELECT id, title, artist, video_path, audio_path FROM songs "
+            f"WHERE video_path IN ({marks}) OR audio_path IN ({marks}) ORDER BY id",
+            chunk + chunk,
+        ).fetchall()
+        wanted = set(chunk)
+        for r in rows:
+            for kind, col in MEDIA_KIND_COLUMNS.items():
+                if r[col] in wanted:
+                    out.append({"song_id": r["id"], "kind": kind, "path": r[col], "title": r["title"], "artist": r["artist"]})
+    out.sort(key=lambda x: (x["song_id"], x["kind"]))
+    return out
+
+
+def open_path_with_default_app(path: str, popen=subprocess.Popen):
+    """既定アプリで開く（終了を待たない）。open / xdg-open の場合はそのプロセス（プレーヤー本体ではない）を返す"""
     path = (path or "").strip()
     if not path:
         raise FileNotFoundError("パスが空です。")
@@ -225,10 +1807,131 @@ def open_path_with_default_app(path: str):
 
     if sys.platform.startswith("win"):
         os.startfile(path)  # noqa
-    elif sys.platform == "darwin":
-        subprocess.run(["open", path], check=False)
-    else:
-        subprocess.run(["xdg-open", path], check=False)
+        return None
+    opener = "open" if sys.platform == "darwin" else "xdg-open"
+    return popen([opener, path], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL, start_new_session=True)
+
+
+def player_command_args(command: str, path: str) -> list[str]:
+    """設定のプレーヤーコマンドを引数リストにする。{path} をファイルパスに置き換える（無ければ末尾に付ける）"""
+    posix = not sys.platform.startswith("win")
+    args = shlex.split(command, posix=posix)
+    if not posix:
+        args = [a[1:-1] if len(a) >= 2 and a[0] == a[-1] == '"' else a for a in args]
+    if not args:
+        raise ValueError("プレーヤーのコマンドが空です。")
+    if any("{path}" in a for a in args):
+        return [a.replace("{path}", path) for a in args]
+    return args + [path]
+
+
+PLAYER_CLOSE_TIMEOUT_SEC = 2.0
+
+
+class MediaLauncher:
+    """動画/音源を別スレッドから起動し、終了は待たない。起動したプロセスをグループ（song / bgm）ごとに覚えておく
+
+    結果（"started" / "error" / "exited"）は results に入るので、Tk スレッドで取り出して表示する。
+    popen は subprocess.Popen と同じ引数で呼ばれる（偽のプレーヤーに差し替えて動作を確かめられる）。
+    """
+
+    def __init__(self, command: str = "", popen=subprocess.Popen):
+        self.command = command  # 空なら既定アプリ（この場合、プレーヤー本体は追跡できない）
+        self._popen = popen
+        self._procs = {}  # group -> [(Popen, label)]
+        self._openers = []  # [(Popen, label)] 既定アプリを開く open / xdg-open（すぐ終わる。閉じる対象にはしない）
+        self._lock = threading.Lock()
+        self.results = queue.Queue()  # (kind, label, detail)
+        self.launched = 0
+        self.failed = 0
+        self.closed = 0
+
+    def launch(self, path: str, label: str, group: str = "song"):
+        threading.Thread(target=self._launch, args=(path, label, group), name="media-launch", daemon=True).start()
+
+    def _spawn(self, path: str):
+        if not self.command:
+            return open_path_with_default_app(path, self._popen)
+        path = (path or "").strip()
+        if not path or not os.path.exists(path):
+            raise FileNotFoundError(f"見つかりません: {path}" if path else "パスが空です。")
+        return self._popen(player_command_args(self.command, path), stdin=subprocess.DEVNULL,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+
+    def _launch(self, path: str, label: str, group: str):
+        try:
+            proc = self._spawn(path)
+        except Exception as e:  # FileNotFoundError / OSError（コマンドが無い等）/ ValueError
+            with self._lock:
+                self.failed += 1
+            self.results.put(("error", label, e))
+            return
+        with self._lock:
+            self.launched += 1
+            if proc is not None and self.command:
+                self._procs.setdefault(group, []).append((proc, label))
+            elif proc is not None:
+                # open / xdg-open はすぐ終わるので閉じる対象にせず、異常終了（対応アプリが無い等）の報告だけに使う
+                self._openers.append((proc, label))
+        self.results.put(("started", label, None))
+
+    def running(self, group: str = None) -> int:
+        with self._lock:
+            groups = [group] if group else list(self._procs)
+            return sum(1 for g in groups for proc, _ in self._procs.get(g, []) if proc.poll() is None)
+
+    def close_group(self, group: str = "song") -> int:
+        """group で起動したプロセスを閉じる（応答しなければ PLAYER_CLOSE_TIMEOUT_SEC 後に強制終了）"""
+        with self._lock:
+            procs = [p for p, _ in self._procs.pop(group, []) if p.poll() is None]
+            self.closed += len(procs)
+        if procs:
+            threading.Thread(target=self._terminate, args=(procs,), name="media-close", daemon=True).start()
+        return len(procs)
+
+    @staticmethod
+    def _terminate(procs):
+        for proc in procs:
+            try:
+                proc.terminate()
+            except OSError:
+                pass
+        for proc in procs:
+            try:
+                proc.wait(PLAYER_CLOSE_TIMEOUT_SEC)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    def reap(self):
+        """終了したプロセスを手放す（待たない）。異常終了は results に入れる"""
+        with self._lock:
+            openers = []
+            for proc, label in self._openers:
+                code = proc.poll()
+                if code is None:
+                    openers.append((proc, label))
+                elif code != 0:
+                    self.results.put(("exited", label, code))
+            self._openers = openers
+            for group, procs in list(self._procs.items()):
+                alive = []
+                for proc, label in procs:
+                    code = proc.poll()
+                    if code is None:
+                        alive.append((proc, label))
+                    elif code != 0:
+                        self.results.put(("exited", label, code))
+                if alive:
+                    self._procs[group] = alive
+                else:
+                    del self._procs[group]
+
+    def stats_text(self) -> str:
+        return (
+            f"プレーヤー起動: {self.launched} 回（失敗 {self.failed} 回）/ 実行中 {self.running()} / "
+            f"次の曲で閉じた {self.closed} 回"
+        )
 
 
 def safe_open_url(url: str):
@@ -261,6 +1964,533 @@ def format_youtube_ts(total_seconds: int) -> str:
     return f"{h:d}:{m:02d}:{s:02d}"
 
 
+def format_srt_ts(total_seconds: int) -> str:
+    return format_hhmmss(total_seconds) + ",000"
+
+
+# -------------------------
+# タイムスタンプ（スタンプタブ・書き出し）
+# -------------------------
+STAMP_OPENING = "開始"
+STAMP_UNKNOWN_TITLE = "(不明)"
+
+
+class StampLog:
+    """歌った曲の開始時刻と曲名を持つ。曲名は記録時に1回だけ引き、表示・書き出しでは DB を読まない"""
+
+    def __init__(self):
+        self.entries = []  # [{"song_id":int,"start_sec":int,"title":str,"artist":str}]
+
+    @staticmethod
+    def _entry(song_id: int, start_sec: int, row) -> dict:
+        return {
+            "song_id": int(song_id),
+            "start_sec": int(start_sec),
+            "title": row["title"] if row else STAMP_UNKNOWN_TITLE,
+            "artist": row["artist"] if row else "",
+        }
+
+    def reset(self, events, rows):
+        """events と同じ順の rows（db_get_songs の結果）で作り直す"""
+        self.entries = [self._entry(ev["song_id"], ev["start_sec"], row) for ev, row in zip(events, rows)]
+
+    def append(self, song_id: int, start_sec: int, row) -> str:
+        """1曲追加し、その曲の YouTube 用の行を返す"""
+        entry = self._entry(song_id, start_sec, row)
+        self.entries.append(entry)
+        return self.youtube_line(entry)
+
+    def retitle(self, song_id: int, row) -> bool:
+        """曲情報の編集を反映する（該当する行があれば True）"""
+        changed = False
+        for entry in self.entries:
+            if entry["song_id"] == song_id:
+                entry.update(self._entry(song_id, entry["start_sec"], row))
+                changed = True
+        return changed
+
+    @staticmethod
+    def youtube_line(entry: dict) -> str:
+        return f"{format_youtube_ts(entry['start_sec'])} {entry['title']}"
+
+    def youtube_lines(self):
+        yield f"{format_youtube_ts(0)} {STAMP_OPENING}"
+        for entry in self.entries:
+            yield self.youtube_line(entry)
+
+    # ---- 書き出し（1行ずつファイルへ流す） ----
+    def _write_txt(self, f, end_sec: int):
+        for line in self.youtube_lines():
+            f.write(line + "\n")
+
+    def _write_csv(self, f, end_sec: int):
+        w = csv.writer(f)
+        w.writerow(["timestamp", "start_sec", "title", "artist", "song_id"])
+        for entry in self.entries:
+            w.writerow([format_youtube_ts(entry["start_sec"]), entry["start_sec"], entry["title"], entry["artist"],
+                        entry["song_id"]])
+
+    def _write_srt(self, f, end_sec: int):
+        """チャプター字幕: 各曲を次の曲の開始（最後の曲は end_sec）までの区間にする"""
+        cues = []
+        if self.entries and self.entries[0]["start_sec"] > 0:
+            cues.append((0, STAMP_OPENING))
+        cues.extend((entry["start_sec"], entry["title"]) for entry in self.entries)
+        for n, (start, title) in enumerate(cues, 1):
+            end = cues[n][0] if n < len(cues) else end_sec
+            end = max(end, start + 1)
+            f.write(f"{n}\n{format_srt_ts(start)} --> {format_srt_ts(end)}\n{title}\n\n")
+
+    def _write_json(self, f, end_sec: int):
+        f.write("[")
+        for n, entry in enumerate(self.entries):
+            item = dict(entry, timestamp=format_youtube_ts(entry["start_sec"]))
+            f.write(("," if n else "") + "\n  " + json.dumps(item, ensure_ascii=False))
+        f.write("\n]\n")
+
+    EXPORT_FORMATS = {  # 拡張子 -> (表示名, 書き出しメソッド名)
+        ".txt": ("YouTube 概要欄（テキスト）", "_write_txt"),
+        ".csv": ("CSV", "_write_csv"),
+        ".srt": ("SRT（チャプター字幕）", "_write_srt"),
+        ".json": ("JSON", "_write_json"),
+    }
+
+    def export(self, path: str, end_sec: int = 0) -> int:
+        """拡張子で形式を決めて書き出し、書いた曲数を返す"""
+        ext = os.path.splitext(path)[1].lower()
+        if ext not in self.EXPORT_FORMATS:
+            raise ValueError(f"未対応の形式です: {ext or '(拡張子なし)'}")
+        writer = getattr(self, self.EXPORT_FORMATS[ext][1])
+        encoding = "utf-8-sig" if ext == ".csv" else "utf-8"  # Excel で文字化けしないよう CSV は BOM 付き
+        with open(path, "w", encoding=encoding, newline="") as f:
+            writer(f, int(end_sec))
+        return len(self.entries)
+
+
+# -------------------------
+# ファイル書き込み（バックグラウンド・原子的置換）
+# -------------------------
+FILE_WRITE_COALESCE_SEC = 0.2
+FILE_REPLACE_RETRIES = 5  # Windows で読み込み中のファイルを置き換えられない時の再試行回数
+
+
+def write_file_atomic(path: str, text: str, fsync: bool = False):
+    """同じフォルダの一時ファイルに書いてから os.replace で差し替える（読み手は常に完全な内容を見る）"""
+    path = os.path.abspath(path)
+    folder = os.path.dirname(path)
+    tmp_path = os.path.join(folder, f".{os.path.basename(path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        for attempt in range(FILE_REPLACE_RETRIES):
+            try:
+                os.replace(tmp_path, path)
+                return
+            except PermissionError:
+                if attempt == FILE_REPLACE_RETRIES - 1:
+                    raise
+                time.sleep(0.05 * (attempt + 1))
+    finally:
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+class FileWriter:
+    """ファイル書き込みを専用スレッドで行う。窓時間内の同じパスへの書き込みは最後の内容だけを書く"""
+
+    def __init__(self, delay: float = FILE_WRITE_COALESCE_SEC):
+        self.delay = delay
+        self._cond = threading.Condition()
+        self._pending = {}  # path -> [text, due(monotonic)]
+        self._busy = 0
+        self._thread = None
+        self.requests = 0
+        self.writes = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.last_error = ""
+
+    def write(self, path: str, text: str):
+        """text を path へ書く予約をする（すぐ戻る）"""
+        path = os.path.abspath(path)
+        with self._cond:
+            self.requests += 1
+            item = self._pending.get(path)
+            if item is not None:
+                item[0] = text  # 期限は最初の予約のまま（連打でいつまでも書かれないのを防ぐ）
+                self.coalesced += 1
+            else:
+                self._pending[path] = [text, time.monotonic() + self.delay]
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="file-writer", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def discard(self, path: str):
+        """まだ書いていない予約を取り消す（削除するファイル用）"""
+        with self._cond:
+            self._pending.pop(os.path.abspath(path), None)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """予約中の書き込みをすぐ実行させ、終わるまで待つ（終了時用）"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            for item in self._pending.values():
+                item[1] = 0.0
+            self._cond.notify_all()
+            while self._pending or self._busy:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _next_due(self):
+        """期限が来た予約を1件取り出す。なければ待つ"""
+        with self._cond:
+            while True:
+                if self._pending:
+                    path, (text, due) = min(self._pending.items(), key=lambda kv: kv[1][1])
+                    wait = due - time.monotonic()
+                    if wait <= 0:
+                        del self._pending[path]
+                        self._busy += 1
+                        return path, text
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+
+    def _run(self):
+        while True:
+            path, text = self._next_due()
+            try:
+                write_file_atomic(path, text)
+                ok, err = True, ""
+            except Exception as e:
+                ok, err = False, f"{os.path.basename(path)}: {e}"
+            with self._cond:
+                self._busy -= 1
+                if ok:
+                    self.writes += 1
+                else:
+                    self.errors += 1
+                    self.last_error = err
+                self._cond.notify_all()
+
+    def stats_text(self) -> str:
+        with self._cond:
+            text = (
+                f"ファイル書き込み: 依頼 {self.requests} 回 / 実書き込み {self.writes} 回"
+                f"（まとめて省略 {self.coalesced} 回）/ 待機中 {len(self._pending)} 件 / 失敗 {self.errors} 回"
+            )
+            if self.last_error:
+                text += f"（最後の失敗: {self.last_error}）"
+        return text
+
+
+# -------------------------
+# セッションジャーナル（キュー/現在曲/履歴/タイマーを追記型で記録し、クラッシュ後に復元）
+# -------------------------
+JOURNAL_FSYNC_SEC = 1.0       # この間隔でまとめて fsync する
+JOURNAL_COMPACT_OPS = 200     # この件数たまったらスナップショットに畳む
+
+
+def new_session_state() -> dict:
+    return {
+        "queue_ids": [],
+        "now_id": None,
+        "now_start_sec": 0,
+        "finished_entries": [],  # [{"song_id":int,"start_sec":int}]
+        "session_events": [],    # [{"song_id":int,"start_sec":int}]
+        "timer_accum": 0.0,
+        "timer_started_wall": None,  # 動作中なら開始時刻（epoch秒）
+        "stream_id": None,           # streams.id（最初の曲を歌った時に作る）
+    }
+
+
+def apply_session_op(state: dict, op: dict):
+    """ジャーナル1件を state に適用する（アプリ側の操作と同じ結果になるようにする）"""
+    kind = op.get("op")
+    if kind == "queue_add":
+        state["queue_ids"].append(int(op["id"]))
+    elif kind == "queue_add_many":
+        state["queue_ids"].extend(int(x) for x in op["ids"])
+    elif kind == "queue_remove":
+        state["queue_ids"].pop(int(op["idx"]))
+    elif kind == "queue_move":
+        sid = state["queue_ids"].pop(int(op["from"]))
+        state["queue_ids"].insert(int(op["to"]), sid)
+    elif kind == "select":
+        if state["now_id"] is not None:
+            state["finished_entries"].append({"song_id": state["now_id"], "start_sec": state["now_start_sec"]})
+        state["now_id"] = state["queue_ids"].pop(int(op["idx"]))
+        state["now_start_sec"] = int(op["start"])
+        state["session_events"].append({"song_id": state["now_id"], "start_sec": state["now_start_sec"]})
+        if op.get("stream") is not None:
+            state["stream_id"] = int(op["stream"])
+    elif kind == "clear_done":
+        state["finished_entries"] = []
+    elif kind == "timer":
+        state["timer_accum"] = float(op["accum"])
+        state["timer_started_wall"] = op.get("started")
+    elif kind == "reset":
+        state.clear()
+        state.update(new_session_state())
+
+
+class SessionJournal:
+    """1操作1行の JSON を追記する。書き込みは即時（OS まで）、fsync は専用スレッドでまとめて行う
+
+    復元: スナップショット（seq まで反映済み）を読み、seq より新しい行だけを順に適用する。
+    """
+
+    def __init__(self, path: str = SESSION_JOURNAL_FILE, snapshot_path: str = SESSION_SNAPSHOT_FILE,
+                 fsync_interval: float = JOURNAL_FSYNC_SEC, compact_ops: int = JOURNAL_COMPACT_OPS):
+        self.path = os.path.abspath(path)
+        self.snapshot_path = os.path.abspath(snapshot_path)
+        self.fsync_interval = fsync_interval
+        self.compact_ops = compact_ops
+        self.seq = 0
+        self.ops_since_snapshot = 0
+        self._f = None
+        self._cond = threading.Condition()
+        self._unsynced = False
+        self._syncing = False
+        self._closed = False
+        self._thread = None
+        self._pending_snapshot = None  # (seq, JSON) 専用スレッドが書く
+        self._tail = None  # スナップショット依頼後に追記した行（切り詰め後のジャーナルに残す）
+        self.appends = 0
+        self.fsyncs = 0
+        self.compactions = 0
+        self.replayed = 0
+        self.replay_ms = 0.0
+        self.errors = 0
+
+    def load(self) -> dict:
+        """前回のセッションを復元する（ファイルが無ければ空のセッション）"""
+        t0 = time.perf_counter()
+        state = new_session_state()
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snap = json.load(f)
+            state.update(snap.get("state") or {})
+            self.seq = int(snap.get("seq", 0))
+        except (OSError, ValueError, TypeError, AttributeError):
+            pass
+        damaged = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        op = json.loads(line)
+                    except ValueError:
+                        damaged = True  # 書きかけの最終行（クラッシュ時）
+                        continue
+                    if not isinstance(op, dict) or int(op.get("seq", 0)) <= self.seq:
+                        continue  # スナップショットに反映済み
+                    try:
+                        apply_session_op(state, op)
+                    except (KeyError, IndexError, TypeError, ValueError):
+                        self.errors += 1
+                        damaged = True
+                        continue
+                    self.seq = int(op["seq"])
+                    self.replayed += 1
+                    self.ops_since_snapshot += 1
+        except (OSError, UnicodeDecodeError):
+            damaged = os.path.exists(self.path)
+        if damaged:
+            # 壊れた行を残したまま追記すると次の行とつながって読めなくなるので、ここで畳んでおく
+            self._compact_now(json.dumps({"seq": self.seq, "state": state}, ensure_ascii=False))
+        self.replay_ms = (time.perf_counter() - t0) * 1000
+        return state
+
+    def _compact_now(self, snap: str, tail=()):
+        """スナップショットを書いてからジャーナルを tail だけにする（起動時・終了時用。呼び出し元で待つ）"""
+        try:
+            write_file_atomic(self.snapshot_path, snap, fsync=True)
+            if self._f is not None:
+                self._f.close()
+            self._f = open(self.path, "w", encoding="utf-8")
+            self._f.writelines(tail)
+            self._f.flush()
+            os.fsync(self._f.fileno())
+        except OSError:
+            self.errors += 1
+            return
+        self._unsynced = False
+        self.ops_since_snapshot = 0
+        self.compactions += 1
+
+    def _open_for_append(self):
+        f = open(self.path, "a", encoding="utf-8")
+        try:
+            with open(self.path, "rb") as raw:
+                raw.seek(0, os.SEEK_END)
+                if raw.tell() > 0:
+                    raw.seek(-1, os.SEEK_END)
+                    if raw.read(1) != b"\n":
+                        f.write("\n")  # 念のため: 改行で終わっていなければ前の行と分ける
+        except OSError:
+            pass
+        return f
+
+    def append(self, op: dict):
+        """操作を1行追記する（すぐ戻る。ディスクへの確定は fsync スレッドが行う）"""
+        with self._cond:
+            if self._closed:
+                return
+            self.seq += 1
+            line = json.dumps(dict(op, seq=self.seq), ensure_ascii=False, separators=(",", ":")) + "\n"
+            try:
+                if self._f is None:
+                    self._f = self._open_for_append()
+                self._f.write(line)
+                self._f.flush()
+            except OSError:
+                self.errors += 1
+                return
+            if self._tail is not None:
+                self._tail.append(line)
+            self.appends += 1
+            self.ops_since_snapshot += 1
+            self._unsynced = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="session-journal", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def needs_compaction(self) -> bool:
+        return self.ops_since_snapshot >= self.compact_ops
+
+    def compact(self, state: dict):
+        """現在の state をスナップショットにしてジャーナルを空にする。書き込みは専用スレッドが行う（すぐ戻る）"""
+        with self._cond:
+            if self._closed:
+                return
+            snap = json.dumps({"seq": self.seq, "state": state}, ensure_ascii=False)
+            self._pending_snapshot = (self.seq, snap)
+            self._tail = []
+            self.ops_since_snapshot = 0
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="session-journal", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _write_pending_snapshot_locked(self):
+        """専用スレッド: ロックを外してスナップショットを fsync 付きで書き、確定後にジャーナルを切り詰める"""
+        _seq, snap = self._pending_snapshot
+        self._pending_snapshot = None
+        self._syncing = True
+        self._cond.release()
+        try:
+            write_file_atomic(self.snapshot_path, snap, fsync=True)
+            ok = True
+        except OSError:
+            ok = False
+        finally:
+            self._cond.acquire()
+            self._syncing = False
+            self._cond.notify_all()
+        if not ok:
+            self.errors += 1
+            if self._pending_snapshot is None:
+                self._tail = None  # ジャーナルはそのまま（次の機会に畳む）
+            return
+        if self._pending_snapshot is not None:
+            return  # 書いている間に次の依頼が来た → 切り詰めはそちらで行う
+        # スナップショットが確定してから切り詰める（依頼後の行は残す。seq で重複は防げる）
+        try:
+            if self._f is not None:
+                self._f.close()
+            self._f = open(self.path, "w", encoding="utf-8")
+            self._f.writelines(self._tail or [])
+            self._f.flush()
+        except OSError:
+            self.errors += 1
+            self._f = None
+        self._tail = None
+        self._unsynced = True  # 切り詰めの確定は通常の fsync に任せる
+        self.compactions += 1
+
+    def _wait_idle_locked(self):
+        while self._syncing:
+            self._cond.wait()
+
+    def _sync_locked(self):
+        if self._f is not None and self._unsynced:
+            try:
+                os.fsync(self._f.fileno())
+                self.fsyncs += 1
+            except OSError:
+                self.errors += 1
+        self._unsynced = False
+
+    def _run(self):
+        with self._cond:
+            while not self._closed:
+                if self._pending_snapshot is not None:
+                    self._write_pending_snapshot_locked()
+                    continue
+                if not self._unsynced:
+                    self._cond.wait()
+                    continue
+                # 最初の未確定の書き込みから fsync_interval 待ち、その間の操作をまとめて確定する
+                deadline = time.monotonic() + self.fsync_interval
+                remaining = self.fsync_interval
+                while remaining > 0 and not self._closed and self._pending_snapshot is None:
+                    self._cond.wait(remaining)
+                    remaining = deadline - time.monotonic()
+                if self._closed or self._f is None or not self._unsynced:
+                    continue
+                # fsync 中も追記できるようにロックを外す（close/compact は終わるまで待つ）
+                fd = self._f.fileno()
+                self._unsynced = False
+                self._syncing = True
+                self._cond.release()
+                try:
+                    os.fsync(fd)
+                    ok = True
+                except OSError:
+                    ok = False
+                finally:
+                    self._cond.acquire()
+                    self._syncing = False
+                    self._cond.notify_all()
+                if ok:
+                    self.fsyncs += 1
+                else:
+                    self.errors += 1
+
+    def close(self):
+        with self._cond:
+            self._wait_idle_locked()
+            if self._pending_snapshot is not None:
+                # 終了時に残っている依頼はここで書き切る
+                self._compact_now(self._pending_snapshot[1], self._tail or [])
+                self._pending_snapshot = None
+                self._tail = None
+            self._sync_locked()
+            self._closed = True
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+            self._cond.notify_all()
+
+    def stats_text(self) -> str:
+        return (
+            f"セッション記録: 追記 {self.appends} 回 / fsync {self.fsyncs} 回 / 畳み込み {self.compactions} 回 / "
+            f"起動時の再生 {self.replayed} 件（{self.replay_ms:.1f} ms）/ 失敗 {self.errors} 回"
+        )
+
+
 # -------------------------
 # Theme
 # -------------------------
@@ -419,74 +2649,763 @@ html, body{
 .brand{
   font-weight: 800;
 }
+.col.solo{
+  flex: 1 1 auto;
+}
+.lyrics{
+  margin-top: 10px;
+  flex: 1 1 auto;
+  min-height: 0;
+  overflow: hidden;
+  white-space: pre-wrap;
+  font-size: var(--list);
+  line-height: 1.5;
+  color: var(--text);
+}
 """
 
-def build_viewer_html(state: dict) -> str:
-    """state を丸ごとHTMLに埋め込む（JS不要）"""
-    now_title = state.get("now_title", "")
-    timer = state.get("timer", "00:00:00")
-    provider = state.get("now_provider", "")
-    queue = state.get("queue", [])[:12]
-    done = state.get("done", [])[:12]
+def _esc(s: str) -> str:
+    return (s or "").replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
 
-    show_dt = bool(state.get("show_datetime", True))
-    show_brand = bool(state.get("show_brand", True))
-    dt_text = state.get("updated_at", "")
-    brand_text = state.get("brand_text", "Roent.List")
 
-    w = int(state.get("viewer_w", 800))
-    h = int(state.get("viewer_h", 600))
+# Viewer の区画と、各区画が依存する state のキー
+VIEWER_SECTIONS = {
+    "now": ("now_title", "now_provider", "now_lyrics"),
+    "queue": ("queue",),
+    "done": ("done",),
+    "settings": ("viewer_w", "viewer_h", "show_datetime", "show_brand", "brand_text"),
+    "timer": ("timer_accum", "timer_started_at", "timer_running"),
+}
 
-    def esc(s: str) -> str:
-        return (s or "").replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
 
-    meta_html = f"音源: {esc(provider)} 様" if provider else "音源: &nbsp;"
+VIEWER_LIST_LIMIT = 12
+
+
+def render_viewer_fragments(state: dict, sections=VIEWER_SECTIONS,
+                            queue_limit: int = VIEWER_LIST_LIMIT, done_limit: int = VIEWER_LIST_LIMIT) -> dict:
+    """指定区画のHTML断片だけを作る（変わっていない区画は作り直さない）"""
+    frags = {}
+    if "now" in sections:
+        provider = state.get("now_provider", "")
+        frags["now_title"] = _esc(state.get("now_title", ""))
+        frags["meta"] = f"音源: {_esc(provider)} 様" if provider else "音源: &nbsp;"
+        frags["lyrics"] = _esc(state.get("now_lyrics", ""))
+    if "queue" in sections:
+        queue = state.get("queue", [])[:queue_limit]
+        frags["queue"] = "\n".join([f"<div>{_esc(x)}</div>" for x in queue]) if queue else "<div>—</div>"
+    if "done" in sections:
+        done = state.get("done", [])[:done_limit]
+        frags["done"] = "\n".join([f"<div>{_esc(x)}</div>" for x in done]) if done else "<div>—</div>"
+    if "settings" in sections:
+        frags["w"] = str(int(state.get("viewer_w", 800)))
+        frags["h"] = str(int(state.get("viewer_h", 600)))
+        frags["show_dt"] = bool(state.get("show_datetime", True))
+        frags["brand"] = _esc(state.get("brand_text", "Roent.List")) if state.get("show_brand", True) else "&nbsp;"
+    if "timer" in sections:
+        # 秒の刻みはページ内のスクリプトが行う。ここでは開始時刻などの状態だけを埋め込む
+        accum = float(state.get("timer_accum", 0.0))
+        started = state.get("timer_started_at")
+        running = bool(state.get("timer_running")) and started is not None
+        frags["timer_state"] = f"{accum:.3f},{(started or 0.0):.3f},{int(running)}"
+        frags["timer"] = _esc(format_hhmmss(accum))
+    return frags
+
+
+def viewer_fields(state: dict, fragments: dict = None) -> dict:
+    """ページ内の差し替え単位（data-f 属性）ごとのHTML。秒単位で変わる値は含めない"""
+    if fragments is None:
+        fragments = render_viewer_fragments(state)
+    return {
+        "size": f"{fragments['w']}x{fragments['h']}",
+        "timer_state": fragments["timer_state"],
+        "dt_on": "1" if fragments["show_dt"] else "0",
+        "now_title": fragments["now_title"],
+        "timer": fragments["timer"],
+        "meta": fragments["meta"],
+        "queue": fragments["queue"],
+        "done": fragments["done"],
+        "lyrics": fragments["lyrics"],
+        "brand": fragments["brand"],
+    }
+
+
+# タイマーと日時はページ内で刻む（view.html を毎秒書き換えないため）
+# body の data-timer = "累積秒,開始時刻(epoch秒),動作中(0/1)"
+VIEWER_TIMER_SCRIPT = r"""<script>
+(function(){
+  function p2(n){ return (n < 10 ? "0" : "") + n; }
+  function tick(){
+    var b = document.body;
+    var st = (b.getAttribute("data-timer") || "0,0,0").split(",");
+    var sec = parseFloat(st[0]) || 0;
+    if (st[2] === "1") { sec += Date.now() / 1000 - (parseFloat(st[1]) || 0); }
+    sec = Math.max(0, Math.floor(sec));
+    var t = document.querySelector('[data-f="timer"]');
+    if (t) { t.textContent = p2(Math.floor(sec / 3600)) + ":" + p2(Math.floor(sec % 3600 / 60)) + ":" + p2(sec % 60); }
+    var dt = document.querySelector('[data-f="dt"]');
+    if (dt) {
+      var d = new Date();
+      dt.innerHTML = b.getAttribute("data-dt") === "1"
+        ? d.getFullYear() + "-" + p2(d.getMonth() + 1) + "-" + p2(d.getDate()) + " " + p2(d.getHours()) + ":" + p2(d.getMinutes()) + ":" + p2(d.getSeconds())
+        : "&nbsp;";
+    }
+  }
+  function loop(){ tick(); setTimeout(loop, 1005 - Date.now() % 1000); }
+  window.rlTick = tick;
+  loop();
+})();
+</script>"""
+
+
+# ライブ配信時: /events (SSE) を受けて変わった data-f 要素だけ書き換える
+VIEWER_LIVE_SCRIPT = r"""<script>
+(function(){
+  var size = document.body.getAttribute("data-size");
+  var layout = document.body.getAttribute("data-layout");
+  var es = new EventSource("/events?o=" + encodeURIComponent(document.body.getAttribute("data-out") || "view"));
+  es.onmessage = function(ev){
+    var d = JSON.parse(ev.data);
+    if ((d.size !== undefined && d.size !== size) || (d.layout !== undefined && d.layout !== layout)) { location.reload(); return; }
+    if (d.css !== undefined) { var css = document.getElementById("css"); css.href = css.getAttribute("href").split("?")[0] + "?v=" + d.css; }
+    if (d.timer_state !== undefined) { document.body.setAttribute("data-timer", d.timer_state); }
+    if (d.dt_on !== undefined) { document.body.setAttribute("data-dt", d.dt_on); }
+    for (var k in d) {
+      var el = document.querySelector('[data-f="' + k + '"]');
+      if (el && el.innerHTML !== d[k]) { el.innerHTML = d[k]; }
+    }
+    window.rlTick();
+  };
+})();
+</script>"""
 
-    q_html = "\n".join([f"<div>{esc(x)}</div>" for x in queue]) if queue else "<div>—</div>"
-    d_html = "\n".join([f"<div>{esc(x)}</div>" for x in done]) if done else "<div>—</div>"
 
-    dt_html = esc(dt_text) if (show_dt and dt_text) else "&nbsp;"
-    brand_html = esc(brand_text) if show_brand else "&nbsp;"
 
-    return f"""<!DOCTYPE html>
+# -------------------------
+# Viewer テンプレート（一度だけ分解して、描画は断片の連結だけで行う）
+# -------------------------
+TEMPLATE_SLOT_RE = re.compile(r"\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}")
+CSS_SLOT_RE = re.compile(r"__([A-Z][A-Z0-9]*)__")
+VIEWER_TEMPLATE_DIR = "templates"  # obs_viewer/templates/*.html
+VIEWER_DEFAULT_LAYOUT = "default"
+VIEWER_MAIN_OUTPUT = "view"  # obs_viewer/view.html + style.css
+
+
+class ViewerTemplate:
+    """テンプレート文字列を固定部分と差し込み口（スロット）に分解して保持する"""
+
+    def __init__(self, text: str, slot_re=TEMPLATE_SLOT_RE):
+        parts = []
+        slots = []
+        pos = 0
+        for m in slot_re.finditer(text):
+            parts.append(text[pos:m.start()])
+            slots.append((len(parts), m.group(1).lower()))
+            parts.append("")
+            pos = m.end()
+        parts.append(text[pos:])
+        self._parts = parts
+        self._slots = tuple(slots)
+        self.slots = frozenset(name for _, name in slots)
+
+    def render(self, values: dict) -> str:
+        parts = self._parts.copy()
+        for i, name in self._slots:
+            parts[i] = str(values.get(name, ""))
+        return "".join(parts)
+
+
+# 既定レイアウト。obs_viewer/templates/ に置く独自テンプレートも同じスロット名を使う
+# （data-f 属性の要素はライブ配信時に差し替えられる）
+_VIEWER_PAGE_HEAD = """<!DOCTYPE html>
 <html lang="ja">
 <head>
 <meta charset="UTF-8" />
-<meta name="viewport" content="width={w}, height={h}, initial-scale=1" />
-<meta http-equiv="refresh" content="1" />
-<title>Roent.List Viewer</title>
-<link rel="stylesheet" href="style.css" />
+<meta name="viewport" content="width={{w}}, height={{h}}, initial-scale=1" />
+{{refresh}}<title>Roent.List Viewer</title>
+<link id="css" rel="stylesheet" href="{{stylesheet}}" />
 </head>
-<body>
+<body {{body_attrs}}>
   <div class="wrapper">
     <div class="card">
-      <div class="h">
-        <div class="nowTitle">{esc(now_title)}</div>
-        <div class="timer">{esc(timer)}</div>
+"""
+_VIEWER_PAGE_TAIL = """    </div>
+  </div>
+{{script}}</body>
+</html>
+"""
+_VIEWER_NOW_BLOCK = """      <div class="h">
+        <div class="nowTitle" data-f="now_title">{{now_title}}</div>
+        <div class="timer" data-f="timer">{{timer}}</div>
       </div>
+"""
 
-      <div class="meta">{meta_html}</div>
+VIEWER_DEFAULT_TEMPLATE = _VIEWER_PAGE_HEAD + _VIEWER_NOW_BLOCK + """
+      <div class="meta" data-f="meta">{{meta}}</div>
 
       <div class="row">
         <div class="col">
           <div class="sectionTitle">Queue</div>
-          <div class="list">{q_html}</div>
+          <div class="list" data-f="queue">{{queue}}</div>
         </div>
         <div class="col">
           <div class="sectionTitle">Done</div>
-          <div class="list">{d_html}</div>
+          <div class="list" data-f="done">{{done}}</div>
         </div>
       </div>
 
       <div class="footer">
-        <div class="dt">{dt_html}</div>
-        <div class="brand">{brand_html}</div>
+        <div class="dt" data-f="dt">&nbsp;</div>
+        <div class="brand" data-f="brand">{{brand}}</div>
       </div>
-    </div>
-  </div>
-</body>
-</html>
-"""
+""" + _VIEWER_PAGE_TAIL
+
+# 場面別の組み込みレイアウト（現在曲だけ / キューだけ / Doneだけ / 歌詞）
+VIEWER_SCENE_TEMPLATES = {
+    "now": _VIEWER_PAGE_HEAD + _VIEWER_NOW_BLOCK + """      <div class="meta" data-f="meta">{{meta}}</div>
+""" + _VIEWER_PAGE_TAIL,
+    "queue": _VIEWER_PAGE_HEAD + """      <div class="col solo">
+        <div class="sectionTitle">Queue</div>
+        <div class="list" data-f="queue">{{queue}}</div>
+      </div>
+""" + _VIEWER_PAGE_TAIL,
+    "done": _VIEWER_PAGE_HEAD + """      <div class="col solo">
+        <div class="sectionTitle">Done</div>
+        <div class="list" data-f="done">{{done}}</div>
+      </div>
+""" + _VIEWER_PAGE_TAIL,
+    "lyrics": _VIEWER_PAGE_HEAD + """      <div class="nowTitle" data-f="now_title">{{now_title}}</div>
+      <div class="lyrics" data-f="lyrics">{{lyrics}}</div>
+""" + _VIEWER_PAGE_TAIL,
+}
+
+_DEFAULT_TEMPLATE = ViewerTemplate(VIEWER_DEFAULT_TEMPLATE)
+_SCENE_TEMPLATES = {name: ViewerTemplate(text) for name, text in VIEWER_SCENE_TEMPLATES.items()}
+
+
+class ViewerTemplateLoader:
+    """obs_viewer/templates/<名前>.html を読み込む。更新日時が変わった時だけ作り直す"""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self._lock = threading.Lock()
+        self._cache = {}  # name -> (mtime_ns, size, ViewerTemplate)
+        self.compiles = 0
+        self.errors = 0
+
+    def names(self) -> list[str]:
+        try:
+            files = os.listdir(self.folder)
+        except OSError:
+            return []
+        return sorted(os.path.splitext(fn)[0] for fn in files if fn.lower().endswith(".html"))
+
+    def get(self, name: str) -> ViewerTemplate:
+        """フォルダのファイル → 組み込みの場面別レイアウト → 既定レイアウト の順に探す"""
+        name = (name or "").strip()
+        if not name or name == VIEWER_DEFAULT_LAYOUT:
+            return _DEFAULT_TEMPLATE
+        fallback = _SCENE_TEMPLATES.get(name, _DEFAULT_TEMPLATE)
+        path = os.path.join(self.folder, os.path.basename(name) + ".html")
+        try:
+            st = os.stat(path)
+        except OSError:
+            return fallback
+        with self._lock:
+            cached = self._cache.get(name)
+            if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                return cached[2]
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                tpl = ViewerTemplate(f.read())
+        except (OSError, UnicodeDecodeError):
+            with self._lock:
+                self.errors += 1
+            return fallback
+        with self._lock:
+            self._cache[name] = (st.st_mtime_ns, st.st_size, tpl)
+            self.compiles += 1
+        return tpl
+
+    def stats_text(self) -> str:
+        return f"Viewerテンプレート: 読み込み/再コンパイル {self.compiles} 回 / 読み込み失敗 {self.errors} 回"
+
+
+def viewer_output_files(output: str) -> tuple[str, str]:
+    """出力名 → (HTMLファイル名, CSSファイル名)。既定の出力だけ view.html / style.css"""
+    if output == VIEWER_MAIN_OUTPUT:
+        return "view.html", "style.css"
+    return f"{output}.html", f"{output}.css"
+
+
+def render_viewer_page(fields: dict, live: bool = False, template: ViewerTemplate = None,
+                       output: str = None) -> str:
+    """live=False: 1秒ごとに再読み込みするローカルファイル版 / live=True: SSE で部分更新"""
+    output = output or VIEWER_MAIN_OUTPUT
+    w, _, h = fields["size"].partition("x")
+    values = dict(fields)
+    values["w"] = w
+    values["h"] = h
+    values["stylesheet"] = viewer_output_files(output)[1]
+    values["refresh"] = "" if live else '<meta http-equiv="refresh" content="1" />\n'
+    values["script"] = VIEWER_TIMER_SCRIPT + ("\n" + VIEWER_LIVE_SCRIPT if live else "") + "\n"
+    values["body_attrs"] = (
+        f'data-size="{fields["size"]}" data-timer="{fields["timer_state"]}" '
+        f'data-dt="{fields["dt_on"]}" data-layout="{_esc(fields.get("layout", VIEWER_DEFAULT_LAYOUT))}"'
+        + ("" if output == VIEWER_MAIN_OUTPUT else f' data-out="{output}"')
+    )
+    return (template or _DEFAULT_TEMPLATE).render(values)
+
+
+_VIEWER_CSS_TEMPLATE = ViewerTemplate(VIEWER_STYLE_CSS, CSS_SLOT_RE)
+VIEWER_FONT_BASE = {"title": 26, "timer": 18, "meta": 14, "section": 14, "list": 16, "footer": 12}
+
+
+def _hex_to_rgba(hexcol: str, a: float) -> str:
+    s = (hexcol or "").lstrip("#")
+    if len(s) != 6:
+        return f"rgba(20,20,24,{a})"
+    r = int(s[0:2], 16)
+    g = int(s[2:4], 16)
+    b = int(s[4:6], 16)
+    return f"rgba({r},{g},{b},{a})"
+
+
+@functools.lru_cache(maxsize=64)
+def viewer_css(w: int, h: int, scale: float, theme_key: str) -> str:
+    """サイズ・文字倍率・配色から style.css を作る（同じ入力なら結果を使い回す）"""
+    pal = THEMES.get(theme_key, THEMES["pastel_blue"])
+    if theme_key == "dark":
+        colors = {
+            "card": "rgba(20,20,24,.72)",
+            "card2": "rgba(20,20,24,.52)",
+            "text": "rgba(255,255,255,.95)",
+            "muted": "rgba(255,255,255,.75)",
+            "border": "rgba(255,255,255,.18)",
+            "shadow": "rgba(0,0,0,.55)",
+        }
+    else:
+        colors = {
+            "card": _hex_to_rgba(pal.get("panel", "#dff3ff"), 0.82),
+            "card2": _hex_to_rgba(pal.get("panel2", "#eef9ff"), 0.62),
+            "text": pal.get("text", "#1f2937"),
+            "muted": pal.get("muted", "#4b5563"),
+            "border": "rgba(31,41,55,.18)",
+            "shadow": "rgba(0,0,0,.20)",
+        }
+    colors["accent"] = pal.get("accent", "#60a5fa")
+    values = dict(colors, w=w, h=h)
+    for k, v in VIEWER_FONT_BASE.items():
+        values[k] = max(6, int(round(v * scale)))
+    return _VIEWER_CSS_TEMPLATE.render(values)
+
+
+def build_viewer_html(state: dict, fragments: dict = None) -> str:
+    """state を丸ごとHTMLに埋め込む（タイマー/日時だけページ内で刻む）。fragments があれば区画HTMLを再利用する"""
+    return render_viewer_page(viewer_fields(state, fragments))
+
+
+# -------------------------
+# OBS Viewer ライブ配信（localhost HTTP + Server-Sent Events）
+# -------------------------
+VIEWER_SERVER_HOST = "127.0.0.1"
+VIEWER_SERVER_PORT = 8765
+SSE_KEEPALIVE_SEC = 15
+
+
+class ViewerEventHub:
+    """最新の表示内容を保持し、変わった項目だけを購読者（SSE接続）へ配る"""
+
+    _CLOSE = object()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fields = {}
+        self._clients = []
+        self.pushes = 0
+        self.template = None  # ライブ配信ページに使うレイアウト（アプリ側が差し替える）
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._fields)
+
+    def publish(self, fields: dict):
+        with self._lock:
+            diff = {k: v for k, v in fields.items() if self._fields.get(k) != v}
+            if not diff:
+                return
+            self._fields.update(diff)
+            if not self._clients:
+                return
+            msg = json.dumps(diff, ensure_ascii=False)
+            for q in self._clients:
+                q.put(msg)
+            self.pushes += 1
+
+    def subscribe(self) -> queue.Queue:
+        q = queue.Queue()
+        with self._lock:
+            q.put(json.dumps(self._fields, ensure_ascii=False))
+            self._clients.append(q)
+        return q
+
+    def unsubscribe(self, q: queue.Queue):
+        with self._lock:
+            if q in self._clients:
+                self._clients.remove(q)
+
+    def close_clients(self):
+        with self._lock:
+            clients, self._clients = self._clients, []
+        for q in clients:
+            q.put(self._CLOSE)
+
+    def client_count(self) -> int:
+        with self._lock:
+            return len(self._clients)
+
+
+class _ViewerRequestHandler(BaseHTTPRequestHandler):
+    server_version = "RoentListViewer/1.0"
+
+    def log_message(self, format, *args):  # noqa: A002 - 標準ライブラリの引数名
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = url.path.lstrip("/")
+        hubs = self.server.hubs
+        if path in ("", "view.html"):
+            path = VIEWER_MAIN_OUTPUT + ".html"
+        if path.endswith(".html") and path[:-5] in hubs:
+            output = path[:-5]
+            hub = hubs[output]
+            # 最初の publish 前（出力を追加した直後・起動直後）は既定値で返し、届いた差分で書き換える
+            fields = hub.snapshot() or viewer_fields({})
+            body = render_viewer_page(fields, live=True, template=hub.template, output=output).encode("utf-8")
+            self._send(200, "text/html; charset=utf-8", body)
+        elif path.endswith(".css") and path == os.path.basename(path):
+            try:
+                with open(os.path.join(self.server.viewer_dir, path), "rb") as f:
+                    body = f.read()
+            except OSError:
+                body = b""
+            self._send(200, "text/css; charset=utf-8", body)
+        elif path == "events":
+            output = parse_qs(url.query).get("o", [VIEWER_MAIN_OUTPUT])[0]
+            hub = hubs.get(output)
+            if hub is None:
+                self._send(404, "text/plain; charset=utf-8", b"not found")
+            else:
+                self._stream_events(hub)
+        else:
+            self._send(404, "text/plain; charset=utf-8", b"not found")
+
+    def _send(self, code: int, ctype: str, body: bytes):
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_events(self, hub: "ViewerEventHub"):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Connection", "keep-alive")
+        self.end_headers()
+        q = hub.subscribe()
+        try:
+            while True:
+                try:
+                    msg = q.get(timeout=SSE_KEEPALIVE_SEC)
+                except queue.Empty:
+                    self.wfile.write(b": ping\n\n")
+                else:
+                    if msg is ViewerEventHub._CLOSE:
+                        break
+                    self.wfile.write(f"data: {msg}\n\n".encode("utf-8"))
+                self.wfile.flush()
+        except OSError:
+            pass  # OBS 側が切断
+        finally:
+            hub.unsubscribe(q)
+
+
+class ViewerServer:
+    """obs_viewer を http://127.0.0.1:<port>/ で配信する（標準ライブラリのみ）
+
+    hubs は 出力名 → ViewerEventHub。/<出力名>.html と /events?o=<出力名> で参照する（アプリ側で追加・削除してよい）
+    """
+
+    def __init__(self, hubs: dict, viewer_dir: str, port: int = VIEWER_SERVER_PORT):
+        self.hubs = hubs
+        self.viewer_dir = viewer_dir
+        self.port = int(port)
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._httpd is not None
+
+    @property
+    def url(self) -> str:
+        return f"http://{VIEWER_SERVER_HOST}:{self.port}/"
+
+    def start(self):
+        if self._httpd is not None:
+            return
+        httpd = ThreadingHTTPServer((VIEWER_SERVER_HOST, self.port), _ViewerRequestHandler)
+        httpd.daemon_threads = True
+        httpd.hubs = self.hubs
+        httpd.viewer_dir = self.viewer_dir
+        self._httpd = httpd
+        self._thread = threading.Thread(target=httpd.serve_forever, name="viewer-server", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        httpd, self._httpd = self._httpd, None
+        if httpd is None:
+            return
+        for hub in list(self.hubs.values()):
+            hub.close_clients()
+        httpd.shutdown()
+        httpd.server_close()
+
+
+# -------------------------
+# OBS Viewer 出力（場面ごとに別ファイル・別サイズ）
+# -------------------------
+VIEWER_OUTPUT_NAME_RE = re.compile(r"^[A-Za-z0-9_-]{1,32}$")
+VIEWER_RESERVED_OUTPUTS = {VIEWER_MAIN_OUTPUT, "style", "events", "index"}
+VIEWER_LIMIT_MAX = 100
+VIEWER_SCENE_PRESETS = [
+    {"name": "now", "layout": "now", "size": "800x200", "scale": 1.5},
+    {"name": "queue", "layout": "queue", "size": "480x640", "scale": 1.5, "queue_limit": 8},
+    {"name": "done", "layout": "done", "size": "480x640", "scale": 1.5, "done_limit": 8},
+    {"name": "lyrics", "layout": "lyrics", "size": "800x600", "scale": 1.0},
+]
+
+
+def parse_viewer_size(text, default=(800, 600)) -> tuple[int, int]:
+    m = re.match(r"^(\d+)\s*x\s*(\d+)$", str(text or "").lower().strip())
+    if m:
+        return int(m.group(1)), int(m.group(2))
+    return default
+
+
+def normalize_viewer_output(cfg: dict):
+    """settings の出力設定1件を検証して整える。使えない名前なら None"""
+    name = str(cfg.get("name", "")).strip()
+    if not VIEWER_OUTPUT_NAME_RE.match(name) or name in VIEWER_RESERVED_OUTPUTS:
+        return None
+    w, h = parse_viewer_size(cfg.get("size"))
+    try:
+        scale = float(cfg.get("scale", 1.5))
+    except (TypeError, ValueError):
+        scale = 1.5
+    if scale <= 0:
+        scale = 1.5
+
+    def limit(key):
+        try:
+            return min(VIEWER_LIMIT_MAX, max(1, int(cfg.get(key, VIEWER_LIST_LIMIT))))
+        except (TypeError, ValueError):
+            return VIEWER_LIST_LIMIT
+
+    return {
+        "name": name,
+        "layout": str(cfg.get("layout") or VIEWER_DEFAULT_LAYOUT).strip(),
+        "size": f"{w}x{h}",
+        "scale": scale,
+        "queue_limit": limit("queue_limit"),
+        "done_limit": limit("done_limit"),
+    }
+
+
+class ViewerOutput:
+    """Viewer の出力先1つ分。設定と、描画済みの断片・前回の出力（書き込み省略用）を持つ"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.html_file, self.css_file = viewer_output_files(name)
+        self.hub = ViewerEventHub()
+        self.fragments = {}
+        self.prev_html = ""
+        self.prev_css = ""
+        self.css_version = 0
+        self.template = None  # 前回描画に使ったテンプレート（差し替えられたら描き直す）
+        self.config = {}
+
+    def configure(self, cfg: dict) -> bool:
+        """設定を反映する。変わったら True（断片は作り直しが必要）"""
+        if cfg == self.config:
+            return False
+        self.config = dict(cfg)
+        self.layout = cfg["layout"]
+        self.w, self.h = parse_viewer_size(cfg["size"])
+        self.scale = cfg["scale"]
+        self.queue_limit = cfg["queue_limit"]
+        self.done_limit = cfg["done_limit"]
+        self.fragments = {}
+        return True
+
+
+class TickStats:
+    """周期処理1回あたりのコスト（時間・DBクエリ・描画・書き込み）の集計
+
+    設定タブの「統計を表示」に出る。測り方は README の「Viewer の更新コストを測る」を参照。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.ticks = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.queries = 0
+        self.writes = 0
+        self.skipped = 0
+        self.rebuilds = 0
+        self.renders = 0
+
+    def record(self, elapsed_ms: float, queries: int = 0, wrote: bool = False, rebuilt: bool = False, renders: int = 0):
+        self.ticks += 1
+        self.renders += renders
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.queries += queries
+        self.writes += int(wrote)
+        self.skipped += int(not wrote)
+        self.rebuilds += int(rebuilt)
+
+    def stats_text(self) -> str:
+        avg = self.total_ms / self.ticks if self.ticks else 0.0
+        per_tick_q = self.queries / self.ticks if self.ticks else 0.0
+        return (
+            f"{self.name}: {self.ticks} 回 / 平均 {avg:.2f} ms・最大 {self.max_ms:.2f} ms / "
+            f"DBクエリ {self.queries} 回（{per_tick_q:.2f}/回）/ 区画再構築 {self.rebuilds} 回 / "
+            f"ページ描画 {self.renders} 回 / 書き込み {self.writes} 回（変更なしで省略 {self.skipped} 回）"
+        )
+
+
+# -------------------------
+# 周期処理スケジューラ（time.monotonic 基準・Tk の after は常に1本）
+# -------------------------
+SCHEDULER_EARLY_TOLERANCE_SEC = 0.002  # after() の ms 丸めで少し早く起きた場合も実行扱いにする
+TIMER_ALIGN_OFFSET_SEC = 0.005         # 秒の切り替わりの直後に表示を更新する
+VIEWER_CLOCK_RESYNC_SEC = 0.5          # 壁時計がこれ以上ずれたらページ側のタイマー基準を送り直す
+
+
+class _TickJob:
+    __slots__ = ("name", "callback", "interval", "origin", "due", "runs", "skipped", "errors",
+                 "late_sum", "late_sq", "late_max")
+
+    def __init__(self, name, callback, interval, origin):
+        self.name = name
+        self.callback = callback
+        self.interval = interval
+        self.origin = origin
+        self.due = 0.0
+        self.runs = 0
+        self.skipped = 0
+        self.errors = 0
+        self.late_sum = 0.0
+        self.late_sq = 0.0
+        self.late_max = 0.0
+
+    def next_due(self, now: float) -> float:
+        """now より後の次の実行時刻。origin があれば origin + n*interval に揃える"""
+        if self.origin is None:
+            return now + self.interval
+        n = int((now - self.origin) // self.interval) + 1
+        return self.origin + n * self.interval
+
+    def stats_text(self) -> str:
+        if not self.runs:
+            return f"周期処理[{self.name}]: 実行 0 回"
+        mean = self.late_sum / self.runs
+        jitter = max(0.0, self.late_sq / self.runs - mean * mean) ** 0.5
+        return (
+            f"周期処理[{self.name}]: 実行 {self.runs} 回 / 遅れ 平均 {mean * 1000:.1f} ms・"
+            f"最大 {self.late_max * 1000:.1f} ms・ゆらぎ(σ) {jitter * 1000:.1f} ms / "
+            f"取りこぼし {self.skipped} 回 / 例外 {self.errors} 回"
+        )
+
+
+class TickScheduler:
+    """周期処理をまとめて回す。時刻は time.monotonic() なので、配信中に PC の時刻合わせがあってもずれない"""
+
+    def __init__(self, after, after_cancel, clock=time.monotonic):
+        self._after = after
+        self._after_cancel = after_cancel
+        self._clock = clock
+        self._jobs = {}
+        self._handle = None
+        self._wall_offset0 = time.time() - clock()
+
+    def add(self, name: str, callback, interval: float, origin: float = None):
+        """interval 秒ごとに callback を呼ぶ（同名の処理は置き換え）"""
+        job = _TickJob(name, callback, float(interval), origin)
+        job.due = job.next_due(self._clock())
+        self._jobs[name] = job
+        self._arm()
+
+    def remove(self, name: str):
+        if self._jobs.pop(name, None) is not None:
+            self._arm()
+
+    def stop(self):
+        self._jobs.clear()
+        self._arm()
+
+    def _arm(self):
+        if self._handle is not None:
+            try:
+                self._after_cancel(self._handle)
+            except Exception:
+                pass
+            self._handle = None
+        if not self._jobs:
+            return
+        due = min(job.due for job in self._jobs.values())
+        delay_ms = max(0, int((due - self._clock()) * 1000 + 0.999))
+        self._handle = self._after(delay_ms, self._fire)
+
+    def _fire(self):
+        self._handle = None
+        for job in sorted(self._jobs.values(), key=lambda j: j.due):
+            now = self._clock()
+            if job.due > now + SCHEDULER_EARLY_TOLERANCE_SEC:
+                continue
+            late = max(0.0, now - job.due)
+            job.runs += 1
+            job.late_sum += late
+            job.late_sq += late * late
+            job.late_max = max(job.late_max, late)
+            try:
+                job.callback()
+            except Exception:
+                job.errors += 1
+            if self._jobs.get(job.name) is not job:
+                continue  # callback の中で remove/add された
+            job.due += job.interval
+            now = self._clock()
+            if job.due <= now:
+                # 重い処理などで周期を飛び越えた分はまとめて捨て、次の区切りへ
+                nxt = job.next_due(now)
+                job.skipped += int((nxt - job.due) // job.interval)
+                job.due = nxt
+        self._arm()
+
+    def wall_clock_drift(self) -> float:
+        """起動後に壁時計（time.time）が monotonic に対して動いた秒数（時刻合わせの量）"""
+        return (time.time() - self._clock()) - self._wall_offset0
+
+    def stats_lines(self) -> list[str]:
+        lines = [job.stats_text() for job in self._jobs.values()]
+        lines.append(f"壁時計のずれ（起動後の時刻合わせ）: {self.wall_clock_drift():+.3f} 秒")
+        return lines
 
 
 # -------------------------
@@ -498,6 +3417,7 @@ class KaraokeSetlistApp(tk.Tk):
         self.title("Roent.List 歌枠管理ソフト")
         self.geometry("900x900")
         self.minsize(650, 650)
+        self.scheduler = TickScheduler(self.after, self.after_cancel)
 
         # 状態
         self.current_detail_id = None
@@ -511,12 +3431,17 @@ class KaraokeSetlistApp(tk.Tk):
         # タイマー
         self.timer_running = False
         self.timer_accum = 0.0
-        self.timer_started_at = None
-        self.timer_job = None
+        self.timer_started_at = None  # time.monotonic() 基準
         self.elapsed_var = tk.StringVar(value="00:00:00")
 
         # スタンプ用
         self.session_events = []  # [{"song_id":int,"start_sec":int}]
+        self.stamp_log = StampLog()
+        self._bulk_thread = None
+        self.stream_id = None     # 配信履歴（streams.id）
+
+        # ファイル書き込み（設定・Viewer）は専用スレッドでまとめて行う
+        self.file_writer = FileWriter()
 
         # テーマ
         self.settings = self._load_settings()
@@ -539,6 +3464,10 @@ class KaraokeSetlistApp(tk.Tk):
         self.settings.setdefault("viewer_show_datetime", True)
         self.settings.setdefault("viewer_show_brand", True)
         self.settings.setdefault("viewer_brand_text", "Roent.List")
+        self.settings.setdefault("viewer_server_enabled", False)
+        self.settings.setdefault("viewer_server_port", VIEWER_SERVER_PORT)
+        self.settings.setdefault("viewer_layout", VIEWER_DEFAULT_LAYOUT)
+        self.settings.setdefault("viewer_outputs", [])  # 追加の出力（場面別）
 
         # BGM (setlist tab)
         self.settings.setdefault("bgm_audio_path", "")
@@ -554,11 +3483,24 @@ class KaraokeSetlistApp(tk.Tk):
         # OBS Viewer 出力先（apply_theme より前に必ず用意する）
         self.viewer_dir = os.path.join(os.getcwd(), "obs_viewer")
         os.makedirs(self.viewer_dir, exist_ok=True)
+        self.viewer_server = None
+        self.viewer_templates = ViewerTemplateLoader(os.path.join(self.viewer_dir, VIEWER_TEMPLATE_DIR))
+        os.makedirs(self.viewer_templates.folder, exist_ok=True)
+        self.viewer_outputs = {}  # 出力名 -> ViewerOutput
+        self.viewer_hubs = {}     # 出力名 -> ViewerEventHub（ライブ配信サーバーと共有）
+        self._viewer_state = {}
+        self._viewer_dirty = set(VIEWER_SECTIONS)
+        self.viewer_tick_stats = TickStats("Viewer更新")
+        self._viewer_flush_job = None
+        self._sync_viewer_outputs()
         self._tk_text_widgets = []
         self._tk_list_widgets = []
         self._tk_canvas_widgets = []
         self._tk_label_widgets = []
 
+        self.media_status = MediaAvailability(self._media_library_paths)
+        self.launcher = MediaLauncher(str(self.settings.get("player_command", "") or ""))
+
         self._apply_fonts()
         self._build_setlist_fonts()
         self._build_styles_base()
@@ -570,9 +3512,19 @@ class KaraokeSetlistApp(tk.Tk):
         self.viewer_dir = os.path.join(os.getcwd(), "obs_viewer")
         os.makedirs(self.viewer_dir, exist_ok=True)
         self._ensure_viewer_files()
-        self._viewer_prev = ""
-        self._viewer_job = None
-        self._viewer_tick()  # periodic
+        self._viewer_tick()
+        self.scheduler.add("viewer", self._viewer_tick, 1.0)
+        self.scheduler.add("media", self._media_status_tick, MEDIA_POLL_SEC)
+        self.scheduler.add("launcher", self._launcher_tick, MEDIA_POLL_SEC)
+
+        if self.settings.get("viewer_server_enabled"):
+            self._start_viewer_server(show_error=False)
+            self._update_viewer_url_label()
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+
+        # 前回のセッション（キュー/履歴/タイマー）を復元
+        self.session_journal = SessionJournal()
+        self._restore_session(self.session_journal.load())
 
         self.run_search()
 
@@ -590,10 +3542,10 @@ class KaraokeSetlistApp(tk.Tk):
 
     def _save_settings(self):
         try:
-            with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
-                json.dump(self.settings, f, ensure_ascii=False, indent=2)
+            text = json.dumps(self.settings, ensure_ascii=False, indent=2)
         except Exception:
-            pass
+            return
+        self.file_writer.write(SETTINGS_FILE, text)
 
     # ---------- fonts/styles ----------
     def _apply_fonts(self):
@@ -714,151 +3666,225 @@ class KaraokeSetlistApp(tk.Tk):
         self._write_viewer_css()
 
     def _write_viewer_css(self):
-        """obs_viewer/style.css を設定に合わせて再生成"""
+        """obs_viewer/style.css（と追加の出力の CSS）を設定に合わせて再生成"""
         self.viewer_dir = getattr(self, "viewer_dir", os.path.join(os.getcwd(), "obs_viewer"))
         os.makedirs(self.viewer_dir, exist_ok=True)
 
-        # size
-        size_str = (self.settings.get("viewer_size") or "800x600").lower().strip()
-        mm = re.match(r"^(\d+)\s*x\s*(\d+)$", size_str)
-        if mm:
-            w, h = int(mm.group(1)), int(mm.group(2))
-        else:
-            w, h = 800, 600
-
-        # font scale (default 1.5)
-        scale_raw = self.settings.get("viewer_font_scale", 1.5)
-        try:
-            scale = float(scale_raw)
-        except Exception:
-            scale = 1.5
-        if scale <= 0:
-            scale = 1.5
-
         # viewer theme
         v_theme = (self.settings.get("viewer_theme") or "same").strip()
         if v_theme == "same":
             v_key = getattr(self, "current_theme_key", "pastel_blue")
         else:
             v_key = v_theme
-        pal = THEMES.get(v_key, THEMES["pastel_blue"])
-
-        def hex_to_rgba(hexcol: str, a: float) -> str:
-            s = (hexcol or "").lstrip("#")
-            if len(s) != 6:
-                return f"rgba(20,20,24,{a})"
-            r = int(s[0:2], 16)
-            g = int(s[2:4], 16)
-            b = int(s[4:6], 16)
-            return f"rgba({r},{g},{b},{a})"
-
-        # palette -> viewer colors
-        if v_key == "dark":
-            card = "rgba(20,20,24,.72)"
-            card2 = "rgba(20,20,24,.52)"
-            textc = "rgba(255,255,255,.95)"
-            muted = "rgba(255,255,255,.75)"
-            border = "rgba(255,255,255,.18)"
-            shadow = "rgba(0,0,0,.55)"
-        else:
-            card = hex_to_rgba(pal.get("panel", "#dff3ff"), 0.82)
-            card2 = hex_to_rgba(pal.get("panel2", "#eef9ff"), 0.62)
-            textc = pal.get("text", "#1f2937")
-            muted = pal.get("muted", "#4b5563")
-            border = "rgba(31,41,55,.18)"
-            shadow = "rgba(0,0,0,.20)"
-
-        accent = pal.get("accent", "#60a5fa")
-
-        base = {"title": 26, "timer": 18, "meta": 14, "section": 14, "list": 16, "footer": 12}
-        def sc(x):
-            return max(6, int(round(x * scale)))
-
-        css = VIEWER_STYLE_CSS
-        css = css.replace("__CARD__", card)
-        css = css.replace("__CARD2__", card2)
-        css = css.replace("__TEXT__", str(textc))
-        css = css.replace("__MUTED__", str(muted))
-        css = css.replace("__ACCENT__", str(accent))
-        css = css.replace("__BORDER__", border)
-        css = css.replace("__SHADOW__", shadow)
-        css = css.replace("__W__", str(w)).replace("__H__", str(h))
-        css = css.replace("__TITLE__", str(sc(base["title"])))
-        css = css.replace("__TIMER__", str(sc(base["timer"])))
-        css = css.replace("__META__", str(sc(base["meta"])))
-        css = css.replace("__SECTION__", str(sc(base["section"])))
-        css = css.replace("__LIST__", str(sc(base["list"])))
-        css = css.replace("__FOOTER__", str(sc(base["footer"])))
-
-        css_path = os.path.join(self.viewer_dir, "style.css")
-        try:
-            with open(css_path, "w", encoding="utf-8") as f:
-                f.write(css)
-        except Exception:
-            pass
 
+        for out in self.viewer_outputs.values():
+            css = viewer_css(out.w, out.h, out.scale, v_key)
+            if css == out.prev_css:
+                continue
+            out.prev_css = css
+            self.file_writer.write(os.path.join(self.viewer_dir, out.css_file), css)
+            # ライブ配信中のページにスタイルシートを読み直させる
+            out.css_version += 1
+            out.hub.publish({"css": str(out.css_version)})
+
+    def _viewer_output_configs(self) -> list[dict]:
+        """既定の出力（view.html）＋ settings["viewer_outputs"] の追加分"""
+        try:
+            scale = float(self.settings.get("viewer_font_scale", 1.5))
+        except (TypeError, ValueError):
+            scale = 1.5
+        w, h = parse_viewer_size(self.settings.get("viewer_size"))
+        main_cfg = {
+            "name": VIEWER_MAIN_OUTPUT,
+            "layout": self.settings.get("viewer_layout") or VIEWER_DEFAULT_LAYOUT,
+            "size": f"{w}x{h}",
+            "scale": scale if scale > 0 else 1.5,
+            "queue_limit": VIEWER_LIST_LIMIT,
+            "done_limit": VIEWER_LIST_LIMIT,
+        }
+        configs = [main_cfg]
+        seen = {VIEWER_MAIN_OUTPUT}
+        for raw in self.settings.get("viewer_outputs") or []:
+            cfg = normalize_viewer_output(raw) if isinstance(raw, dict) else None
+            if cfg and cfg["name"] not in seen:
+                seen.add(cfg["name"])
+                configs.append(cfg)
+        return configs
+
+    def _sync_viewer_outputs(self):
+        """設定に合わせて出力を作成・更新・削除する（設定を変えたら呼ぶ）"""
+        outputs = {}
+        changed = False
+        for cfg in self._viewer_output_configs():
+            out = self.viewer_outputs.get(cfg["name"]) or ViewerOutput(cfg["name"])
+            changed |= out.configure(cfg)
+            outputs[out.name] = out
+        for name, out in self.viewer_outputs.items():
+            if name not in outputs:
+                out.hub.close_clients()
+                changed = True
+        self.viewer_outputs = outputs
+        # ライブ配信サーバーが同じ dict を参照しているので中身を入れ替える
+        for name in list(self.viewer_hubs):
+            if name not in outputs:
+                del self.viewer_hubs[name]
+        self.viewer_hubs.update((name, out.hub) for name, out in outputs.items())
+        if changed:
+            self._viewer_dirty.update(VIEWER_SECTIONS)
+
+    def _mark_viewer_dirty(self, *sections):
+        """セットリスト/設定の変更時に呼ぶ。該当区画だけ作り直してすぐ反映する"""
+        self._viewer_dirty.update(sections or VIEWER_SECTIONS)
+        if self._viewer_flush_job is None:
+            self._viewer_flush_job = self.after_idle(self._viewer_render)
+
+    def _build_viewer_sections(self, sections) -> dict:
+        state = {}
+        if "settings" in sections:
+            vw, vh = parse_viewer_size(self.settings.get("viewer_size"))
+            state["viewer_w"] = vw
+            state["viewer_h"] = vh
+            state["show_datetime"] = bool(self.settings.get("viewer_show_datetime", True))
+            state["show_brand"] = bool(self.settings.get("viewer_show_brand", True))
+            state["brand_text"] = self.settings.get("viewer_brand_text", "Roent.List")
+
+        # 出力ごとの件数の最大だけ読めば、各出力はそこから切り出せる
+        queue_n = max(out.queue_limit for out in self.viewer_outputs.values())
+        done_n = max(out.done_limit for out in self.viewer_outputs.values())
+        queue_ids = self.queue_ids[:queue_n] if "queue" in sections else []
+        done_items = self.finished_entries[-done_n:][::-1] if "done" in sections else []
+        now_ids = [self.now_id] if ("now" in sections and self.now_id is not None) else []
+        rows = db_get_songs(now_ids + queue_ids + [it["song_id"] for it in done_items])
+        now_rows = rows[:len(now_ids)]
+        queue_rows = rows[len(now_ids):len(now_ids) + len(queue_ids)]
+        done_rows = rows[len(now_ids) + len(queue_ids):]
+
+        if "now" in sections:
+            now_title = ""
+            now_provider = ""
+            if now_rows and now_rows[0]:
+                now_title = song_line(now_rows[0])
+                now_provider = (now_rows[0]["provider"] or "").strip()
+            state["now_title"] = now_title
+            state["now_provider"] = now_provider
+            # 歌詞は {{lyrics}} を使うレイアウトがある時だけ読む（None = 読んでいない）
+            if not now_title:
+                state["now_lyrics"] = ""
+            elif self._viewer_uses_lyrics():
+                state["now_lyrics"] = db_get_song_texts(self.now_id)["lyrics"]
+            else:
+                state["now_lyrics"] = None
 
-    def _build_viewer_state(self) -> dict:
-        size_str = (self.settings.get("viewer_size") or "800x600").lower().strip()
-        m = re.match(r"^(\d+)\s*x\s*(\d+)$", size_str)
-        if m:
-            vw, vh = int(m.group(1)), int(m.group(2))
-        else:
-            vw, vh = 800, 600
+        if "queue" in sections:
+            state["queue"] = [song_line(r) for r in queue_rows if r]
 
-        show_dt = bool(self.settings.get("viewer_show_datetime", True))
-        show_brand = bool(self.settings.get("viewer_show_brand", True))
-        brand_text = self.settings.get("viewer_brand_text", "Roent.List")
+        if "done" in sections:
+            done_lines = []
+            for it, r in zip(done_items, done_rows):
+                if r:
+                    done_lines.append(f"{format_hhmmss(it['start_sec'])}  {song_line(r)}")
+            state["done"] = done_lines
 
-        now_title = ""
-        now_provider = ""
-        if self.now_id is not None:
-            row = db_get_song(self.now_id)
-            if row:
-                now_title = song_line(row)
-                now_provider = (row["provider"] or "").strip()
-
-        queue_lines = []
-        for sid in self.queue_ids[:12]:
-            r = db_get_song(sid)
-            if r:
-                queue_lines.append(song_line(r))
-
-        done_lines = []
-        for it in self.finished_entries[-12:][::-1]:
-            sid = it["song_id"]
-            sec = it["start_sec"]
-            r = db_get_song(sid)
-            if r:
-                done_lines.append(f"{format_hhmmss(sec)}  {song_line(r)}")
+        if "timer" in sections:
+            state["timer_accum"] = self.timer_accum
+            state["timer_started_at"] = self._timer_started_epoch()
+            state["timer_running"] = self.timer_running
+        return state
 
-        return {
-            "viewer_w": vw,
-            "viewer_h": vh,
-            "now_title": now_title,
-            "now_provider": now_provider,
-            "timer": format_hhmmss(self.get_elapsed_seconds()),
-            "queue": queue_lines,
-            "done": done_lines,
-            "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "show_datetime": show_dt,
-            "show_brand": show_brand,
-            "brand_text": brand_text,
-        }
+    def _viewer_uses_lyrics(self) -> bool:
+        return any("lyrics" in self.viewer_templates.get(out.layout).slots for out in self.viewer_outputs.values())
 
+    def _build_viewer_state(self) -> dict:
+        """全区画のスナップショット（dirty 管理とは無関係に毎回作る）"""
+        state = self._build_viewer_sections(VIEWER_SECTIONS)
+        state["timer"] = format_hhmmss(self.get_elapsed_seconds())
+        state["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return state
 
     def _viewer_tick(self):
-        state = self._build_viewer_state()
-        html = build_viewer_html(state)
-        if html != self._viewer_prev:
-            self._viewer_prev = html
-            try:
-                with open(os.path.join(self.viewer_dir, "view.html"), "w", encoding="utf-8") as f:
-                    f.write(html)
-            except Exception:
-                pass
-        self._viewer_job = self.after(1000, self._viewer_tick)
-
+        # ページは壁時計でタイマーを刻むので、PC の時刻合わせがあったら基準を送り直す
+        started = self._timer_started_epoch()
+        if started is not None and abs(started - (self._viewer_state.get("timer_started_at") or 0.0)) > VIEWER_CLOCK_RESYNC_SEC:
+            self._viewer_dirty.add("timer")
+        self._viewer_render()
+
+    def _viewer_render(self):
+        """state を1回だけ更新し、全出力へ配る（DB を読むのは区画が変わった時だけ）"""
+        self._viewer_flush_job = None
+        t0 = time.perf_counter()
+        q0 = get_pool().queries
+        rebuilt = bool(self._viewer_dirty)
+        sections = ()
+        if rebuilt:
+            sections, self._viewer_dirty = self._viewer_dirty, set()
+            self._viewer_state.update(self._build_viewer_sections(sections))
+        wrote = False
+        renders = 0
+        for out in self.viewer_outputs.values():
+            rendered, out_wrote = self._render_viewer_output(out, sections)
+            renders += rendered
+            wrote |= out_wrote
+        self.viewer_tick_stats.record((time.perf_counter() - t0) * 1000, get_pool().queries - q0, wrote, rebuilt, renders)
+
+    def _render_viewer_output(self, out: ViewerOutput, sections) -> tuple[bool, bool]:
+        """戻り値: (描画した, ファイルを書いた)"""
+        if not out.fragments:
+            sections = VIEWER_SECTIONS
+        # タイマーと日時はページ側で刻むので、区画もテンプレートも変わっていなければ何もしない
+        template = self.viewer_templates.get(out.layout)
+        if not sections and template is out.template:
+            return False, False
+        out.template = template
+        if sections:
+            out.fragments.update(render_viewer_fragments(self._viewer_state, sections, out.queue_limit, out.done_limit))
+        fields = viewer_fields(self._viewer_state, out.fragments)
+        fields["size"] = f"{out.w}x{out.h}"
+        fields["layout"] = out.layout
+        out.hub.template = template
+        if self._viewer_state.get("now_lyrics", "") is None and "lyrics" in template.slots:
+            # テンプレートが書き換えられて歌詞を使うようになった → 現在曲の区画を読み直す
+            self._mark_viewer_dirty("now")
+        html = render_viewer_page(fields, template=template, output=out.name)
+        wrote = html != out.prev_html
+        if wrote:
+            out.prev_html = html
+            self.file_writer.write(os.path.join(self.viewer_dir, out.html_file), html)
+        out.hub.publish(fields)
+        return True, wrote
+
+    def _start_viewer_server(self, show_error: bool = True) -> bool:
+        try:
+            port = int(self.settings.get("viewer_server_port", VIEWER_SERVER_PORT))
+        except (TypeError, ValueError):
+            port = VIEWER_SERVER_PORT
+        self._stop_viewer_server()
+        server = ViewerServer(self.viewer_hubs, self.viewer_dir, port)
+        try:
+            server.start()
+        except OSError as e:
+            if show_error:
+                messagebox.showerror("Viewerサーバー", f"ポート {port} で起動できませんでした。\n{e}")
+            return False
+        self.viewer_server = server
+        return True
+
+    def _stop_viewer_server(self):
+        if self.viewer_server is not None:
+            self.viewer_server.stop()
+            self.viewer_server = None
+
+    def _on_close(self):
+        self.scheduler.stop()
+        # DB を使うワーカーを止めて待つ（各自の接続は各自が閉じる。待ちきれなくても close_all は動作中の接続を閉じない）
+        if self._bulk_thread is not None:
+            self._bulk_cancel.set()
+            self._bulk_thread.join(WORKER_JOIN_SEC)
+        self.search_worker.stop(WORKER_JOIN_SEC)
+        self.media_status.stop(WORKER_JOIN_SEC)
+        self.session_journal.close()
+        self._stop_viewer_server()
+        self.file_writer.flush()
+        self.destroy()
 
     # ---------- setlist layout ----------
     def _get_setlist_lyrics_height(self) -> int:
@@ -901,11 +3927,6 @@ class KaraokeSetlistApp(tk.Tk):
         self.status_var = tk.StringVar(value="Ready")
         ttk.Label(self, textvariable=self.status_var, anchor="w").pack(fill="x", side="bottom")
 
-        self.notebook.bind("<<NotebookTabChanged>>", self._on_tab_changed)
-
-    def _on_tab_changed(self, _event):
-        if self.notebook.select() == str(self.tab_stamp):
-            self.refresh_stamp_view()
 
     # -------------------------
     # タイマー
@@ -913,34 +3934,46 @@ class KaraokeSetlistApp(tk.Tk):
     def get_elapsed_seconds(self) -> int:
         elapsed = self.timer_accum
         if self.timer_running and self.timer_started_at is not None:
-            elapsed += (time.time() - self.timer_started_at)
+            elapsed += (time.monotonic() - self.timer_started_at)
         return int(elapsed)
 
+    def _timer_started_epoch(self):
+        """開始時刻を壁時計（epoch秒）に直したもの。Viewer ページ側の計算用"""
+        if not self.timer_running or self.timer_started_at is None:
+            return None
+        return time.time() - (time.monotonic() - self.timer_started_at)
+
     def toggle_timer(self):
         if not self.timer_running:
             self.timer_running = True
-            self.timer_started_at = time.time()
+            self.timer_started_at = time.monotonic()
             self.btn_timer.config(text="タイマー停止")
-            self._timer_tick()
+            self._start_timer_job()
+            self._journal("timer", accum=self.timer_accum, started=self._timer_started_epoch())
+            self._mark_viewer_dirty("timer")
             self.status_var.set("タイマー開始")
         else:
             if self.timer_started_at is not None:
-                self.timer_accum += (time.time() - self.timer_started_at)
+                self.timer_accum += (time.monotonic() - self.timer_started_at)
             self.timer_running = False
             self.timer_started_at = None
             self.btn_timer.config(text="タイマー開始")
-            if self.timer_job is not None:
-                try:
-                    self.after_cancel(self.timer_job)
-                except Exception:
-                    pass
-                self.timer_job = None
+            self.scheduler.remove("timer")
             self.elapsed_var.set(format_hhmmss(self.get_elapsed_seconds()))
+            self._journal("timer", accum=self.timer_accum, started=None)
+            self._mark_viewer_dirty("timer")
             self.status_var.set("タイマー停止")
 
+    def _start_timer_job(self):
+        self._timer_tick()
+        # 経過秒が切り替わる瞬間に合わせて1秒ごとに表示を更新する
+        origin = self.timer_started_at - (self.timer_accum % 1.0) + TIMER_ALIGN_OFFSET_SEC
+        self.scheduler.add("timer", self._timer_tick, 1.0, origin=origin)
+
     def _timer_tick(self):
-        self.elapsed_var.set(format_hhmmss(self.get_elapsed_seconds()))
-        self.timer_job = self.after(200, self._timer_tick)
+        text = format_hhmmss(self.get_elapsed_seconds())
+        if self.elapsed_var.get() != text:
+            self.elapsed_var.set(text)
 
     # -------------------------
     # 検索タブ
@@ -949,7 +3982,7 @@ class KaraokeSetlistApp(tk.Tk):
         frm = ttk.Frame(self.tab_search, padding=10)
         frm.pack(fill="both", expand=True)
 
-        filters = ttk.LabelFrame(frm, text="部分検索（ひらがなOK：ふりがな欄も検索します）")
+        filters = ttk.LabelFrame(frm, text="部分検索（入力すると自動で検索・ひらがなOK：ふりがな欄も検索します）")
         filters.pack(fill="x")
 
         self.q_title = tk.StringVar()
@@ -957,6 +3990,9 @@ class KaraokeSetlistApp(tk.Tk):
         self.q_provider = tk.StringVar()
         self.q_keyword = tk.StringVar()
 
+        for var in (self.q_title, self.q_artist, self.q_provider, self.q_keyword):
+            var.trace_add("write", self._schedule_live_search)
+
         ttk.Label(filters, text="曲名").grid(row=0, column=0, sticky="w")
         ttk.Entry(filters, textvariable=self.q_title, width=26).grid(row=0, column=1, sticky="w", padx=8)
         ttk.Label(filters, text="アーティスト").grid(row=0, column=2, sticky="w")
@@ -967,6 +4003,38 @@ class KaraokeSetlistApp(tk.Tk):
         ttk.Label(filters, text="キーワード").grid(row=1, column=2, sticky="w", pady=(6, 0))
         ttk.Entry(filters, textvariable=self.q_keyword, width=26).grid(row=1, column=3, sticky="w", padx=8, pady=(6, 0))
 
+        sort_items = [
+            ("新しい順", "new"), ("古い順", "old"), ("曲名順", "title"), ("アーティスト順", "artist"),
+            ("よく歌う順", "most_sung"), ("あまり歌わない順", "least_sung"),
+            ("最近歌った順", "recent_sung"), ("久しく歌っていない順", "long_unsung"),
+        ]
+        self._sort_label_to_key = {n: k for (n, k) in sort_items}
+        sort_key_to_label = {k: n for (n, k) in sort_items}
+        ttk.Label(filters, text="並び順").grid(row=2, column=0, sticky="w", pady=(6, 0))
+        self.q_sort_combo = ttk.Combobox(filters, state="readonly", width=20, values=[n for (n, _) in sort_items])
+        self.q_sort_combo.set(sort_key_to_label.get(self.settings.get("search_sort", "new"), "新しい順"))
+        self.q_sort_combo.grid(row=2, column=1, sticky="w", padx=8, pady=(6, 0))
+        self.q_sort_combo.bind("<<ComboboxSelected>>", self._on_search_sort_change)
+
+        self.q_romaji = tk.BooleanVar(value=bool(self.settings.get("search_romaji", False)))
+        ttk.Checkbutton(filters, text="ローマ字でも検索（例: yoasobi → よあそび）", variable=self.q_romaji, command=self._on_search_romaji_toggle).grid(row=2, column=2, columnspan=2, sticky="w", padx=8, pady=(6, 0))
+
+        history_items = [("すべて", ""), ("歌ったことがある", "sung"), ("まだ歌っていない", "never"), ("直近の枠で歌っていない", "rested")]
+        self._history_label_to_key = {n: k for (n, k) in history_items}
+        history_key_to_label = {k: n for (n, k) in history_items}
+        ttk.Label(filters, text="歌唱履歴").grid(row=3, column=0, sticky="w", pady=(6, 0))
+        self.q_history_combo = ttk.Combobox(filters, state="readonly", width=20, values=[n for (n, _) in history_items])
+        self.q_history_combo.set(history_key_to_label.get(self.settings.get("search_history", ""), "すべて"))
+        self.q_history_combo.grid(row=3, column=1, sticky="w", padx=8, pady=(6, 0))
+        self.q_history_combo.bind("<<ComboboxSelected>>", self._on_search_history_change)
+        rested = ttk.Frame(filters)
+        rested.grid(row=3, column=2, columnspan=2, sticky="w", padx=8, pady=(6, 0))
+        ttk.Label(rested, text="直近").pack(side="left")
+        self.q_recent_streams = tk.StringVar(value=str(self.settings.get("search_recent_streams", 3)))
+        self.q_recent_streams.trace_add("write", self._schedule_live_search)
+        ttk.Entry(rested, textvariable=self.q_recent_streams, width=4).pack(side="left", padx=4)
+        ttk.Label(rested, text="枠（「直近の枠で歌っていない」用）", style="Muted.TLabel").pack(side="left")
+
         btns = ttk.Frame(filters)
         btns.grid(row=0, column=4, rowspan=2, sticky="ns", padx=(12, 0))
         ttk.Button(btns, text="検索", command=self.run_search, width=10).pack(pady=(0, 6))
@@ -975,20 +4043,24 @@ class KaraokeSetlistApp(tk.Tk):
         results = ttk.LabelFrame(frm, text="検索結果（ダブルクリックで詳細）")
         results.pack(fill="both", expand=True, pady=(10, 0))
 
-        cols = ("id", "title", "artist", "provider", "keywords")
-        self.tree = ttk.Treeview(results, columns=cols, show="headings", height=16)
+        cols = ("id", "title", "artist", "provider", "keywords", "sing_count", "last_sung")
+        self.tree = ttk.Treeview(results, columns=cols, show="headings", height=16, selectmode="extended")
         for c, t, w in [
             ("id", "ID", 60),
             ("title", "曲名", 260),
             ("artist", "アーティスト", 210),
             ("provider", "提供元", 160),
             ("keywords", "キーワード", 280),
+            ("sing_count", "歌唱回数", 70),
+            ("last_sung", "最後に歌った日", 110),
         ]:
             self.tree.heading(c, text=t)
-            self.tree.column(c, width=w, anchor=("e" if c == "id" else "w"))
+            self.tree.column(c, width=w, anchor=("e" if c in ("id", "sing_count") else "w"))
 
         yscroll = ttk.Scrollbar(results, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=yscroll.set)
+        self._search_yscroll = yscroll
+        # 表示中の範囲が末尾に近づいたら次ページを読み込む
+        self.tree.configure(yscrollcommand=self._on_search_yscroll)
 
         self.tree.grid(row=0, column=0, sticky="nsew")
         yscroll.grid(row=0, column=1, sticky="ns")
@@ -1002,6 +4074,19 @@ class KaraokeSetlistApp(tk.Tk):
 
         self.tree.bind("<Double-1>", lambda e: self.open_selected_detail())
 
+        self._search_query = {}
+        self._search_sort = "new"
+        self._search_pages = []  # 一覧に載っているページ [(先頭の cursor, 末尾の cursor, iid のリスト)]
+        self._search_offset = 0  # 一覧から外した上側の件数
+        self._search_done = True  # 下にもう結果がない
+        self._search_loading = False
+        self._search_total = 0
+
+        self.search_worker = SearchWorker()
+        self._search_gen = 0
+        self._live_search_job = None
+        self._search_poll_job = None
+
     def clear_search(self):
         self.q_title.set("")
         self.q_artist.set("")
@@ -1009,13 +4094,192 @@ class KaraokeSetlistApp(tk.Tk):
         self.q_keyword.set("")
         self.run_search()
 
+    def _on_search_romaji_toggle(self):
+        self.settings["search_romaji"] = bool(self.q_romaji.get())
+        self._save_settings()
+        self.run_search()
+
+    def _on_search_history_change(self, _evt=None):
+        self.settings["search_history"] = self._history_label_to_key.get(self.q_history_combo.get().strip(), "")
+        self._save_settings()
+        self.run_search()
+
+    def _on_search_sort_change(self, _evt=None):
+        self.settings["search_sort"] = self._sort_label_to_key.get(self.q_sort_combo.get().strip(), "new")
+        self._save_settings()
+        self.run_search()
+
+    def _schedule_live_search(self, *_args):
+        """入力のたびに呼ばれる。最後の入力から SEARCH_DEBOUNCE_MS 後に検索"""
+        if self._live_search_job is not None:
+            self.after_cancel(self._live_search_job)
+        self._live_search_job = self.after(SEARCH_DEBOUNCE_MS, self.run_search)
+
     def run_search(self):
-        rows = db_search_songs(self.q_title.get(), self.q_artist.get(), self.q_provider.get(), self.q_keyword.get())
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        for r in rows:
-            self.tree.insert("", "end", values=(r["id"], r["title"], r["artist"], r["provider"], r["keywords"]))
-        self.status_var.set(f"検索結果: {len(rows)} 件")
+        if self._live_search_job is not None:
+            self.after_cancel(self._live_search_job)
+            self._live_search_job = None
+
+        query = {
+            "title": self.q_title.get(),
+            "artist": self.q_artist.get(),
+            "provider": self.q_provider.get(),
+            "keyword": self.q_keyword.get(),
+            "romaji": bool(self.q_romaji.get()),
+            "history": self._history_label_to_key.get(self.q_history_combo.get().strip(), ""),
+            "recent_streams": self._recent_streams_value(),
+        }
+        sort = self._sort_label_to_key.get(self.q_sort_combo.get().strip(), "new")
+
+        def job():
+            total = db_count_songs(**query)
+            rows = db_search_songs(**query, sort=sort, limit=SEARCH_PAGE_SIZE)
+            return "first", (query, sort, total, rows)
+
+        # 結果が届くまでは古い結果の追加読み込みを止める
+        self._search_done = True
+        self._submit_search(job)
+
+    def _submit_search(self, job):
+        self._search_gen = self.search_worker.submit(job)
+        if self._search_poll_job is None:
+            self._search_poll_job = self.after(SEARCH_POLL_MS, self._poll_search_results)
+
+    def _recent_streams_value(self) -> int:
+        try:
+            n = max(1, int(self.q_recent_streams.get().strip()))
+        except ValueError:
+            return int(self.settings.get("search_recent_streams", 3))
+        if n != self.settings.get("search_recent_streams"):
+            self.settings["search_recent_streams"] = n
+            self._save_settings()
+        return n
+
+    def _poll_search_results(self):
+        self._search_poll_job = None
+        latest = None
+        while True:
+            try:
+                gen, result = self.search_worker.results.get_nowait()
+            except queue.Empty:
+                break
+            if gen == self._search_gen:
+                latest = result
+        if latest is None:
+            self._search_poll_job = self.after(SEARCH_POLL_MS, self._poll_search_results)
+            return
+        if isinstance(latest, Exception):
+            self._search_loading = False
+            self.status_var.set(f"検索エラー: {latest}")
+            return
+        kind, payload = latest
+        if kind == "first":
+            self._apply_search_results(*payload)
+        elif kind == "next":
+            self._search_loading = False
+            self._append_search_rows(payload)
+        else:
+            self._search_loading = False
+            self._prepend_search_rows(payload)
+
+    def _apply_search_results(self, query: dict, sort: str, total: int, rows):
+        self._search_query = query
+        self._search_sort = sort
+        self._search_total = total
+        self._search_pages = []
+        self._search_offset = 0
+        self._search_done = False
+        self._search_loading = False
+        self.tree.delete(*self.tree.get_children())
+        self.tree.yview_moveto(0)
+        self._append_search_rows(rows)
+
+    def _load_more_results(self, direction: str = "next"):
+        """前後のページを検索スレッドで読む（結果は _poll_search_results で一覧に足す）"""
+        if not self._search_pages or (self._search_done if direction == "next" else not self._search_offset):
+            self._search_loading = False
+            return
+        query, sort = self._search_query, self._search_sort
+        if direction == "next":
+            cursor = self._search_pages[-1][1]
+
+            def job():
+                return "next", db_search_songs(**query, sort=sort, after=cursor, limit=SEARCH_PAGE_SIZE)
+        else:
+            cursor = self._search_pages[0][0]
+
+            def job():
+                return "prev", db_search_songs(**query, sort=sort, before=cursor, limit=SEARCH_PAGE_SIZE)
+
+        self._submit_search(job)
+
+    @staticmethod
+    def _search_row_values(r) -> tuple:
+        return (
+            r["id"], r["title"], r["artist"], r["provider"], r["keywords"],
+            r["sing_count"], (r["last_sung_at"] or "")[:10],
+        )
+
+    def _shift_search_view(self, change):
+        """change() で一覧の上側の行数が変わっても、同じ行が見えたままにする（change は上側の増減数を返す）"""
+        before = len(self.tree.get_children())
+        top = round(float(self.tree.yview()[0]) * before)
+        shift = change()
+        after = len(self.tree.get_children())
+        if shift and after:
+            self.tree.yview_moveto(max(0, top + shift) / after)
+
+    def _append_search_rows(self, rows):
+        if rows:
+            iids = [self.tree.insert("", "end", values=self._search_row_values(r)) for r in rows]
+            self._search_pages.append((search_cursor(rows[0]), search_cursor(rows[-1]), iids))
+        if len(rows) < SEARCH_PAGE_SIZE:
+            self._search_done = True
+        if len(self._search_pages) > SEARCH_MAX_PAGES:
+            def drop_top():
+                _, _, dropped = self._search_pages.pop(0)
+                self.tree.delete(*dropped)
+                self._search_offset += len(dropped)
+                return -len(dropped)
+            self._shift_search_view(drop_top)
+        self._update_search_status()
+
+    def _prepend_search_rows(self, rows):
+        def add_top():
+            if not rows:
+                return 0
+            iids = [self.tree.insert("", i, values=self._search_row_values(r)) for i, r in enumerate(rows)]
+            self._search_pages.insert(0, (search_cursor(rows[0]), search_cursor(rows[-1]), iids))
+            return len(rows)
+        self._shift_search_view(add_top)
+        # 先頭まで戻ったら 0（外していた間に曲が増減していても上端で揃える）
+        self._search_offset = 0 if len(rows) < SEARCH_PAGE_SIZE else max(0, self._search_offset - len(rows))
+        if len(self._search_pages) > SEARCH_MAX_PAGES:
+            _, _, dropped = self._search_pages.pop()
+            self.tree.delete(*dropped)
+            self._search_done = False
+        self._update_search_status()
+
+    def _update_search_status(self):
+        shown = sum(len(p[2]) for p in self._search_pages)
+        if self._search_offset or not self._search_done:
+            first = self._search_offset + 1 if shown else self._search_offset
+            self.status_var.set(
+                f"検索結果: {self._search_total} 件（{first}〜{self._search_offset + shown} 件目を表示・スクロールで前後を表示）"
+            )
+        else:
+            self.status_var.set(f"検索結果: {self._search_total} 件")
+
+    def _on_search_yscroll(self, first, last):
+        self._search_yscroll.set(first, last)
+        if self._search_loading:
+            return
+        if not self._search_done and float(last) >= 0.9:
+            self._search_loading = True
+            self.after_idle(self._load_more_results, "next")
+        elif self._search_offset and float(first) <= 0.1:
+            self._search_loading = True
+            self.after_idle(self._load_more_results, "prev")
 
     def _selected_song_id(self):
         sel = self.tree.selection()
@@ -1024,6 +4288,17 @@ class KaraokeSetlistApp(tk.Tk):
         vals = self.tree.item(sel[0], "values")
         return int(vals[0]) if vals else None
 
+    def _selected_song_ids(self) -> list[int]:
+        """選択中の曲ID（一覧の表示順）"""
+        selected = set(self.tree.selection())
+        ids = []
+        for iid in self.tree.get_children():
+            if iid in selected:
+                vals = self.tree.item(iid, "values")
+                if vals:
+                    ids.append(int(vals[0]))
+        return ids
+
     def open_selected_detail(self):
         sid = self._selected_song_id()
         if not sid:
@@ -1032,11 +4307,12 @@ class KaraokeSetlistApp(tk.Tk):
         self.show_detail(sid)
 
     def add_selected_to_queue(self):
-        sid = self._selected_song_id()
-        if not sid:
-            messagebox.showinfo("選択なし", "検索結果から曲を選択してください。")
+        ids = self._selected_song_ids()
+        if not ids:
+            messagebox.showinfo("選択なし", "検索結果から曲を選択してください（Ctrl/Shift で複数選択できます）。")
             return
-        self.add_to_queue(sid)
+        if not self.add_songs_to_queue(ids):
+            messagebox.showerror("エラー", "曲データが見つかりません。")
 
     # -------------------------
     # 詳細タブ
@@ -1176,8 +4452,9 @@ class KaraokeSetlistApp(tk.Tk):
         self.video_path_var.set(row["video_path"] or "")
         self.audio_path_var2.set(row["audio_path"] or "")
 
-        self._set_text_readonly(self.lyrics_text, row["lyrics"] or "")
-        self._set_text_readonly(self.credit_text, row["credit_text"] or "")
+        texts = db_get_song_texts(song_id)
+        self._set_text_readonly(self.lyrics_text, texts["lyrics"])
+        self._set_text_readonly(self.credit_text, texts["credit_text"])
 
         self.notebook.select(self.tab_detail)
         self.status_var.set(f"詳細表示: ID={song_id}")
@@ -1200,7 +4477,7 @@ class KaraokeSetlistApp(tk.Tk):
         row = db_get_song(self.current_detail_id)
         if not row:
             return
-        self.load_song_into_register(row)
+        self.load_song_into_register(row, db_get_song_texts(row["id"]))
         self.set_register_mode(edit_song_id=row["id"])
         self.notebook.select(self.tab_register)
 
@@ -1309,6 +4586,15 @@ class KaraokeSetlistApp(tk.Tk):
         ttk.Button(qbtns, text="上へ", command=lambda: self.move_queue(-1)).pack(side="left", padx=(8, 0))
         ttk.Button(qbtns, text="下へ", command=lambda: self.move_queue(1)).pack(side="left", padx=(8, 0))
 
+        saved = ttk.Frame(queue_box)
+        saved.grid(row=2, column=0, sticky="ew", padx=10, pady=(0, 10))
+        ttk.Label(saved, text="保存リスト").pack(side="left")
+        self.saved_list_combo = ttk.Combobox(saved, width=16, postcommand=self._refresh_saved_lists)
+        self.saved_list_combo.pack(side="left", padx=(6, 0))
+        ttk.Button(saved, text="キューに追加", command=self.add_saved_list_to_queue).pack(side="left", padx=(8, 0))
+        ttk.Button(saved, text="キューを保存", command=self.save_queue_as_list).pack(side="left", padx=(8, 0))
+        ttk.Button(saved, text="削除", command=self.delete_saved_list).pack(side="left", padx=(8, 0))
+
         # Finished list + scrollbar
         f_list_frame = ttk.Frame(fin_box)
         f_list_frame.grid(row=0, column=0, sticky="nsew", padx=10, pady=(10, 6))
@@ -1327,6 +4613,7 @@ class KaraokeSetlistApp(tk.Tk):
         self.btn_timer = ttk.Button(fbtns, text="タイマー開始", command=self.toggle_timer)
         self.btn_timer.pack(side="left")
         ttk.Button(fbtns, text="履歴クリア", command=self.clear_finished).pack(side="left", padx=(10, 0))
+        ttk.Button(fbtns, text="新しい枠", command=self.new_session).pack(side="left", padx=(10, 0))
 
         self._set_text_readonly(self.now_lyrics_text, "")
         self.refresh_now_view()
@@ -1349,22 +4636,80 @@ class KaraokeSetlistApp(tk.Tk):
         self.now_lyrics_text.yview_scroll(direction * half, "units")
 
     def add_to_queue(self, song_id: int):
-        row = db_get_song(song_id)
-        if not row:
+        if not self.add_songs_to_queue([song_id]):
             messagebox.showerror("エラー", "曲データが見つかりません。")
+
+    def add_songs_to_queue(self, song_ids) -> int:
+        """まとめてキューへ追加する（曲は1クエリで読み、一覧への追加・Viewer 更新も1回）"""
+        rows = db_get_songs(song_ids)
+        found = [(int(sid), row) for sid, row in zip(song_ids, rows) if row]
+        if not found:
+            return 0
+        ids = [sid for sid, _ in found]
+        self.queue_ids.extend(ids)
+        self.queue_list.insert("end", *[song_line(row) for _, row in found])
+        if len(ids) == 1:
+            self._journal("queue_add", id=ids[0])
+        else:
+            self._journal("queue_add_many", ids=ids)
+        self._mark_viewer_dirty("queue")
+        missing = len(song_ids) - len(found)
+        msg = "キューに追加しました" if len(ids) == 1 else f"キューに {len(ids)} 曲追加しました"
+        self.status_var.set(msg + (f"（見つからない曲 {missing} 件は除外）" if missing else ""))
+        return len(ids)
+
+    # ---------- saved lists ----------
+    def _refresh_saved_lists(self):
+        self.saved_list_combo["values"] = db_saved_list_names()
+
+    def add_saved_list_to_queue(self):
+        name = self.saved_list_combo.get().strip()
+        ids = db_get_saved_list(name) if name else []
+        if not ids:
+            messagebox.showinfo("保存リスト", "追加するリストを選んでください。")
+            return
+        self.add_songs_to_queue(ids)
+
+    def save_queue_as_list(self):
+        name = self.saved_list_combo.get().strip()
+        if not name:
+            messagebox.showinfo("保存リスト", "リスト名を入力してください。")
+            return
+        if not self.queue_ids:
+            messagebox.showinfo("保存リスト", "キューが空です。")
+            return
+        if name in db_saved_list_names() and not messagebox.askyesno("保存リスト", f"「{name}」を上書きしますか？"):
+            return
+        try:
+            db_save_list(name, self.queue_ids)
+        except sqlite3.OperationalError as e:
+            self._show_db_error("保存リスト", e)
+            return
+        self._refresh_saved_lists()
+        self.status_var.set(f"キュー {len(self.queue_ids)} 曲を「{name}」として保存しました")
+
+    def delete_saved_list(self):
+        name = self.saved_list_combo.get().strip()
+        if not name or name not in db_saved_list_names():
+            return
+        if not messagebox.askyesno("保存リスト", f"「{name}」を削除しますか？"):
+            return
+        try:
+            db_delete_saved_list(name)
+        except sqlite3.OperationalError as e:
+            self._show_db_error("保存リスト", e)
             return
-        self.queue_ids.append(song_id)
-        self.queue_list.insert("end", song_line(row))
-        self.status_var.set("キューに追加しました")
+        self.saved_list_combo.set("")
+        self._refresh_saved_lists()
+        self.status_var.set(f"保存リスト「{name}」を削除しました")
 
     def _move_now_to_finished(self):
         if self.now_id is None:
             return
+        # 曲が削除されていても記録する（ジャーナルの "select" の再生と同じ結果にする）
         row_now = db_get_song(self.now_id)
-        if not row_now:
-            return
         self.finished_entries.append({"song_id": int(self.now_id), "start_sec": int(self.now_start_sec)})
-        self.fin_list.insert("end", f"{format_hhmmss(self.now_start_sec)}  {song_line(row_now)}")
+        self.fin_list.insert("end", f"{format_hhmmss(self.now_start_sec)}  {song_line(row_now) if row_now else '（削除された曲）'}")
 
     def select_song_from_queue(self):
         sel = self.queue_list.curselection()
@@ -1372,17 +4717,29 @@ class KaraokeSetlistApp(tk.Tk):
             self.status_var.set("キューから曲を選択してください（EnterでもOK）")
             return
         idx = sel[0]
+        start_sec = self.get_elapsed_seconds()
+        # DB に記録できてから画面・ジャーナルを変える（書けなければ何も変えない）
+        try:
+            if self.stream_id is None:
+                self.stream_id = db_start_stream()
+            db_record_performance(self.stream_id, self.queue_ids[idx], start_sec)
+        except sqlite3.OperationalError as e:
+            self._show_db_error("曲の開始", e)
+            return
 
         self._move_now_to_finished()
 
+        self._close_previous_player()
         self.now_id = self.queue_ids.pop(idx)
         self.queue_list.delete(idx)
 
-        self.now_start_sec = self.get_elapsed_seconds()
+        self.now_start_sec = start_sec
         self.session_events.append({"song_id": int(self.now_id), "start_sec": int(self.now_start_sec)})
+        self._journal("select", idx=idx, start=self.now_start_sec, stream=self.stream_id)
+        self._mark_viewer_dirty("now", "queue", "done")
 
         self.refresh_now_view()
-        self.refresh_stamp_view()
+        self._append_stamp(self.now_id, self.now_start_sec)
 
     def refresh_now_view(self):
         if self.now_id is None:
@@ -1395,7 +4752,7 @@ class KaraokeSetlistApp(tk.Tk):
                 self.now_title_var.set(song_line(row))
                 prov = (row["provider"] or "").strip()
                 self.now_provider_var.set(f"音源: {prov} 様" if prov else "")
-                self._set_text_readonly(self.now_lyrics_text, row["lyrics"] or "")
+                self._set_text_readonly(self.now_lyrics_text, db_get_song_texts(self.now_id)["lyrics"])
             else:
                 self.now_title_var.set("（不明）")
                 self.now_provider_var.set("")
@@ -1419,21 +4776,74 @@ class KaraokeSetlistApp(tk.Tk):
             self.btn_video.config(state="disabled")
             self.btn_detail.config(state="disabled")
             return
-        self.btn_music.config(state="normal" if exists_file(row["audio_path"]) else "disabled")
-        self.btn_video.config(state="normal" if exists_file(row["video_path"]) else "disabled")
+        # 有無は MediaAvailability の結果を見るだけ（未確認なら押せるようにしておき、結果が来たら更新）
+        self.btn_music.config(state="disabled" if self.media_status.available(row["audio_path"]) is False else "normal")
+        self.btn_video.config(state="disabled" if self.media_status.available(row["video_path"]) is False else "normal")
         self.btn_detail.config(state="normal")
 
+    # ---------- media availability ----------
+    def _media_library_paths(self) -> list[str]:
+        """MediaAvailability の専用スレッドから呼ばれる"""
+        return db_media_paths() + [
+            str(self.settings.get("bgm_video_path", "") or ""),
+            str(self.settings.get("bgm_audio_path", "") or ""),
+        ]
+
+    def _media_status_tick(self):
+        changed = set()
+        while True:
+            try:
+                changed.add(self.media_status.changes.get_nowait())
+            except queue.Empty:
+                break
+        if not changed or self.now_id is None:
+            return
+        row = db_get_song(self.now_id)
+        if row and (row["audio_path"] in changed or row["video_path"] in changed):
+            self._update_now_controls()
+
+    def _open_media(self, path: str, label: str, group: str = "song"):
+        path = (path or "").strip()
+        if not path:
+            messagebox.showerror("再生エラー", "パスが空です。")
+            return
+        if self.media_status.available(path) is False:
+            self.media_status.request(path)  # 戻っていれば次の確認で押せるようになる
+            messagebox.showerror("再生エラー", f"見つかりません: {path}")
+            return
+        # 起動は待たない（結果は _launcher_tick でステータスバーに出す）
+        self.launcher.launch(path, label, group)
+        self.status_var.set(f"{label}を開いています…")
+
+    def _launcher_tick(self):
+        self.launcher.reap()
+        while True:
+            try:
+                kind, label, detail = self.launcher.results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "started":
+                how = "プレーヤー" if self.launcher.command else "既定アプリ"
+                self.status_var.set(f"{label}を開きました（{how}）")
+            elif kind == "exited":
+                self.status_var.set(f"{label}のプレーヤーが異常終了しました（終了コード {detail}）")
+            else:
+                self.status_var.set(f"{label}を開けませんでした: {detail}")
+
+    def _close_previous_player(self):
+        if not self.settings.get("player_close_previous", True):
+            return
+        n = self.launcher.close_group("song")
+        if n:
+            self.status_var.set(f"前の曲のプレーヤーを閉じました（{n} 件）")
+
     def play_audio(self):
         if self.now_id is None:
             return
         row = db_get_song(self.now_id)
         if not row:
             return
-        try:
-            open_path_with_default_app(row["audio_path"])
-            self.status_var.set("音源を開きました（既定アプリ）")
-        except Exception as e:
-            messagebox.showerror("再生エラー", str(e))
+        self._open_media(row["audio_path"], "音源")
 
     def play_video(self):
         if self.now_id is None:
@@ -1441,11 +4851,7 @@ class KaraokeSetlistApp(tk.Tk):
         row = db_get_song(self.now_id)
         if not row:
             return
-        try:
-            open_path_with_default_app(row["video_path"])
-            self.status_var.set("動画を開きました（既定アプリ）")
-        except Exception as e:
-            messagebox.showerror("再生エラー", str(e))
+        self._open_media(row["video_path"], "動画")
 
 
     def play_bgm(self):
@@ -1454,10 +4860,8 @@ class KaraokeSetlistApp(tk.Tk):
         apath = str(self.settings.get("bgm_audio_path", "") or "").strip()
 
         def _exists(p: str) -> bool:
-            try:
-                return bool(p) and os.path.exists(p)
-            except Exception:
-                return False
+            # 未確認（None）は開いてみる
+            return bool(p) and self.media_status.available(p) is not False
 
         prefer_video = bool(self.settings.get("bgm_prefer_video", False))
 
@@ -1484,11 +4888,7 @@ class KaraokeSetlistApp(tk.Tk):
                 messagebox.showwarning("BGMが見つかりません", "設定したBGMファイルが見つかりませんでした。\n設定タブでパスを確認してください。")
             return
 
-        try:
-            open_path_with_default_app(target)
-            self.status_var.set(f"{kind}を開きました（既定アプリ）")
-        except Exception as e:
-            messagebox.showerror("再生エラー", str(e))
+        self._open_media(target, kind, group="bgm")
 
     def remove_queue_selected(self):
         sel = self.queue_list.curselection()
@@ -1497,6 +4897,8 @@ class KaraokeSetlistApp(tk.Tk):
         idx = sel[0]
         self.queue_list.delete(idx)
         self.queue_ids.pop(idx)
+        self._journal("queue_remove", idx=idx)
+        self._mark_viewer_dirty("queue")
         self.status_var.set("キューから削除しました")
 
     def move_queue(self, delta: int):
@@ -1513,12 +4915,93 @@ class KaraokeSetlistApp(tk.Tk):
         self.queue_list.selection_set(new_idx)
         sid = self.queue_ids.pop(idx)
         self.queue_ids.insert(new_idx, sid)
+        self._journal("queue_move", **{"from": idx, "to": new_idx})
+        self._mark_viewer_dirty("queue")
 
     def clear_finished(self):
         self.finished_entries = []
         self.fin_list.delete(0, "end")
+        self._journal("clear_done")
+        self._mark_viewer_dirty("done")
         self.status_var.set("歌い終わり履歴をクリアしました")
-        self.refresh_stamp_view()
+
+    # ---------- session journal ----------
+    def _session_state(self) -> dict:
+        return {
+            "queue_ids": list(self.queue_ids),
+            "now_id": self.now_id,
+            "now_start_sec": int(self.now_start_sec),
+            "finished_entries": [dict(e) for e in self.finished_entries],
+            "session_events": [dict(e) for e in self.session_events],
+            "timer_accum": self.timer_accum,
+            "timer_started_wall": self._timer_started_epoch(),
+            "stream_id": self.stream_id,
+        }
+
+    def _show_db_error(self, title: str, e: Exception):
+        """DB に書き込めなかった（一括処理のロック待ちが長引いた等）。操作は反映していない"""
+        messagebox.showerror(title, f"データベースに書き込めませんでした。少し待ってからもう一度お試しください。\n{e}")
+
+    def _journal(self, op: str, **fields):
+        """セットリスト操作をジャーナルへ追記（一定件数ごとにスナップショットへ畳む）"""
+        self.session_journal.append(dict(fields, op=op))
+        if self.session_journal.needs_compaction():
+            self.session_journal.compact(self._session_state())
+
+    def _restore_session(self, state: dict):
+        """ジャーナルから復元したセッションを画面・タイマー・Viewer に反映する"""
+        self.queue_ids = [int(x) for x in state.get("queue_ids", [])]
+        self.now_id = state.get("now_id")
+        self.now_start_sec = int(state.get("now_start_sec", 0))
+        self.finished_entries = list(state.get("finished_entries", []))
+        self.session_events = list(state.get("session_events", []))
+        self.stream_id = state.get("stream_id")
+
+        rows = db_get_songs(self.queue_ids + [e["song_id"] for e in self.finished_entries])
+        self.queue_list.delete(0, "end")
+        for row in rows[:len(self.queue_ids)]:
+            self.queue_list.insert("end", song_line(row) if row else "（削除された曲）")
+        self.fin_list.delete(0, "end")
+        for e, row in zip(self.finished_entries, rows[len(self.queue_ids):]):
+            self.fin_list.insert("end", f"{format_hhmmss(e['start_sec'])}  {song_line(row) if row else '（削除された曲）'}")
+
+        self.scheduler.remove("timer")
+        self.timer_accum = float(state.get("timer_accum", 0.0))
+        started = state.get("timer_started_wall")
+        self.timer_running = started is not None
+        if self.timer_running:
+            # 落ちていた間も配信は続いていたとみなし、壁時計で経過を引き継ぐ
+            self.timer_started_at = time.monotonic() - max(0.0, time.time() - float(started))
+            self.btn_timer.config(text="タイマー停止")
+            self._start_timer_job()
+        else:
+            self.timer_started_at = None
+            self.btn_timer.config(text="タイマー開始")
+            self.elapsed_var.set(format_hhmmss(self.get_elapsed_seconds()))
+
+        self.refresh_now_view()
+        self.rebuild_stamps()
+        self._mark_viewer_dirty()
+        if self.queue_ids or self.now_id is not None or self.session_events or self.timer_accum or self.timer_running:
+            self.status_var.set(
+                f"前回のセッションを復元しました（キュー {len(self.queue_ids)} 曲・歌った曲 {len(self.session_events)} 曲）"
+            )
+
+    def new_session(self):
+        """キュー・現在曲・履歴・タイムスタンプ・タイマーを空にして新しい枠を始める"""
+        if not messagebox.askyesno("新しい枠", "キュー・履歴・タイムスタンプ・タイマーをすべてリセットします。よろしいですか？"):
+            return
+        if self.stream_id is not None:
+            try:
+                db_end_stream(self.stream_id)
+            except sqlite3.OperationalError as e:
+                self._show_db_error("新しい枠", e)
+                return
+        self._journal("reset")
+        state = new_session_state()
+        self.session_journal.compact(state)
+        self._restore_session(state)
+        self.status_var.set("新しい枠を始めました")
 
     # -------------------------
     # 登録タブ
@@ -1626,8 +5109,284 @@ class KaraokeSetlistApp(tk.Tk):
         note = ttk.Label(form, text="* は必須です。検索欄にひらがなで入力しても、ふりがな欄を部分検索してヒットします。", style="Muted.TLabel", wraplength=520)
         note.grid(row=r + 1, column=1, sticky="w", padx=8, pady=(8, 12))
 
+        # ---- 一括インポート / エクスポート ----
+        bulk = ttk.LabelFrame(form, text="一括インポート / エクスポート / メディアの自動リンク")
+        bulk.grid(row=r + 2, column=0, columnspan=2, sticky="ew", pady=(4, 12))
+        imp_row = ttk.Frame(bulk)
+        imp_row.pack(fill="x", padx=10, pady=(10, 0))
+        self.import_btn = ttk.Button(imp_row, text="取り込む（CSV / TSV / JSONL）...", command=self.start_import)
+        self.import_btn.pack(side="left")
+        self.import_skip_dup_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(imp_row, text="曲名+アーティストが同じ曲はスキップ", variable=self.import_skip_dup_var).pack(side="left", padx=(16, 0))
+
+        exp_row = ttk.Frame(bulk)
+        exp_row.pack(fill="x", padx=10, pady=(8, 0))
+        self.export_btn = ttk.Button(exp_row, text="書き出す（CSV / JSONL）...", command=self.start_export)
+        self.export_btn.pack(side="left")
+        self.bulk_cancel_btn = ttk.Button(exp_row, text="中止", command=self.cancel_bulk_job, state="disabled")
+        self.bulk_cancel_btn.pack(side="left", padx=(8, 0))
+
+        cols_frm = ttk.Frame(bulk)
+        cols_frm.pack(fill="x", padx=10, pady=(6, 0))
+        ttk.Label(cols_frm, text="書き出す列:").grid(row=0, column=0, sticky="nw")
+        chosen = set(self.settings.get("export_columns") or EXPORT_DEFAULT_FIELDS)
+        self.export_field_vars = {}
+        for i, (field, label) in enumerate(EXPORT_FIELDS):
+            var = tk.BooleanVar(value=field in chosen)
+            self.export_field_vars[field] = var
+            ttk.Checkbutton(cols_frm, text=label, variable=var, command=self._on_export_fields_change).grid(
+                row=i // 4, column=1 + i % 4, sticky="w", padx=(6, 0)
+            )
+
+        # メディアフォルダ（動画/音源を探して曲にリンクする）
+        media = ttk.Frame(bulk)
+        media.pack(fill="x", padx=10, pady=(10, 0))
+        media.columnconfigure(1, weight=1)
+        ttk.Label(media, text="メディアフォルダ:").grid(row=0, column=0, sticky="nw")
+        self.media_folder_list = tk.Listbox(media, height=3, exportselection=False)
+        self.media_folder_list.grid(row=0, column=1, sticky="ew", padx=(6, 0))
+        for folder in self.settings.get("media_folders", []):
+            self.media_folder_list.insert("end", folder)
+        mbtns = ttk.Frame(media)
+        mbtns.grid(row=0, column=2, sticky="nw", padx=(6, 0))
+        ttk.Button(mbtns, text="追加...", command=self.add_media_folder).pack(fill="x")
+        ttk.Button(mbtns, text="削除", command=self.remove_media_folder).pack(fill="x", pady=(4, 0))
+
+        scan_row = ttk.Frame(bulk)
+        scan_row.pack(fill="x", padx=10, pady=(6, 0))
+        self.media_scan_btn = ttk.Button(scan_row, text="スキャンして候補を表示", command=self.start_media_scan)
+        self.media_scan_btn.pack(side="left")
+        self.media_rematch_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(scan_row, text="全フォルダを読み直して照合し直す（曲を追加・改名した後に）", variable=self.media_rematch_var).pack(side="left", padx=(16, 0))
+
+        self.media_tree = ttk.Treeview(bulk, columns=("kind", "title", "artist", "path"), show="headings", height=6, selectmode="extended")
+        for col, label, width in (("kind", "種類", 50), ("title", "曲名", 160), ("artist", "アーティスト", 120), ("path", "ファイル", 260)):
+            self.media_tree.heading(col, text=label)
+            self.media_tree.column(col, width=width, stretch=(col == "path"))
+        self.media_tree.pack(fill="x", padx=10, pady=(6, 0))
+        link_row = ttk.Frame(bulk)
+        link_row.pack(fill="x", padx=10, pady=(6, 0))
+        ttk.Button(link_row, text="選択した候補をリンク", command=lambda: self.apply_media_links(selected_only=True)).pack(side="left")
+        ttk.Button(link_row, text="すべてリンク", command=lambda: self.apply_media_links(selected_only=False)).pack(side="left", padx=(8, 0))
+        ttk.Button(link_row, text="リンク切れを表示", command=self.show_broken_media_links).pack(side="left", padx=(16, 0))
+        self._media_proposals = {}
+
+        self.bulk_progress = ttk.Progressbar(bulk, mode="determinate", maximum=100)
+        self.bulk_progress.pack(fill="x", padx=10, pady=(8, 0))
+        self.bulk_status_var = tk.StringVar(value="取り込むファイルの1行目には見出し（曲名 / アーティスト名 / 歌詞 … または title / artist / lyrics …）が必要です。")
+        ttk.Label(bulk, textvariable=self.bulk_status_var, style="Muted.TLabel", wraplength=520).pack(fill="x", padx=10, pady=(6, 10))
+
         self.set_register_mode(None)
 
+    # ---------- bulk import / export ----------
+    def _start_bulk_job(self, name: str, label: str, func, on_done):
+        """func(on_progress, cancel) をワーカースレッドで実行し、進捗をバーに出す"""
+        self._bulk_cancel = threading.Event()
+        self._bulk_results = queue.Queue()
+        self._bulk_on_done = on_done
+
+        def run():
+            try:
+                result = func(lambda fraction, text: self._bulk_results.put((fraction, text)), self._bulk_cancel)
+                self._bulk_results.put(("done", result))
+            except BulkCancelled:
+                self._bulk_results.put(("cancelled", None))
+            except Exception as e:  # OSError / ValueError / csv.Error / sqlite3.Error のほか想定外の例外でも必ず終わらせる
+                self._bulk_results.put(("error", e))
+            finally:
+                get_pool().release()
+
+        for btn in (self.import_btn, self.export_btn, self.media_scan_btn):
+            btn.config(state="disabled")
+        self.bulk_cancel_btn.config(state="normal")
+        self.bulk_progress["value"] = 0
+        self.bulk_status_var.set(label)
+        self._bulk_thread = threading.Thread(target=run, name=name, daemon=True)
+        self._bulk_thread.start()
+        self.after(BULK_POLL_MS, self._poll_bulk_job)
+
+    def cancel_bulk_job(self):
+        if self._bulk_thread is not None:
+            self._bulk_cancel.set()
+            self.bulk_status_var.set("中止しています…")
+
+    def _poll_bulk_job(self):
+        latest, final = None, None
+        while True:
+            try:
+                item = self._bulk_results.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item[0], str):
+                final = item
+            else:
+                latest = item
+        if latest is not None:
+            fraction, text = latest
+            self.bulk_progress["value"] = fraction * 100
+            self.bulk_status_var.set(f"{fraction * 100:.0f}%  {text}")
+        if final is None:
+            self.after(BULK_POLL_MS, self._poll_bulk_job)
+            return
+
+        self._bulk_thread = None
+        for btn in (self.import_btn, self.export_btn, self.media_scan_btn):
+            btn.config(state="normal")
+        self.bulk_cancel_btn.config(state="disabled")
+        kind, payload = final
+        if kind == "done":
+            self.bulk_progress["value"] = 100
+            self._bulk_on_done(payload)
+        elif kind == "cancelled":
+            self.bulk_progress["value"] = 0
+            self.bulk_status_var.set("中止しました（何も変更していません）")
+        else:
+            self.bulk_progress["value"] = 0
+            self.bulk_status_var.set("失敗しました")
+            if not isinstance(payload, (OSError, ValueError, csv.Error, sqlite3.Error)):
+                payload = f"{type(payload).__name__}: {payload}"  # 想定外の例外は種類も出す
+            messagebox.showerror("一括インポート / エクスポート", f"処理できませんでした。\n{payload}")
+
+    def start_import(self):
+        if self._bulk_thread is not None:
+            return
+        path = filedialog.askopenfilename(
+            title="取り込むファイルを選択",
+            filetypes=[("CSV / TSV / JSONL", " ".join(f"*{ext}" for ext in IMPORT_FORMATS)), ("All", "*.*")],
+        )
+        if not path:
+            return
+        skip_dup = bool(self.import_skip_dup_var.get())
+
+        def job(progress, cancel):
+            return import_songs_file(
+                path, skip_dup, lambda st: progress(st["fraction"], f"追加 {st['inserted']} 曲"), cancel
+            )
+
+        def done(stats):
+            self.bulk_status_var.set(import_stats_text(stats))
+            self.status_var.set(f"一括インポート: {stats['inserted']} 曲を追加しました")
+            self.run_search()
+
+        self._start_bulk_job("song-import", f"取り込み中: {os.path.basename(path)}", job, done)
+
+    def _export_fields(self) -> list[str]:
+        return [field for field, _ in EXPORT_FIELDS if self.export_field_vars[field].get()]
+
+    def _on_export_fields_change(self):
+        self.settings["export_columns"] = self._export_fields()
+        self._save_settings()
+
+    def start_export(self):
+        if self._bulk_thread is not None:
+            return
+        fields = self._export_fields()
+        if not fields:
+            messagebox.showinfo("書き出し", "書き出す列を1つ以上選んでください。")
+            return
+        path = filedialog.asksaveasfilename(
+            title="曲データを書き出し",
+            defaultextension=".csv",
+            initialfile=f"songs_{datetime.now().strftime('%Y%m%d')}",
+            filetypes=[("CSV", "*.csv"), ("JSONL", "*.jsonl")],
+        )
+        if not path:
+            return
+
+        def job(progress, cancel):
+            return export_songs_file(path, fields, lambda done, total: progress(done / max(1, total), f"{done} 曲"), cancel)
+
+        def done(n):
+            self.bulk_status_var.set(f"{n} 曲を書き出しました: {os.path.basename(path)}")
+            self.status_var.set(f"曲データを書き出しました: {os.path.basename(path)}")
+
+        self._start_bulk_job("song-export", f"書き出し中: {os.path.basename(path)}", job, done)
+
+    # ---------- media folders ----------
+    def _media_folders(self) -> list[str]:
+        return list(self.media_folder_list.get(0, "end"))
+
+    def add_media_folder(self):
+        folder = filedialog.askdirectory(title="動画/音源のフォルダを選択")
+        if not folder or folder in self._media_folders():
+            return
+        self.media_folder_list.insert("end", folder)
+        self.settings["media_folders"] = self._media_folders()
+        self._save_settings()
+
+    def remove_media_folder(self):
+        sel = self.media_folder_list.curselection()
+        if not sel:
+            return
+        self.media_folder_list.delete(sel[0])
+        self.settings["media_folders"] = self._media_folders()
+        self._save_settings()
+
+    def start_media_scan(self):
+        if self._bulk_thread is not None:
+            return
+        folders = self._media_folders()
+        if not folders:
+            messagebox.showinfo("メディアフォルダ", "先に「追加...」で動画/音源のフォルダを登録してください。")
+            return
+        rematch = bool(self.media_rematch_var.get())
+
+        def job(progress, cancel):
+            def on_progress(dirs, pending, files):
+                progress(dirs / (dirs + pending), f"フォルダ {dirs} 件 / 新しく読んだファイル {files} 件")
+            stats = scan_media_folders(folders, on_progress, cancel, rematch)
+            return stats, db_media_link_proposals()
+
+        def done(result):
+            stats, proposals = result
+            self._show_media_proposals(proposals)
+            self.bulk_status_var.set(f"{media_scan_stats_text(stats)} / リンク候補 {len(proposals)} 件")
+            self.status_var.set(f"メディアのスキャンが終わりました（リンク候補 {len(proposals)} 件）")
+
+        self._start_bulk_job("media-scan", "メディアフォルダをスキャン中…", job, done)
+
+    def _show_media_proposals(self, proposals):
+        self.media_tree.delete(*self.media_tree.get_children())
+        self._media_proposals = {}
+        kind_labels = {"video": "動画", "audio": "音源"}
+        for p in proposals:
+            iid = self.media_tree.insert("", "end", values=(kind_labels[p["kind"]], p["title"], p["artist"], p["path"]))
+            self._media_proposals[iid] = p
+
+    def show_broken_media_links(self):
+        """見つからない動画/音源を設定している曲を一覧に出す（結果は裏で確かめた分のみ）"""
+        broken = db_broken_media_links(self.media_status.broken())
+        self.media_tree.delete(*self.media_tree.get_children())
+        self._media_proposals = {}
+        kind_labels = {"video": "動画✕", "audio": "音源✕"}
+        for b in broken:
+            self.media_tree.insert("", "end", values=(kind_labels[b["kind"]], b["title"], b["artist"], b["path"]))
+        self.media_status.revalidate_all()
+        self.bulk_status_var.set(
+            f"リンク切れ {len(broken)} 件（{self.media_status.stats_text()}）。"
+            "ファイルを戻すか、曲を編集してパスを直してください。確認し直しを始めました"
+        )
+
+    def apply_media_links(self, selected_only: bool):
+        iids = self.media_tree.selection() if selected_only else self.media_tree.get_children()
+        links = [(p["song_id"], p["kind"], p["path"]) for p in (self._media_proposals.get(i) for i in iids) if p]
+        if not links:
+            messagebox.showinfo("メディアの自動リンク", "リンクする候補を選んでください。")
+            return
+        try:
+            n = db_link_media(links)
+        except sqlite3.OperationalError as e:
+            self._show_db_error("メディアの自動リンク", e)
+            return
+        self.media_status.request(*[path for _, _, path in links])
+        self.media_tree.delete(*[i for i in iids if i in self._media_proposals])
+        for i in iids:
+            self._media_proposals.pop(i, None)
+        self.status_var.set(f"動画/音源のパスを {n} 件設定しました")
+        self.run_search()
+        if self.now_id is not None and any(sid == self.now_id for sid, _, _ in links):
+            self.refresh_now_view()
+
     def browse_file(self, var: tk.StringVar, filetypes):
         path = filedialog.askopenfilename(title="ファイルを選択", filetypes=filetypes)
         if path:
@@ -1642,7 +5401,7 @@ class KaraokeSetlistApp(tk.Tk):
             self.register_mode_var.set(f"編集モード（ID={edit_song_id}）")
             self.submit_btn_text.set("更新する")
 
-    def load_song_into_register(self, row):
+    def load_song_into_register(self, row, texts: dict):
         self.r_title.set(row["title"] or "")
         self.r_title_kana.set(row["title_kana"] or "")
         self.r_artist.set(row["artist"] or "")
@@ -1655,9 +5414,9 @@ class KaraokeSetlistApp(tk.Tk):
         self.r_audio_url.set(row["audio_url"] or "")
         self.r_original_url.set(row["original_url"] or "")
         self.r_lyrics.delete("1.0", "end")
-        self.r_lyrics.insert("1.0", row["lyrics"] or "")
+        self.r_lyrics.insert("1.0", texts.get("lyrics", ""))
         self.r_credit.delete("1.0", "end")
-        self.r_credit.insert("1.0", row["credit_text"] or "")
+        self.r_credit.insert("1.0", texts.get("credit_text", ""))
 
     def clear_register_form(self):
         self.set_register_mode(None)
@@ -1691,14 +5450,26 @@ class KaraokeSetlistApp(tk.Tk):
             "original_url": self.r_original_url.get().strip(),
         }
 
+        self.media_status.request(data["video_path"], data["audio_path"])
         if self.editing_song_id is None:
-            new_id = db_insert_song(data)
+            try:
+                new_id = db_insert_song(data)
+            except sqlite3.OperationalError as e:
+                self._show_db_error("登録", e)
+                return
             self.status_var.set(f"登録しました: ID={new_id}")
             self.notebook.select(self.tab_search)
             self.run_search()
         else:
             sid = int(self.editing_song_id)
-            db_update_song(sid, data)
+            try:
+                db_update_song(sid, data)
+            except sqlite3.OperationalError as e:
+                self._show_db_error("更新", e)
+                return
+            self._mark_viewer_dirty()  # 曲名が変わった可能性
+            if self.stamp_log.retitle(sid, db_get_song(sid)):
+                self.refresh_stamp_view()
             self.status_var.set(f"更新しました: ID={sid}")
             self.run_search()
             self.show_detail(sid)
@@ -1715,8 +5486,9 @@ class KaraokeSetlistApp(tk.Tk):
 
         btns = ttk.Frame(top)
         btns.pack(fill="x", padx=10, pady=10)
-        ttk.Button(btns, text="生成/更新", command=self.refresh_stamp_view).pack(side="left")
+        ttk.Button(btns, text="生成/更新", command=self.rebuild_stamps).pack(side="left")
         ttk.Button(btns, text="コピー", command=self.copy_stamp_to_clipboard).pack(side="left", padx=(10, 0))
+        ttk.Button(btns, text="書き出し...", command=self.export_stamps).pack(side="left", padx=(10, 0))
 
         body = ttk.Frame(frm)
         body.pack(fill="both", expand=True, pady=(10, 0))
@@ -1737,12 +5509,12 @@ class KaraokeSetlistApp(tk.Tk):
         self.refresh_stamp_view()
 
     def build_stamp_lines(self) -> list[str]:
-        lines = ["00:00 開始"]
-        for ev in self.session_events:
-            row = db_get_song(ev["song_id"])
-            title = row["title"] if row else "(不明)"
-            lines.append(f"{format_youtube_ts(ev['start_sec'])} {title}")
-        return lines
+        return list(self.stamp_log.youtube_lines())
+
+    def rebuild_stamps(self):
+        """session_events から曲名を引き直して作り直す（1クエリ）"""
+        self.stamp_log.reset(self.session_events, db_get_songs([ev["song_id"] for ev in self.session_events]))
+        self.refresh_stamp_view()
 
     def refresh_stamp_view(self):
         text = "\n".join(self.build_stamp_lines()).strip() + "\n"
@@ -1751,6 +5523,33 @@ class KaraokeSetlistApp(tk.Tk):
         self.stamp_text.insert("1.0", text)
         self.stamp_text.config(state="disabled")
 
+    def _append_stamp(self, song_id: int, start_sec: int):
+        """選曲時は末尾に1行足すだけ（曲情報はキャッシュ済みの行を使う）"""
+        line = self.stamp_log.append(song_id, start_sec, db_get_song(song_id))
+        self.stamp_text.config(state="normal")
+        self.stamp_text.insert("end", line + "\n")
+        self.stamp_text.config(state="disabled")
+
+    def export_stamps(self):
+        if not self.stamp_log.entries:
+            messagebox.showinfo("書き出し", "まだ歌った曲がありません。")
+            return
+        filetypes = [(label, f"*{ext}") for ext, (label, _) in StampLog.EXPORT_FORMATS.items()]
+        path = filedialog.asksaveasfilename(
+            title="タイムスタンプを書き出し",
+            defaultextension=".txt",
+            initialfile=f"setlist_{datetime.now().strftime('%Y%m%d')}",
+            filetypes=filetypes,
+        )
+        if not path:
+            return
+        try:
+            n = self.stamp_log.export(path, end_sec=self.get_elapsed_seconds())
+        except (OSError, ValueError) as e:
+            messagebox.showerror("書き出し", f"書き出せませんでした。\n{e}")
+            return
+        self.status_var.set(f"タイムスタンプ {n} 曲を書き出しました: {os.path.basename(path)}")
+
     def copy_stamp_to_clipboard(self):
         text = self.stamp_text.get("1.0", "end").strip()
         if not text:
@@ -1877,7 +5676,7 @@ class KaraokeSetlistApp(tk.Tk):
                 self.settings["viewer_size"] = _to_save_size(sel)
 
             self._save_settings()
-            self._write_viewer_css()
+            self._apply_viewer_outputs()
             self.status_var.set(f"Viewerサイズ: {self.settings['viewer_size']}")
 
         def _toggle_custom():
@@ -1923,7 +5722,7 @@ class KaraokeSetlistApp(tk.Tk):
                 val = 0.8
             self.settings["viewer_font_scale"] = val
             self._save_settings()
-            self._write_viewer_css()
+            self._apply_viewer_outputs()
             self.status_var.set(f"Viewer文字サイズ: {val}x")
 
         self.viewer_scale_combo.bind("<<ComboboxSelected>>", on_scale_change)
@@ -1961,6 +5760,67 @@ class KaraokeSetlistApp(tk.Tk):
         ttk.Checkbutton(opt_row, text="日時を表示", variable=self.viewer_show_datetime_var, command=self._on_viewer_show_datetime).pack(side="left")
         ttk.Checkbutton(opt_row, text="Roent.List を表示", variable=self.viewer_show_brand_var, command=self._on_viewer_show_brand).pack(side="left", padx=(16, 0))
 
+        # live server (SSE)
+        ttk.Label(grid, text="ライブ配信").grid(row=5, column=0, sticky="w", pady=(10, 0))
+        self.viewer_server_var = tk.BooleanVar(value=bool(self.settings.get("viewer_server_enabled", False)))
+        self.viewer_port_var = tk.StringVar(value=str(self.settings.get("viewer_server_port", VIEWER_SERVER_PORT)))
+        srv_row = ttk.Frame(grid)
+        srv_row.grid(row=5, column=1, columnspan=2, sticky="w", padx=10, pady=(10, 0))
+        ttk.Checkbutton(srv_row, text="ローカルサーバーで配信（ちらつき無し・即時反映）", variable=self.viewer_server_var, command=self._on_viewer_server_toggle).pack(side="left")
+        ttk.Label(srv_row, text="ポート").pack(side="left", padx=(16, 4))
+        ttk.Entry(srv_row, textvariable=self.viewer_port_var, width=6).pack(side="left")
+        self.viewer_url_var = tk.StringVar(value="")
+        ttk.Label(grid, textvariable=self.viewer_url_var, style="Muted.TLabel").grid(row=6, column=1, columnspan=2, sticky="w", padx=10, pady=(4, 0))
+        self._update_viewer_url_label()
+
+        # layout (obs_viewer/templates/*.html)
+        ttk.Label(grid, text="レイアウト").grid(row=7, column=0, sticky="w", pady=(10, 0))
+        self.viewer_layout_combo = ttk.Combobox(grid, state="readonly", width=18, postcommand=self._refresh_viewer_layouts)
+        self.viewer_layout_combo.grid(row=7, column=1, sticky="w", padx=10, pady=(10, 0))
+        self.viewer_layout_combo.bind("<<ComboboxSelected>>", self._on_viewer_layout_change)
+        self._refresh_viewer_layouts()
+        self.viewer_layout_combo.set(self.settings.get("viewer_layout") or VIEWER_DEFAULT_LAYOUT)
+        ttk.Label(grid, text="※ obs_viewer/templates/ に .html を置くと選べます（保存すると自動で読み直します）。", style="Muted.TLabel").grid(row=8, column=1, columnspan=2, sticky="w", padx=10, pady=(4, 0))
+
+        # extra outputs (scene別: obs_viewer/<name>.html + <name>.css)
+        ttk.Label(grid, text="追加の出力").grid(row=9, column=0, sticky="nw", pady=(10, 0))
+        vout = ttk.Frame(grid)
+        vout.grid(row=9, column=1, columnspan=2, sticky="we", padx=10, pady=(10, 0))
+        cols = ("name", "layout", "size", "scale", "queue", "done")
+        self.vout_tree = ttk.Treeview(vout, columns=cols, show="headings", height=4, selectmode="extended")
+        for col, label, width in zip(cols, ("出力名", "レイアウト", "サイズ", "文字", "Queue件数", "Done件数"), (90, 90, 90, 50, 70, 70)):
+            self.vout_tree.heading(col, text=label)
+            self.vout_tree.column(col, width=width, anchor="w")
+        self.vout_tree.pack(fill="x")
+        self.vout_tree.bind("<<TreeviewSelect>>", self._on_viewer_output_select)
+
+        edit = ttk.Frame(vout)
+        edit.pack(fill="x", pady=(6, 0))
+        self.vout_name_var = tk.StringVar(value="")
+        self.vout_size_var = tk.StringVar(value="800x600")
+        self.vout_scale_var = tk.StringVar(value="1.5")
+        self.vout_queue_var = tk.StringVar(value=str(VIEWER_LIST_LIMIT))
+        self.vout_done_var = tk.StringVar(value=str(VIEWER_LIST_LIMIT))
+        ttk.Label(edit, text="名前").pack(side="left")
+        ttk.Entry(edit, textvariable=self.vout_name_var, width=10).pack(side="left", padx=(4, 8))
+        self.vout_layout_combo = ttk.Combobox(edit, values=self._viewer_layout_names(), state="readonly", width=10)
+        self.vout_layout_combo.set(VIEWER_DEFAULT_LAYOUT)
+        self.vout_layout_combo.pack(side="left", padx=(0, 8))
+        ttk.Entry(edit, textvariable=self.vout_size_var, width=9).pack(side="left", padx=(0, 8))
+        ttk.Label(edit, text="文字").pack(side="left")
+        ttk.Entry(edit, textvariable=self.vout_scale_var, width=4).pack(side="left", padx=(4, 8))
+        ttk.Label(edit, text="件数 Q").pack(side="left")
+        ttk.Entry(edit, textvariable=self.vout_queue_var, width=4).pack(side="left", padx=(4, 4))
+        ttk.Label(edit, text="D").pack(side="left")
+        ttk.Entry(edit, textvariable=self.vout_done_var, width=4).pack(side="left", padx=(4, 8))
+
+        btns = ttk.Frame(vout)
+        btns.pack(fill="x", pady=(6, 0))
+        ttk.Button(btns, text="追加/更新", command=self.save_viewer_output).pack(side="left")
+        ttk.Button(btns, text="削除", command=self.remove_viewer_output).pack(side="left", padx=(8, 0))
+        ttk.Button(btns, text="場面別（現在曲/キュー/Done/歌詞）を追加", command=self.add_viewer_scene_presets).pack(side="left", padx=(8, 0))
+        self._refresh_viewer_outputs_tree()
+
         # ---- Setlist Tab ----
 
         # ---- BGM ----
@@ -1984,6 +5844,7 @@ class KaraokeSetlistApp(tk.Tk):
             self.bgm_video_var.set(path)
             self.settings["bgm_video_path"] = path
             self._save_settings()
+            self.media_status.request(path)
             self.status_var.set("BGM動画を設定しました")
 
         def _pick_bgm_audio():
@@ -1999,6 +5860,7 @@ class KaraokeSetlistApp(tk.Tk):
             self.bgm_audio_var.set(path)
             self.settings["bgm_audio_path"] = path
             self._save_settings()
+            self.media_status.request(path)
             self.status_var.set("BGM音源を設定しました")
 
         def _on_bgm_priority_toggle():
@@ -2032,6 +5894,25 @@ class KaraokeSetlistApp(tk.Tk):
         ttk.Checkbutton(r2, text="動画を優先（チェック時）", variable=self.bgm_prefer_video_var, command=_on_bgm_priority_toggle).pack(side="left", padx=(10, 0))
         ttk.Label(r2, text="※ デフォルトは音源優先です。", style="Muted.TLabel").pack(side="left", padx=(10, 0))
 
+        # ---- 再生プレーヤー ----
+        player = ttk.LabelFrame(frm, text="再生プレーヤー（音楽 / 動画 / BGM ボタン）")
+        player.pack(fill="x", pady=(12, 0))
+        p0 = ttk.Frame(player)
+        p0.pack(fill="x", padx=10, pady=(10, 6))
+        ttk.Label(p0, text="コマンド").pack(side="left")
+        self.player_command_var = tk.StringVar(value=self.launcher.command)
+        player_entry = ttk.Entry(p0, textvariable=self.player_command_var, width=60)
+        player_entry.pack(side="left", padx=(10, 0), fill="x", expand=True)
+        player_entry.bind("<Return>", self._on_player_command_change)
+        player_entry.bind("<FocusOut>", self._on_player_command_change)
+        p1 = ttk.Frame(player)
+        p1.pack(fill="x", padx=10, pady=(0, 10))
+        self.player_close_previous_var = tk.BooleanVar(value=bool(self.settings.get("player_close_previous", True)))
+        ttk.Checkbutton(p1, text="次の曲を選んだら前の曲のプレーヤーを閉じる", variable=self.player_close_previous_var,
+                        command=self._on_player_close_previous_toggle).pack(side="left")
+        ttk.Label(player, text="※ 空欄なら既定アプリで開きます（この場合は閉じられません）。例: vlc --play-and-exit {path}",
+                  style="Muted.TLabel", wraplength=560).pack(fill="x", padx=10, pady=(0, 10))
+
         sl = ttk.LabelFrame(frm, text="セットリスト表示")
         sl.pack(fill="x", pady=(12, 0))
 
@@ -2056,25 +5937,274 @@ class KaraokeSetlistApp(tk.Tk):
 
         self.setlist_lyrics_combo.bind("<<ComboboxSelected>>", on_setlist_lyrics_change)
 
+        # ---- 診断 ----
+        diag = ttk.LabelFrame(frm, text="診断")
+        diag.pack(fill="x", pady=(12, 0))
+        g3 = ttk.Frame(diag)
+        g3.pack(fill="x", padx=10, pady=10)
+        ttk.Button(g3, text="統計を表示", command=self.show_stats).pack(side="left")
+        ttk.Button(g3, text="検索インデックス再構築", command=self.rebuild_search_index).pack(side="left", padx=(10, 0))
+
+    def _on_player_command_change(self, _evt=None):
+        command = self.player_command_var.get().strip()
+        if command == self.launcher.command:
+            return
+        if command:
+            try:
+                player_command_args(command, "x")
+            except ValueError as e:
+                self.status_var.set(f"プレーヤーのコマンドを読めません: {e}")
+                return
+        self.launcher.command = command
+        self.settings["player_command"] = command
+        self._save_settings()
+        self.status_var.set("再生プレーヤーを設定しました" if command else "再生プレーヤー: 既定アプリ")
+
+    def _on_player_close_previous_toggle(self):
+        self.settings["player_close_previous"] = bool(self.player_close_previous_var.get())
+        self._save_settings()
+
+    def _stats_lines(self) -> list[str]:
+        return [
+            get_pool().stats_text(),
+            song_cache.stats_text(),
+            self.search_worker.stats_text(),
+            self.viewer_tick_stats.stats_text(),
+            *self.scheduler.stats_lines(),
+            self.session_journal.stats_text(),
+            self.file_writer.stats_text(),
+            self.media_status.stats_text(),
+            self.launcher.stats_text(),
+            self.viewer_templates.stats_text() + f" / CSSキャッシュ {viewer_css.cache_info().hits} ヒット",
+            "Viewerライブ配信: 出力 {} / 接続 {} / 差分送信 {} 回".format(
+                len(self.viewer_outputs),
+                sum(out.hub.client_count() for out in self.viewer_outputs.values()),
+                sum(out.hub.pushes for out in self.viewer_outputs.values()),
+            ),
+        ]
+
+    def show_stats(self):
+        messagebox.showinfo("統計", "\n".join(self._stats_lines()))
+
+    def rebuild_search_index(self):
+        try:
+            db_backfill_norm(only_missing=False)
+            db_rebuild_song_stats()
+            rebuilt = db_rebuild_fts()
+        except sqlite3.OperationalError as e:
+            self._show_db_error("検索インデックスの再構築", e)
+            return
+        if rebuilt:
+            self.status_var.set("検索インデックスを再構築しました")
+        else:
+            self.status_var.set("FTS5 非対応のため LIKE 検索を使用しています")
+
     def _on_theme_change(self):
         self.apply_theme(self.theme_var.get(), save=True)
     def _on_viewer_show_datetime(self):
         self.settings["viewer_show_datetime"] = bool(self.viewer_show_datetime_var.get())
         self._save_settings()
+        self._mark_viewer_dirty("settings")
         self.status_var.set("Viewer日時表示を更新しました")
 
+    def _update_viewer_url_label(self):
+        if self.viewer_server is not None:
+            self.viewer_url_var.set(f"OBS のブラウザソースで「ローカルファイル」をOFFにして URL に {self.viewer_server.url} を指定")
+        else:
+            self.viewer_url_var.set("※ OFF の場合は obs_viewer/view.html（1秒ごとに再読み込み）を使います。")
+
+    def _on_viewer_server_toggle(self):
+        enabled = bool(self.viewer_server_var.get())
+        if enabled:
+            try:
+                port = int(self.viewer_port_var.get().strip())
+                if not (1024 <= port <= 65535):
+                    raise ValueError
+            except ValueError:
+                messagebox.showwarning("入力エラー", "ポートは 1024〜65535 の数値で入力してください。")
+                self.viewer_server_var.set(False)
+                return
+            self.settings["viewer_server_port"] = port
+            if not self._start_viewer_server():
+                self.viewer_server_var.set(False)
+                enabled = False
+        else:
+            self._stop_viewer_server()
+        self.settings["viewer_server_enabled"] = enabled
+        self._save_settings()
+        self._update_viewer_url_label()
+        self.status_var.set("Viewerライブ配信: " + (self.viewer_server.url if enabled else "OFF"))
+
+    def _viewer_layout_names(self) -> list[str]:
+        names = set(self.viewer_templates.names()) | set(VIEWER_SCENE_TEMPLATES)
+        names.discard(VIEWER_DEFAULT_LAYOUT)
+        return [VIEWER_DEFAULT_LAYOUT] + sorted(names)
+
+    def _refresh_viewer_layouts(self):
+        self.viewer_layout_combo["values"] = self._viewer_layout_names()
+        if hasattr(self, "vout_layout_combo"):
+            self.vout_layout_combo["values"] = self._viewer_layout_names()
+
+    def _apply_viewer_outputs(self):
+        """出力の設定変更を反映（CSS を書き直し、区画を作り直す）"""
+        self._sync_viewer_outputs()
+        self._write_viewer_css()
+        self._mark_viewer_dirty("settings")
+
+    def _refresh_viewer_outputs_tree(self):
+        self.vout_tree.delete(*self.vout_tree.get_children())
+        for cfg in self._viewer_output_configs()[1:]:
+            self.vout_tree.insert(
+                "", "end", iid=cfg["name"],
+                values=(cfg["name"], cfg["layout"], cfg["size"], cfg["scale"], cfg["queue_limit"], cfg["done_limit"]),
+            )
+
+    def _on_viewer_output_select(self, _evt=None):
+        sel = self.vout_tree.selection()
+        if not sel:
+            return
+        name, layout, size, scale, q, d = self.vout_tree.item(sel[0], "values")
+        self.vout_name_var.set(name)
+        self.vout_layout_combo.set(layout)
+        self.vout_size_var.set(size)
+        self.vout_scale_var.set(str(scale))
+        self.vout_queue_var.set(str(q))
+        self.vout_done_var.set(str(d))
+
+    def _save_viewer_output_configs(self, configs: list):
+        self.settings["viewer_outputs"] = configs
+        self._save_settings()
+        self._apply_viewer_outputs()
+        self._refresh_viewer_outputs_tree()
+
+    def save_viewer_output(self):
+        """入力欄の内容で追加の出力を追加/更新"""
+        raw = {
+            "name": self.vout_name_var.get().strip(),
+            "layout": self.vout_layout_combo.get().strip(),
+            "size": self.vout_size_var.get().strip(),
+            "scale": self.vout_scale_var.get().strip(),
+            "queue_limit": self.vout_queue_var.get().strip(),
+            "done_limit": self.vout_done_var.get().strip(),
+        }
+        cfg = normalize_viewer_output(raw)
+        if cfg is None:
+            messagebox.showwarning("入力エラー", "出力名は半角英数字・-・_ で入力してください（view / style / events / index は使えません）。")
+            return
+        if parse_viewer_size(raw["size"], None) is None:
+            messagebox.showwarning("入力エラー", "サイズは 例: 800x600 のように入力してください。")
+            return
+        configs = [c for c in self._viewer_output_configs()[1:] if c["name"] != cfg["name"]]
+        configs.append(cfg)
+        self._save_viewer_output_configs(configs)
+        self.status_var.set(f"Viewer出力を保存しました: obs_viewer/{cfg['name']}.html")
+
+    def remove_viewer_output(self):
+        sel = set(self.vout_tree.selection())
+        if not sel:
+            return
+        self._save_viewer_output_configs([c for c in self._viewer_output_configs()[1:] if c["name"] not in sel])
+        for name in sel:
+            for fn in viewer_output_files(name):
+                self.file_writer.discard(os.path.join(self.viewer_dir, fn))
+                try:
+                    os.remove(os.path.join(self.viewer_dir, fn))
+                except OSError:
+                    pass
+        self.status_var.set("Viewer出力を削除しました")
+
+    def add_viewer_scene_presets(self):
+        """現在曲 / キュー / Done / 歌詞 の4出力をまとめて追加（同名があれば残す）"""
+        configs = self._viewer_output_configs()[1:]
+        names = {c["name"] for c in configs}
+        configs += [normalize_viewer_output(p) for p in VIEWER_SCENE_PRESETS if p["name"] not in names]
+        self._save_viewer_output_configs(configs)
+        self.status_var.set("場面別の出力を追加しました（obs_viewer/now.html など）")
+
+    def _on_viewer_layout_change(self, _evt=None):
+        self.settings["viewer_layout"] = self.viewer_layout_combo.get().strip() or VIEWER_DEFAULT_LAYOUT
+        self._save_settings()
+        self._apply_viewer_outputs()
+        self.status_var.set(f"Viewerレイアウト: {self.settings['viewer_layout']}")
+
     def _on_viewer_show_brand(self):
         new_val = bool(self.viewer_show_brand_var.get())
         if not new_val:
             messagebox.showinfo("お願い", "htmlからRoent.Listの表示を消す際は概要欄にRoent.Listの表記をお願いします。")
         self.settings["viewer_show_brand"] = new_val
         self._save_settings()
+        self._mark_viewer_dirty("settings")
         self.status_var.set("Viewer Roent.List 表示を更新しました")
 
 
 
 
-if __name__ == "__main__":
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="roentlist", description="Roent.List 歌枠管理ソフト")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("rebuild-index", help="検索インデックス（FTS）を songs.db から作り直す")
+    p_import = sub.add_parser("import", help="CSV / TSV / JSONL の曲リストを songs.db に取り込む")
+    p_import.add_argument("file", help="取り込むファイル（.csv / .tsv / .txt / .jsonl）")
+    p_import.add_argument("--allow-duplicates", action="store_true", help="曲名+アーティストが同じ曲も追加する")
+    p_export = sub.add_parser("export", help="songs.db の曲データを CSV / JSONL に書き出す")
+    p_export.add_argument("file", help="書き出し先（.csv / .jsonl）。- で標準出力")
+    p_export.add_argument("--columns", help="書き出す列（カンマ区切り。既定: " + ",".join(EXPORT_DEFAULT_FIELDS) + "）")
+    p_export.add_argument("--no-lyrics", action="store_true", help="歌詞・概要欄記載事項を書き出さない")
+    p_export.add_argument("--format", choices=("csv", "jsonl"), help="形式（既定は拡張子から判断。標準出力は csv）")
+    sub.add_parser("check-media", help="見つからない動画/音源パス（リンク切れ）を一覧にする")
+    args = parser.parse_args(argv)
+
     init_db()
-    app = KaraokeSetlistApp()
-    app.mainloop()
+    try:
+        if args.command == "rebuild-index":
+            n = db_backfill_norm(only_missing=False)
+            print(f"検索用正規化列を再計算しました: {n} 件")
+            db_rebuild_song_stats()
+            print("歌唱回数・最終歌唱日を配信履歴から数え直しました")
+            if db_rebuild_fts():
+                print("検索インデックスを再構築しました")
+            else:
+                print("この環境の SQLite は FTS5 trigram に対応していません（LIKE 検索を使用します）")
+            return
+        if args.command == "import":
+            def progress(stats):
+                print(f"\r{stats['fraction'] * 100:5.1f}%  追加 {stats['inserted']} 曲", end="", file=sys.stderr, flush=True)
+            try:
+                stats = import_songs_file(args.file, not args.allow_duplicates, progress)
+            except (OSError, ValueError, csv.Error) as e:
+                print(f"取り込めませんでした: {e}", file=sys.stderr)
+                sys.exit(1)
+            print(file=sys.stderr)
+            print(import_stats_text(stats))
+            return
+        if args.command == "check-media":
+            paths = list(dict.fromkeys(db_media_paths()))
+            with ThreadPoolExecutor(max_workers=MEDIA_CHECK_WORKERS) as pool:
+                broken = [p for p, ok in zip(paths, pool.map(MediaAvailability._check, paths)) if not ok]
+            links = db_broken_media_links(broken)
+            for b in links:
+                print(f"{b['song_id']}\t{b['kind']}\t{b['title']} / {b['artist']}\t{b['path']}")
+            print(f"リンク切れ {len(links)} 件（確認したパス {len(paths)} 件）", file=sys.stderr)
+            return
+        if args.command == "export":
+            fields = [c.strip() for c in args.columns.split(",") if c.strip()] if args.columns else list(EXPORT_DEFAULT_FIELDS)
+            if args.no_lyrics:
+                fields = [f for f in fields if f not in SONG_TEXT_FIELDS]
+            try:
+                if args.file == "-":
+                    n = export_songs(sys.stdout, args.format or "csv", fields)
+                else:
+                    n = export_songs_file(args.file, fields, fmt=args.format or "")
+            except (OSError, ValueError) as e:
+                print(f"書き出せませんでした: {e}", file=sys.stderr)
+                sys.exit(1)
+            print(f"{n} 曲を書き出しました", file=sys.stderr)
+            return
+        app = KaraokeSetlistApp()
+        app.mainloop()
+    finally:
+        get_pool().close_all()
+
+
+if __name__ == "__main__":
+    main()